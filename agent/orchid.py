@@ -2,14 +2,26 @@ import sys
 import os
 import typer
 import re
+import json
+from typing import List
 
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
 from rich.console import Console
 from rich.panel import Panel
 from rich.text import Text
+from rich.markdown import Markdown
 
 from src.agentic_ai import Agent
+from src.batch import BatchRunner, load_tasks
+from src.server import OrchidClient, OrchidServer, OrchidService, ServerError
+from src.snapshot import SnapshotError
+from src.ingest import walk_project
+from src.benchmark import RetrievalBenchmark, load_queries
+from src.transaction import Journal, TransactionError
+from src.index_pool import IndexPool
+from src.llm import GeminiClient
+from src.project import Project
 from src import config
 
 from prompt_toolkit.completion import WordCompleter
@@ -53,16 +65,19 @@ app = typer.Typer(
 )
 console = Console()
 
-def get_file_paths(root_dir):
-    """Recursively gets all file paths from the src directory for autocompletion."""
-    file_paths = []
-    for root, _, files in os.walk(root_dir):
-        for name in files:
-            if "node_modules" not in root and ".next" not in root:
-                full_path = os.path.join(root, name)
-                relative_path = os.path.relpath(full_path, config.PROJECT_ROOT)
-                file_paths.append(f"@{relative_path.replace(os.sep, '/')}")
-    return file_paths
+ProjectOption = typer.Option(None, "--project", "-P", help="Root of the project to work on (defaults to the agent's parent folder).")
+
+
+def get_file_paths(project_root=config.PROJECT_ROOT):
+    """Gets all project file and directory (`@dir/`) paths for autocompletion."""
+    file_paths, dirs = [], {}
+    for relative_path in walk_project(project_root):
+        parent = os.path.dirname(relative_path)
+        while parent and parent not in dirs:
+            dirs[parent] = None
+            parent = os.path.dirname(parent)
+        file_paths.append(f"@{relative_path}")
+    return [f"@{d}/" for d in sorted(dirs)] + file_paths
 
 def _print_welcome_banner():
     """Display a fancy multi-line welcome banner."""
@@ -96,33 +111,283 @@ def main(ctx: typer.Context):
             [bold]2. Run a Task or Ask a Question:[/bold]
             [dim]Start an interactive session to build features or ask about your code.[/dim]
             [yellow]$ python agent/orchid.py run[/yellow]
+
+            [bold]3. Plan a queue of tasks non-interactively:[/bold]
+            [yellow]$ python agent/orchid.py batch tasks.jsonl --out plans/ --concurrency 4[/yellow]
+
+            [bold]4. Keep the agent warm for editors and scripts:[/bold]
+            [yellow]$ python agent/orchid.py serve[/yellow]
+            [yellow]$ python agent/orchid.py client search "audio player controls"[/yellow]
+            [yellow]$ python agent/orchid.py client reindex[/yellow]  [dim](after editing files; the daemon holds the index)[/dim]
+
+            [bold]5. Undo the last applied plan:[/bold]
+            [yellow]$ python agent/orchid.py undo[/yellow]
+
+            [bold]6. Share a built index instead of re-embedding:[/bold]
+            [yellow]$ python agent/orchid.py index export --out orchid-index.jsonl.gz[/yellow]
+            [yellow]$ python agent/orchid.py index import orchid-index.jsonl.gz[/yellow]
+
+            [bold]7. Compare retrieval settings (quality vs. prompt tokens):[/bold]
+            [yellow]$ python agent/orchid.py bench --chunk-sizes 500,1000 --k 5,10,15[/yellow]
             """
         )
         console.print(Panel(help_text, title="[bold green]Getting Started[/bold green]", border_style="green"))
 
 
 @app.command()
-def init():
+def init(project: str = ProjectOption):
     """
     Initializes the agent by scanning the codebase and building the vector store.
     """
     console.print(Panel("[bold magenta]🌸 Initializing Orchid AI Agent 🌸[/bold magenta]"))
     console.print("This may take a moment as the agent analyzes your project...")
     try:
-        agent = Agent(initialize=False)
+        agent = Agent(initialize=False, project_root=project)
         agent.initialize_project()
+    except KeyboardInterrupt:
+        # Progress is checkpointed; the next `init` resumes where this one stopped.
+        raise typer.Exit(code=130)
     except Exception as e:
         console.print(f"[bold red]An unexpected error occurred during initialization: {e}[/bold red]")
         console.print_exception()
 
 
 @app.command()
-def run() -> None:
+def batch(
+    tasks_file: str = typer.Argument(..., help="JSONL file with one task per line."),
+    out: str = typer.Option(None, "--out", "-o", help="Directory for plans, answers and the summary (defaults to .orchid/batch in the project)."),
+    concurrency: int = typer.Option(4, "--concurrency", "-c", min=1, help="Number of tasks processed at once."),
+    apply: bool = typer.Option(False, "--apply", help="Apply each plan to a scratch git worktree under .orchid/worktrees."),
+    project: str = ProjectOption,
+):
+    """
+    Generates plans for a queue of tasks without interactive prompts.
+    """
+    try:
+        tasks = load_tasks(tasks_file)
+    except (OSError, ValueError) as e:
+        console.print(f"[bold red]Could not read tasks: {e}[/bold red]")
+        raise typer.Exit(code=1)
+    if not tasks:
+        console.print("[yellow]No tasks found.[/yellow]")
+        return
+
+    agent = Agent(interactive=False, pool_size=max(concurrency, 10), project_root=project)
+    results = BatchRunner(agent, out, concurrency=concurrency, apply=apply).run(tasks)
+    if any(r["status"] != "ok" for r in results):
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def serve(
+    port: int = typer.Option(config.SERVER_PORT, "--port", "-p", help="Loopback HTTP port (0 disables HTTP)."),
+    socket_path: str = typer.Option(config.SERVER_SOCKET, "--socket", help="Unix socket path ('' disables it)."),
+    project: str = typer.Option(None, "--project", "-P", help="Default project for requests that do not name one."),
+    max_indexes: int = typer.Option(config.INDEX_POOL_SIZE, "--max-indexes", min=1, help="Open project indexes kept in memory."),
+):
+    """
+    Runs a long-lived daemon that keeps the index and API clients warm.
+    Requests may name any initialized project; their indexes share one LRU pool.
+    """
+    llm = GeminiClient()
+    index_pool = IndexPool(max_open=max_indexes)
+
+    def agent_factory(target: Project) -> Agent:
+        return Agent(interactive=False, project_root=target.root, llm=llm, index_pool=index_pool)
+
+    default_project = Project(project)
+    try:
+        service = OrchidService(agent_factory, index_pool, default_project)
+        service.warm(default_project)
+        server = OrchidServer(service, port=port or None, socket_path=socket_path or None)
+    except (ServerError, OSError) as e:
+        console.print(f"[bold red]Could not start the daemon: {e}[/bold red]")
+        raise typer.Exit(code=1)
+    try:
+        server.serve_forever()
+    finally:
+        index_pool.close_all()
+
+
+client_app = typer.Typer(help="Query a running `orchid.py serve` daemon.")
+app.add_typer(client_app, name="client")
+_client_options = {"project": None}
+
+
+@client_app.callback()
+def client_main(project: str = ProjectOption):
+    _client_options["project"] = project
+
+
+def _call_daemon(fn, as_json: bool):
+    try:
+        result = fn(OrchidClient(project=_client_options["project"]))
+    except ServerError as e:
+        console.print(f"[bold red]{e}[/bold red]")
+        raise typer.Exit(code=1)
+    if as_json:
+        print(json.dumps(result, indent=2))
+        return None
+    return result
+
+
+@client_app.command("health")
+def client_health():
+    """Shows the daemon's status."""
+    _call_daemon(lambda c: c.health(), as_json=True)
+
+
+@client_app.command("search")
+def client_search(
+    query: str,
+    k: int = typer.Option(15, "--k", "-k"),
+    directories: List[str] = typer.Option([], "--dir", "-d", help="Only search below this directory (repeatable)."),
+    extensions: List[str] = typer.Option([], "--ext", "-e", help="Only search files with this extension (repeatable)."),
+    kinds: List[str] = typer.Option([], "--kind", help="Only search chunks of this kind: component, hook, route, type, function, code, config, schema, docs, style."),
+    as_json: bool = typer.Option(False, "--json", help="Print the raw JSON response."),
+):
+    """Semantic search over the indexed codebase."""
+    result = _call_daemon(lambda c: c.search(query, k, directories, extensions, kinds), as_json)
+    if result is None:
+        return
+    for hit in result["results"]:
+        first_line = next((l for l in hit["code"].splitlines() if l.strip()), "").strip()
+        console.print(f"[magenta]{hit['path']}[/magenta]  [dim]{first_line[:80]}[/dim]")
+    console.print(f"[dim]{len(result['results'])} results in {result['elapsed_ms']}ms[/dim]")
+
+
+@client_app.command("ask")
+def client_ask(
+    query: str,
+    session: str = typer.Option(None, "--session", help="Reuse context across calls with the same id."),
+    as_json: bool = typer.Option(False, "--json", help="Print the raw JSON response."),
+):
+    """Answers a question about the codebase."""
+    files = re.findall(r"@([\S]+)", query)
+    result = _call_daemon(lambda c: c.ask(query, files, session), as_json)
+    if result is not None:
+        console.print(Markdown(result["answer"]))
+
+
+@client_app.command("plan")
+def client_plan(
+    task: str,
+    session: str = typer.Option(None, "--session", help="Reuse context across calls with the same id."),
+):
+    """Generates a build plan and prints it as JSON (nothing is applied)."""
+    files = re.findall(r"@([\S]+)", task)
+    _call_daemon(lambda c: c.plan(task, files, session), as_json=True)
+
+
+@client_app.command("reindex")
+def client_reindex():
+    """Embeds files changed since the daemon loaded the project and reloads it."""
+    result = _call_daemon(lambda c: c.reindex(), as_json=False)
+    if result["changed"]:
+        console.print(f"[green]Re-indexed {result['files']} files into {result['collection'][:12]}… in {result['elapsed_ms'] / 1000:.1f}s.[/green]")
+    else:
+        console.print("[dim]The index is already up to date.[/dim]")
+
+
+def _csv(value: str, cast=str) -> List:
+    return [cast(v.strip()) for v in value.split(",") if v.strip()]
+
+
+@app.command()
+def bench(
+    queries: str = typer.Option(os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench", "spotify_queries.json"), "--queries", "-q", help="Labeled queries fixture."),
+    chunk_sizes: str = typer.Option(str(config.CHUNK_CHARS), "--chunk-sizes", help="Comma-separated chunk sizes in characters."),
+    ks: str = typer.Option("5,10,15", "--k", help="Comma-separated result counts."),
+    rerank: str = typer.Option("on,off", "--rerank", help="Reranking settings to compare: on, off or on,off."),
+    models: str = typer.Option(config.EMBEDDING_MODEL, "--models", help="Comma-separated embedding models."),
+    out: str = typer.Option(None, "--out", "-o", help="Also write the results as JSON."),
+    project: str = ProjectOption,
+):
+    """
+    Measures retrieval quality (recall@k, MRR) against context tokens and search latency across configurations.
+    """
+    agent = Agent(initialize=False, interactive=False, project_root=project)
+    runner = RetrievalBenchmark(agent, load_queries(queries))
+    rows = runner.run(
+        _csv(chunk_sizes, int),
+        _csv(ks, int),
+        [v.lower() in ("on", "1", "true") for v in _csv(rerank)],
+        _csv(models),
+    )
+    runner.report(rows)
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        console.print(f"[dim]Wrote {out}[/dim]")
+
+
+index_app = typer.Typer(help="Export and import portable index snapshots.")
+app.add_typer(index_app, name="index")
+
+
+@index_app.command("export")
+def index_export(
+    out: str = typer.Option("orchid-index.jsonl.gz", "--out", "-o", help="Snapshot file to write."),
+    project: str = ProjectOption,
+):
+    """Writes the project's index (vectors, payloads, manifest) to a compressed snapshot."""
+    try:
+        agent = Agent(project_root=project)
+        agent.export_index(out)
+    except SnapshotError as e:
+        console.print(f"[bold red]{e}[/bold red]")
+        raise typer.Exit(code=1)
+
+
+@index_app.command("import")
+def index_import(
+    snapshot: str = typer.Argument(..., help="Snapshot written by `index export`."),
+    project: str = ProjectOption,
+):
+    """Loads a snapshot into the project's vector store and re-indexes files that changed since."""
+    try:
+        agent = Agent(initialize=False, project_root=project)
+        agent.import_index(snapshot)
+    except SnapshotError as e:
+        console.print(f"[bold red]{e}[/bold red]")
+        raise typer.Exit(code=1)
+    except KeyboardInterrupt:
+        raise typer.Exit(code=130)
+    console.print("\n[bold green](✓) Index ready; you can use the 'run' command.[/bold green]\n")
+
+
+@app.command()
+def undo(
+    project: str = ProjectOption,
+    force: bool = typer.Option(False, "--force", help="Undo even if files were edited after the plan was applied."),
+):
+    """
+    Rolls back the last plan applied by the agent.
+    """
+    target = Project(project)
+    try:
+        manifest = Journal(target.root, target.journal_path).undo(force=force)
+    except TransactionError as e:
+        console.print(f"[bold red]{e}[/bold red]")
+        raise typer.Exit(code=1)
+
+    if manifest is None:
+        console.print("[yellow]Nothing to undo.[/yellow]")
+        return
+    for record in manifest["files"]:
+        verb = "Restored" if record["existed"] else "Removed"
+        console.print(f"[green](✓) {verb} {record['path']}[/green]")
+    console.print(f"[bold green]Rolled back transaction {manifest['id']}.[/bold green]")
+
+
+@app.command()
+def run(project: str = ProjectOption) -> None:
     _print_welcome_banner()
+    agent = None
     try:
-        agent = Agent()
+        agent = Agent(project_root=project)
 
-        file_completer = AtPathCompleter(get_file_paths(config.SRC_PATH))
+        file_completer = AtPathCompleter(get_file_paths(agent.project.root))
         session = PromptSession(
             completer=file_completer,
             key_bindings=kb,
@@ -149,6 +414,9 @@ def run() -> None:
     except Exception as exc:
         console.print(f"[bold red]Unexpected error: {exc}[/bold red]")
         console.print_exception()
+    finally:
+        if agent:
+            agent.close()
 
 
 if __name__ == "__main__":
@@ -1,9 +1,9 @@
+import contextlib
 import os
 import time
 import json
 import re
 import requests
-import subprocess
 import inquirer
 from rich.console import Console
 from rich.panel import Panel
@@ -15,27 +15,50 @@ from rich.align import Align
 import google.generativeai as genai
 import hashlib
 from src import config
-from src.vector_store import VectorStore
+from src.vector_store import IndexLockedError, VectorStore, chunk_payload
+from src.transaction import Journal, TransactionError
+from src.dependencies import BackgroundInstall, DependencyInstaller, InstallError
+from src.llm import GeminiClient, generate_text
+from src.prompts import ANSWER_INSTRUCTIONS, PLAN_INSTRUCTIONS, answer_turn, plan_turn
+from src.session import GeminiPromptCache, LocalPromptCache, Session
+from src.project import Project
+from src.index_pool import IndexPool
+from src.import_graph import ImportGraph
+from src.file_context import FileContextLoader
+from src.plan_cache import PlanCache
+from src.snapshot import export_snapshot, import_snapshot
+from src.ingest import IngestRules, chunk_text
+from src.router import router
 from typing import List
 
 
 class Agent:
-    def __init__(self, initialize: bool = True):
-        self.console = Console()
+    def __init__(self, initialize: bool = True, interactive: bool = True, pool_size: int = 10, project_root: str | None = None, llm: GeminiClient | None = None, index_pool: IndexPool | None = None):
+        self.interactive = interactive
+        # Progress output is silenced in batch/daemon mode; configuration errors never are.
+        self.console = Console(quiet=not interactive)
+        self.error_console = Console(stderr=True)
+        self.project = Project(project_root)
+        self.index_pool = index_pool
         self.vector_store: VectorStore | None = None
+        self.session: Session | None = None
+        self.import_graph: ImportGraph | None = None
+        self.file_loader = FileContextLoader(self.project.root, console=self.console)
+        self.plan_cache = PlanCache(self.project) if config.PLAN_CACHE else None
         if config.GEMINI_API_KEY == "YOUR_API_KEY_HERE":
-            self.console.print(
+            self.error_console.print(
                 Panel(
                     "[bold red]GEMINI_API_KEY is not set. Please add it to your .env.[/bold red]",
                     title="Configuration Error",
                     border_style="red",
                 )
             )
-            raise SystemExit
+            raise SystemExit(1)
         genai.configure(api_key=config.GEMINI_API_KEY)
+        self.llm = llm or GeminiClient(pool_size=pool_size)
         if initialize:
-            if not os.path.exists(config.QDRANT_PATH):
-                self.console.print(
+            if not os.path.exists(self.project.qdrant_path):
+                self.error_console.print(
                     Panel(
                         "[bold red]Project not initialized![/bold red]\nRun "
                         "`python agent/orchid.py init` first.",
@@ -43,7 +66,7 @@ class Agent:
                         border_style="red",
                     )
                 )
-                raise SystemExit
+                raise SystemExit(1)
             self._load_context()
     
     def think(self, message):
@@ -52,11 +75,18 @@ class Agent:
     def act(self, message):
         self.console.print(f"\n[bold green]🌸 OrchidAI is in action...\n[/bold green]  [italic]{message}[/italic]")
 
+    def status(self, message, **kwargs):
+        """Spinner for interactive use; a no-op when tasks run concurrently in batch mode."""
+        if not self.interactive:
+            return contextlib.nullcontext()
+        return self.console.status(message, **kwargs)
+
     def show_code(self, code, language="typescript"):
         self.console.print(Syntax(code, language, theme="monokai", line_numbers=True, word_wrap=True))
 
     @staticmethod
-    def _project_hash(file_paths: List[str]) -> str:
+    def project_hash(file_paths: List[str]) -> str:
+        """Collection name for a set of files: changes whenever a file is added, removed or modified."""
         hasher = hashlib.sha256()
         for path in sorted(file_paths):
             try:
@@ -66,23 +96,80 @@ class Agent:
                 continue
         return hasher.hexdigest()
 
+    def source_files(self, report: bool = False) -> List[str]:
+        """
+        Absolute paths of the project files that get indexed (see `IngestRules`).
+        With `report`, says how many files were left out and why.
+        """
+        rules = IngestRules(self.project.root, cache_path=os.path.join(self.project.state_path, "ingest_cache.json"))
+        files = rules.discover()
+        skipped = ", ".join(f"{len(paths)} {reason}" for reason, paths in rules.skipped.items() if paths)
+        if report and skipped:
+            self.console.print(f"[dim]Skipping files: {skipped}.[/dim]")
+        return files
+
+    def chunk_files(self, file_paths: List[str]) -> List[dict]:
+        """Splits files into the chunk payloads stored in the vector store."""
+        chunks = []
+        for file_path in track(file_paths, description="[green] ➜  Analyzing project files...[/green]", console=self.console):
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                for offset, code in chunk_text(os.path.relpath(file_path, self.project.root), content):
+                    chunks.append(chunk_payload(self.project.root, file_path, code, offset))
+            except Exception as e:
+                self.console.print(f"[bold red]Could not read file {file_path}: {e}[/bold red]")
+        return chunks
+
+    def new_session(self, prompt_cache: LocalPromptCache) -> Session:
+        """A session over the loaded index that prints through this agent's console."""
+        return Session(self.vector_store, prompt_cache, project_root=self.project.root, import_graph=self.import_graph, file_loader=self.file_loader, console=self.console)
+
+    def _open_store(self, collection_name: str) -> VectorStore:
+        """Opens the project's vector store, explaining (and exiting) when another process holds it."""
+        try:
+            return VectorStore(collection_name=collection_name, qdrant_path=self.project.qdrant_path, state_path=self.project.state_path)
+        except IndexLockedError as e:
+            self.error_console.print(Panel(f"[bold red]{e}[/bold red]", title="Index In Use", border_style="red"))
+            raise SystemExit(1)
+
     def _load_context(self):
         if self.vector_store:
             return
 
-        all_files = [
-            os.path.join(root, name)
-            for root, _, files in os.walk(config.SRC_PATH)
-            for name in files
-            if "node_modules" not in root
-            and ".next" not in root
-            and name.endswith((".ts", ".tsx", ".js", ".jsx"))
-        ]
-
-        project_hash = self._project_hash(all_files)
-        self.vector_store = VectorStore(collection_name=project_hash)
+        all_files = self.source_files()
 
-        if not self.vector_store.collection_exists():
+        project_hash = self.project_hash(all_files)
+        if self.index_pool:
+            self.vector_store = self.index_pool.get(self.project, project_hash)
+        else:
+            self.vector_store = self._open_store(project_hash)
+        # Only files whose mtime changed since the last run are re-parsed.
+        self.import_graph = ImportGraph(self.project)
+        self.import_graph.update(all_files)
+        prompt_cache = GeminiPromptCache(self.llm) if config.CONTEXT_CACHING else LocalPromptCache()
+        self.session = self.new_session(prompt_cache)
+
+        if not self.vector_store.schema_current():
+            self.console.print(
+                Panel(
+                    "[bold yellow]The index predates scoped search[/bold yellow] (@dir/ and glob mentions, "
+                    "`--dir`/`--ext`/`--kind`), so those searches are not scoped. "
+                    "Rebuild it with `python agent/orchid.py init`.",
+                    title="Outdated Index",
+                    border_style="yellow",
+                )
+            )
+        elif self.vector_store.collection_exists() and not self.vector_store.is_complete():
+            self.console.print(
+                Panel(
+                    "[bold yellow]Indexing did not finish.[/bold yellow] "
+                    "Resume it with `python agent/orchid.py init`.",
+                    title="Incomplete Index",
+                    border_style="yellow",
+                )
+            )
+        elif not self.vector_store.collection_exists():
             self.console.print(
                 Panel(
                     "[bold yellow]Codebase has changed.[/bold yellow] "
@@ -96,31 +183,69 @@ class Agent:
     def initialize_project(self):
         """Scans all files and builds the vector store from scratch."""
         self.think("First, I need to analyze the project and build a semantic understanding of the code.")
-        all_files = [
-            os.path.join(root, name)
-            for root, _, files in os.walk(config.SRC_PATH)
-            for name in files
-            if "node_modules" not in root
-            and ".next" not in root
-            and name.endswith((".ts", ".tsx", ".js", ".jsx"))
-        ]
-
-        project_hash = self._project_hash(all_files)
-        self.vector_store = VectorStore(collection_name=project_hash)
+        all_files = self.source_files(report=True)
 
-        chunks = []
-        for file_path in track(all_files, description="[green] ➜  Analyzing project files...[/green]"):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    for i in range(0, len(content), 1000):
-                        chunks.append({"path": file_path, "code": content[i:i+1000]})
-            except Exception as e:
-                self.console.print(f"[bold red]Could not read file {file_path}: {e}[/bold red]")
-        
-        self.vector_store.build_collection(chunks)
+        project_hash = self.project_hash(all_files)
+        self.vector_store = self._open_store(project_hash)
+
+        self.vector_store.build_collection(self.chunk_files(all_files))
+        self.import_graph = ImportGraph(self.project)
+        self.import_graph.update(all_files)
         self.console.print("\n[bold green](✓) Project Initialized Successfully![/bold green]\n")
 
+    def refresh_index(self) -> dict:
+        """
+        Brings the loaded index up to date with the project files without
+        opening a second Qdrant client (for the daemon, which holds the store).
+        The collection for the current files is seeded with the points of the
+        loaded one, so only new and changed chunks are embedded and stale ones
+        are dropped. Returns `{"collection", "changed", "files"}`; when
+        `changed`, the agent must be reloaded to search the new collection.
+        """
+        all_files = self.source_files()
+        project_hash = self.project_hash(all_files)
+        current = self.vector_store
+        if project_hash == current.collection_name and current.is_complete():
+            return {"collection": project_hash, "changed": False, "files": len(all_files)}
+        store = current.with_collection(project_hash)
+        if project_hash != current.collection_name and current.is_complete() and not store.collection_exists():
+            store.restore(current.iter_points(), current.dimension())
+        store.build_collection(self.chunk_files(all_files))
+        self.import_graph.update(all_files)
+        return {"collection": project_hash, "changed": True, "files": len(all_files)}
+
+    def export_index(self, out_path: str) -> dict:
+        """Writes the current index to a portable snapshot file."""
+        with self.status("[bold green]Exporting index snapshot…[/bold green]", spinner="dots"):
+            manifest = export_snapshot(self.vector_store, self.project, self.source_files(), out_path)
+        size_mb = os.path.getsize(out_path) / (1024 * 1024)
+        self.console.print(
+            f"[bold green](✓) Exported {manifest['points']} snippets from {len(manifest['files'])} files "
+            f"to {out_path} ({size_mb:.1f} MB).[/bold green]"
+        )
+        return manifest
+
+    def import_index(self, snapshot_path: str) -> dict:
+        """Loads a snapshot, then embeds only the files that differ from it."""
+        all_files = self.source_files(report=True)
+        self.vector_store = self._open_store(self.project_hash(all_files))
+        with self.status("[bold green]Loading index snapshot…[/bold green]", spinner="dots"):
+            stats = import_snapshot(snapshot_path, self.vector_store, self.project, all_files)
+
+        if stats["snapshot_commit"] and stats["snapshot_commit"] != stats["commit"]:
+            self.console.print(f"[dim]Snapshot was built at commit {stats['snapshot_commit'][:12]}; this checkout is at {(stats['commit'] or 'unknown')[:12]}.[/dim]")
+        self.console.print(
+            f"[green]Loaded {stats['loaded_points']}/{stats['snapshot_points']} snippets for {stats['unchanged_files']} unchanged files.[/green]"
+        )
+        if stats["removed_files"]:
+            self.console.print(f"[dim]Dropped {len(stats['removed_files'])} files that no longer exist.[/dim]")
+        if stats["changed_files"]:
+            self.act(f"Re-indexing {len(stats['changed_files'])} files that differ from the snapshot.")
+        self.vector_store.build_collection(self.chunk_files(all_files))
+        self.import_graph = ImportGraph(self.project)
+        self.import_graph.update(all_files)
+        return stats
+
     def _classify_intent(self, query: str) -> str:
         """Classifies the user's intent as a build request or a question."""
         self.think("Classifying user intent...")
@@ -157,9 +282,10 @@ class Agent:
         """
 
         try:
-            model = genai.GenerativeModel("gemini-2.5-flash-lite-preview-06-17")
-            response = model.generate_content(prompt)
-            lines = [l.strip() for l in response.text.strip().splitlines() if l.strip()]
+            model = router.model_for("classify_intent")
+            with router.track(model):
+                text = generate_text(model, prompt)
+            lines = [l.strip() for l in text.strip().splitlines() if l.strip()]
             label = lines[0].lower() if lines else "build_request"
             reason = lines[1] if len(lines) > 1 else "No reason returned."
 
@@ -167,7 +293,8 @@ class Agent:
                 label, reason = "build_request", "Model returned unexpected label."
             self.last_intent_reason = reason
             self.console.status("[bold blue]Breaking down user's prompt.")
-            time.sleep(1)
+            if self.interactive:
+                time.sleep(1)
             self.console.print(f"[bold cyan]➜ Got it, {reason}[/bold cyan]")
             return label
 
@@ -255,9 +382,10 @@ class Agent:
         """
 
         try:
-            model = genai.GenerativeModel("gemini-2.5-flash")
-            response = model.generate_content(prompt)
-            lines = [l.strip() for l in response.text.strip().splitlines() if l.strip()]
+            model = router.model_for("classify_database")
+            with router.track(model):
+                text = generate_text(model, prompt)
+            lines = [l.strip() for l in text.strip().splitlines() if l.strip()]
 
             label = lines[0] if lines else "Unknown"
             reason = lines[1] if len(lines) > 1 else "No reason returned."
@@ -267,7 +395,8 @@ class Agent:
 
             self.last_db_reason = reason
             self.console.status("\n[bold blue]Is the user asking for database operation/implementation?\n")
-            time.sleep(1)
+            if self.interactive:
+                time.sleep(1)
             self.console.print(f"[bold cyan]➜ Perfect, {reason}[/bold cyan]")
 
             return label
@@ -279,6 +408,29 @@ class Agent:
             self.last_db_reason = "Defaulted due to error."
             return "Unknown"
 
+    def _detect_configured_database(self) -> tuple[bool, str | None]:
+        """Checks package.json for Drizzle plus a driver and returns (configured, db_type)."""
+        package_json_path = os.path.join(self.project.root, "package.json")
+        try:
+            with open(package_json_path, "r") as f:
+                deps = json.load(f).get("dependencies", {})
+        except FileNotFoundError:
+            self.console.print("[yellow]Warning: package.json not found.[/yellow]")
+            return False, None
+
+        configured_db = "Supabase" if "pg" in deps else "SQLite" if "better-sqlite3" in deps else None
+        return "drizzle-orm" in deps and configured_db is not None, configured_db
+
+    def resolve_database(self, task: str) -> str:
+        """Non-interactive counterpart of the database setup in `_execute_build_task`."""
+        db_type = self._classify_database_intent(task)
+        if db_type == "Unsupported":
+            db_type = "Unknown"
+        is_configured, configured_db = self._detect_configured_database()
+        if is_configured and db_type == "Unknown" and configured_db:
+            db_type = configured_db
+        return db_type
+
     def _execute_build_task(self, task: str, user_files: List[str]):
         """Handles the workflow for building a feature."""        
         db_type = self._classify_database_intent(task)
@@ -287,27 +439,12 @@ class Agent:
             self.console.print("[bold red]Sorry, the database you mentioned is not supported.[/bold red]")
             db_type = "Unknown" 
 
-        package_json_path = os.path.join(config.PROJECT_ROOT, "package.json")
-        is_configured = False
-        try:
-            with open(package_json_path, "r") as f:
-                deps = json.load(f).get("dependencies", {})
-                drizzle_installed = "drizzle-orm" in deps
-                driver_installed = "pg" in deps or "better-sqlite3" in deps
-                if drizzle_installed and driver_installed:
-                    is_configured = True
-        except FileNotFoundError:
-            self.console.print("[yellow]Warning: package.json not found.[/yellow]")
+        is_configured, configured_db = self._detect_configured_database()
 
         if is_configured:
             self.act("Project analysis complete. It seems Drizzle and a database are already configured.")
-            if db_type == "Unknown": 
-                with open(package_json_path, "r") as f:
-                    deps = json.load(f).get("dependencies", {})
-                    if "pg" in deps:
-                        db_type = "Supabase"
-                    elif "better-sqlite3" in deps:
-                        db_type = "SQLite"
+            if db_type == "Unknown" and configured_db:
+                db_type = configured_db
         
         elif not is_configured and db_type == "Unknown":
             self.act("I see your project isn't fully configured. Let's set one up!")
@@ -327,9 +464,11 @@ class Agent:
             if db_type in ["MongoDB", "Supabase"]:
                 self._setup_env_file(db_type)
 
-        plan = self._generate_plan_with_gemini(task, db_type, user_files)
+        plan, cache_entry, reused = self._generate_plan_with_gemini(task, db_type, user_files)
         if plan:
-            self._execute_plan(plan)
+            applied = self._execute_plan(plan)
+            if cache_entry is not None:
+                self._update_plan_cache(cache_entry, reused, applied)
             if plan.get("plan"):
                 self.console.print(Panel("[bold green](✓) All tasks completed successfully![/bold green]"))
         else:
@@ -353,7 +492,7 @@ class Agent:
         
         if inquirer.prompt([inquirer.Confirm('proceed', message="Write these values to .env?", default=True)])['proceed']:
             try:
-                env_path = os.path.join(config.PROJECT_ROOT, ".env")
+                env_path = os.path.join(self.project.root, ".env")
                 with open(env_path, "a", encoding="utf-8") as f:
                     f.write("\n\n# Added by Orchid AI Agent\n")
                     for key, value in env_vars.items():
@@ -412,121 +551,99 @@ class Agent:
 
         return None
 
-    def _generate_plan_with_gemini(self, task, db_type, user_files: List[str] = None):
-        self.think(f"Searching for code relevant to '{task}'...")
-        relevant_chunks = self.vector_store.search(task)
-        context = "\n".join([f"--- START OF {chunk['path']} ---\n{chunk['code']}\n--- END OF {chunk['path']} ---" for chunk in relevant_chunks])
-
-        user_file_context = ""
-        if user_files:
-            self.think("Loading content from user-specified files...")
-            for file_path in user_files:
-                try:
-                    full_path = os.path.join(config.PROJECT_ROOT, file_path)
-                    with open(full_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    user_file_context += f"--- START OF {file_path} ---\n{content}\n--- END OF {file_path} ---\n\n"
-                except FileNotFoundError:
-                    self.console.print(f"[yellow]Warning: File not found: {file_path}[/yellow]")
-                 
-        
-        prompt = f"""
-        You are **Orchid**, an elite Next.js + TypeScript + Drizzle-ORM engineer.  
-        Your job is to transform the user's request into a precise, AUTOMATED **build plan** for our CLI agent.
-
-        ────────────────────────────────────────────────────────
-        ## 1   Input Context (what you know)
-
-        **User Request (verbatim):**  
-        \"{task}\"
-
-        **User-Provided File Context (High Priority):**  
-        {user_file_context or "None"}
-
-        **Project Context (Medium Priority):**  
-        • Database Type 👉 {db_type}  
-        • Relevant existing code snippets (searched automatically):  
-        {context}
-
-        _Assume everything not shown to you already exists and compiles._
+    def _report_context(self, stats: dict) -> None:
+        if stats["prefix_reused"]:
+            how = "from Gemini's context cache" if stats["cached"] else "from this session"
+            self.console.print(
+                f"[dim]Reused {stats['prefix_chars']:,} chars of context {how}; sending {stats['turn_chars']:,} new chars.[/dim]"
+            )
 
-        ────────────────────────────────────────────────────────
-        ## 2   Your Mission
-
-        1. **Analyse** the request:  
-        • Does it call for *one* table, multiple tables, or new columns in an existing one?  
-        • Does the user need seed/fixture data?  
-        • Do we need an **API route** (RESTful or Next.js Route Handler) to fetch/update data?  
-        • BONUS (if the request hints at it): Wire the new API into existing React / client code so the UI really works.
-
-        2. **Generate a build plan** consisting of a list of *atomic* actions:  
-        - **CREATE_FILE** - for brand-new files (schema, route, seed, utils, etc.)  
-        - **UPDATE_FILE** - always include the **full, updated file** (not a diff) when editing.
-
-        3. **Cover edge cases & completeness**  
-        - Migrations: include `drizzle.config.ts` or migration files if not present.  
-        - Environment variables: if a new `DATABASE_URL`, `SUPABASE_URL`, etc. is needed, create or update `.env.example`.  
-        - Type-safety: export proper types (`typeof myTable.$inferSelect`).  
-        - Error handling: return 500 JSON on DB failure.  
-        - API route headers: set `dynamic = "force-dynamic"` for fresh data if needed.  
-        - Pagination / ordering if lists could grow large.  
-        - Empty state in the React component (`"No data yet"`).  
-        - **NEVER** leave TODOs—produce compile-ready code.
-
-        4. **Dependencies**  
-        - List every npm package not already standard in Drizzle/Next.js (e.g. `@planetscale/database`).  
-        - Omit duplicates.
+    def _route(self, session: Session, kind: str, keys: List[str]) -> dict:
+        # Sticky per session: moving down a tier would re-upload the cached prefix for another model.
+        route = router.route(kind, **session.context_size(keys), at_least=session.route_tiers.get(kind))
+        session.route_tiers[kind] = route["tier"]
+        self.console.print(f"[dim]Routing to {route['model']} ({route['tier']} tier).[/dim]")
+        return route
+
+    def _generate(self, session: Session, kind: str, route: dict, body: dict) -> str:
+        """Sends `body` to the routed model, hedging with an inline copy of the request when it has a fallback."""
+        fallback_body = session.inline_body(kind) if route["fallback"] else None
+        text, model = router.generate(self.llm, route, body, fallback_body)
+        if model != route["model"]:
+            self.console.print(f"[dim]{route['model']} was slow to respond; used {model} instead.[/dim]")
+        return text
+
+    def _cached_plan(self, task: str, db_type: str, embedding: List[float]) -> dict | None:
+        """Offers the cache entry of a near-identical earlier task whose files are in the same state."""
+        hit = self.plan_cache.lookup(task, db_type, embedding)
+        if hit is None:
+            return None
+        steps = len(hit["plan"].get("plan", []))
+        self.act(
+            f"I made a plan for a very similar task before ({hit['similarity']:.0%} match, {steps} steps):\n"
+            f"  [dim]{hit['task']}[/dim]"
+        )
+        if inquirer.prompt([inquirer.Confirm('reuse', message="Reuse that plan instead of generating a new one?", default=True)])['reuse']:
+            self.session.record_turn(task)
+            return hit
+        return None
 
-        ────────────────────────────────────────────────────────
-        ## 3   Common Request Patterns & How to Handle
+    def _generate_plan_with_gemini(self, task, db_type, user_files: List[str] = None) -> tuple[dict | None, dict | None, bool]:
+        """
+        Returns the plan, its plan-cache entry (to be stored once the plan is
+        applied) and whether that entry was reused from the cache.
+        """
+        embedding = None
+        if self.plan_cache is not None and self.plan_cache.has_entries(db_type):
+            try:
+                embedding = self.plan_cache.embed(task)
+            except Exception as e:
+                self.console.print(f"[dim]Plan cache unavailable: {e}[/dim]")
+        if embedding is not None:
+            hit = self._cached_plan(task, db_type, embedding)
+            if hit is not None:
+                return hit["plan"], hit, True
 
-        | Pattern (examples) | What You Should Produce |
-        |--------------------|-------------------------|
-        | “Store *X* in a table” | • New `X` table in `schema.ts`<br>• Seed file inserting sample rows (optional but nice)<br>• `src/app/api/x/route.ts` with GET/POST handlers<br>• Update frontend component to fetch from `/api/x` |
-        | “Create tables for A and B” | Same as above **for each** table, or a single table with enum `category` if truly appropriate (explain choice in `thought`) |
-        | “BONUS: integrate route into existing code” | Modify the specified React/TSX file(s) to call `fetch('/api/...')`, handle loading, and render data. Remove hard‑coded arrays. |
-        | “Refactor existing table to add column Y” | Drizzle `ALTER TABLE` migration file + updated `schema.ts` + any necessary UI/api changes. |
-        | Database unspecified | Respect **{db_type}**. If `Unknown`, default to Postgres‑style (Supabase) unless the codebase clearly shows SQLite or Mongo pattern. |
+        self.think(f"Searching for code relevant to '{task}'...")
+        if user_files:
+            self.think("Loading content from user-specified files...")
+        keys = self.session.gather(task, user_files)
+        plan = self.request_plan(self.session, task, db_type, keys)
+        entry = None
+        if plan is not None and self.plan_cache is not None and plan.get("plan"):
+            entry = self.plan_cache.prepare(task, db_type, plan, self.file_loader.expand(user_files or []), embedding)
+        return plan, entry, False
+
+    def _update_plan_cache(self, entry: dict, reused: bool, applied: bool) -> None:
+        """Remembers applied plans; forgets a cached plan that was offered again but not applied."""
+        try:
+            if applied:
+                self.plan_cache.store(entry)
+            elif reused:
+                self.plan_cache.discard(entry["task"], entry["db_type"])
+        except Exception as e:
+            self.console.print(f"[dim]Could not update the plan cache: {e}[/dim]")
+
+    def request_plan(self, session: Session, task: str, db_type: str, keys: List[str]) -> dict | None:
+        """Asks Gemini for a build plan over the context `keys` gathered in `session`."""
+        route = self._route(session, "plan", keys)
+        data, stats = session.build_request(
+            "plan",
+            PLAN_INSTRUCTIONS,
+            keys,
+            lambda files, context, history: plan_turn(task, db_type, files, context, history),
+            model=route["model"],
+        )
+        self._report_context(stats)
+        session.record_turn(task)
 
-        ────────────────────────────────────────────────────────
-        ## 4   Output Format (STRICT)
-
-        Return **ONLY** a valid JSON object **exactly** like:  
-
-        ```json
-        {{
-        "dependencies": ["package-1", "package-2"],
-        "plan": [
-            {{
-            "action": "CREATE_FILE",
-            "path": "path/to/new/file.ts",
-            "thought": "One-sentence rationale.",
-            "code": "FULL COMPILE-READY FILE CONTENT HERE"
-            }},
-            {{
-            "action": "UPDATE_FILE",
-            "path": "path/to/existing/file.tsx",
-            "thought": "Why we must update it.",
-            "code": "ENTIRE UPDATED SOURCE FILE CONTENT"
-            }}
-        ]
-        }}
-        """
-        headers = {"Content-Type": "application/json"}
-        data = {"contents": [{"parts": [{"text": prompt}]}]}
-        
         max_retries = 5
         base_wait_time = 2
-        
+
         for i in range(max_retries):
             try:
-                with self.console.status("[bold green] 🌸 OrchidAI is thinking...[/bold green]"):
-                    response = requests.post(config.GEMINI_API_URL, headers=headers, json=data, timeout=180)
-                    response.raise_for_status()
-                
-                gemini_text = (
-                    response.json()["candidates"][0]["content"]["parts"][0]["text"]
-                )
+                with self.status("[bold green] 🌸 OrchidAI is thinking...[/bold green]"):
+                    gemini_text = self._generate(session, "plan", route, data)
 
                 plan = self._extract_json(gemini_text)
                 if plan is None:
@@ -537,17 +654,16 @@ class Agent:
 
                 return plan   
 
-            except (requests.RequestException, KeyError) as err:
-                self.console.print(f"[red]HTTP or parsing error: {err} – retrying…[/red]")
-
             except requests.exceptions.HTTPError as e:
-                if e.response.status_code == 429:
+                if e.response is not None and e.response.status_code == 429:
                     wait_time = base_wait_time ** i
                     self.console.print(f"[bold yellow]Rate limit hit. Waiting for {wait_time}s... ({i+1}/{max_retries})[/bold yellow]")
                     time.sleep(wait_time)
                 else:
                     self.console.print(f"[bold red]HTTP error: {e}[/bold red]")
                     return None
+            except (requests.RequestException, KeyError) as err:
+                self.console.print(f"[red]HTTP or parsing error: {err} – retrying…[/red]")
             except Exception as e:
                 self.console.print(f"[bold red]Error interacting with Gemini: {e}[/bold red]")
                 return None
@@ -561,137 +677,55 @@ class Agent:
 
     def _generate_answer_with_gemini(self, query, user_files: List[str] = None):
         
-        with self.console.status("[bold green]🌸 Searching for relevant code… \n", spinner="dots"):
-            relevant_chunks = self.vector_store.search(query)
-        context = "\n".join(
-            f"--- START OF {c['path']} ---\n{c['code']}\n--- END OF {c['path']} ---"
-            for c in relevant_chunks
-        )
-
-        user_file_context = ""
-        self.think("Loading content from user-specified files...")
-        if user_files:
-            with self.console.status("[bold green]📂 Loading user files…", spinner="dots"):
-                for file_path in user_files:
-                    try:
-                        full_path = os.path.join(config.PROJECT_ROOT, file_path)
-                        with open(full_path, "r", encoding="utf-8") as f:
-                            content = f.read()
-                        user_file_context += (
-                            f"--- START OF {file_path} ---\n{content}\n--- END OF {file_path} ---\n\n"
-                        )
-                    except FileNotFoundError:
-                        self.console.print(
-                            f"[yellow]Warning: File not found: {file_path}[/yellow]"
-                        )
-                    except Exception as e:
-                        self.console.print(
-                            f"[red]Error reading file {file_path}: {e}[/red]"
-                        )
-        prompt = f"""
-        You are **Orchid**, an expert Next.js / Drizzle-ORM developer and database specialist. 
-        ────────────────────────────────────────────────────────
-        ## 1   Determine the user's INTENT
-
-        - **Implementation request** the user clearly asks to create, modify, delete, refactor, or set up code or database functionality, or wants step-by-step build instructions.<br>
-        *Key verbs / phrases:* add, build, implement, generate, integrate, migrate, refactor, “how do I …”, “set up …”, “please create …”.
-
-        - **Information request** the user only wants an explanation, summary, clarification, comparison, list, or advice, **without** asking for new code or database changes.<br>
-        *Key verbs / phrases:* what, why, explain, describe, summarize, list, compare, “do I need to …”, “should I …”.
-
-        **Edge-case rules**
+        with self.status("[bold green]🌸 Searching for relevant code… \n", spinner="dots"):
+            keys = self.session.gather(query, user_files)
 
-        1. Mixed intent → treat as *implementation* (action overrides inquiry).  
-        2. Advice questions (“Should I delete X?”) → *information*.  
-        3. Hypothetical “How would I integrate Y?” → *implementation*.  
-        4. Brief / ambiguous queries default to *information*.  
-        5. Gratitude / small-talk → polite short reply (*information*).  
-        6. When unsure, favour *information*.
-
-        ────────────────────────────────────────────────────────
-        ## 2   Respond according to INTENT
-
-        ### A) Implementation request  
-        *Return **only** the JSON plan* described in **Output Format for Implementation** below.
-
-        ### B) Information request  
-        1. Give a clear, technically-accurate Markdown answer using any **User-Provided File Context** and **Relevant Code Snippets**.  
-        2. **DO NOT** output a JSON plan.  
-        3. End with exactly this line (verbatim, one sentence, italics):  
-
-        > *Because I'm a database agent I focus on implementing data features—if you'd like me to turn this explanation into working code, just ask!*
-
-        ────────────────────────────────────────────────────────
-        ## 3- Context Available to You
-        **User-Request:** \"{query}\"
-
-        **User-Provided-File-Context (High Priority):**
-        {user_file_context or "None"}
-
-        **Relevant-Code-Snippets (from automatic search):**
-        {context}
-
-        ────────────────────────────────────────────────────────
-        ## Output Format for Implementation
-        Respond with **ONLY** a valid JSON object:
-
-        ```json
-        {{
-        "dependencies": ["package-name-if-needed"],
-        "plan": [
-            {{
-            "action": "CREATE_FILE",
-            "path": "path/to/new/file.ts",
-            "thought": "Short explanation of why this file is needed.",
-            "code": "FULL_CODE_FOR_THE_FILE"
-            }},
-            {{
-            "action": "UPDATE_FILE",
-            "path": "path/to/existing/file.tsx",
-            "thought": "Short explanation of the update.",
-            "code": "ENTIRE_UPDATED_FILE_CONTENT"
-            }}
-        ]
-        }}
-        ```
-        """
+        answer = self.request_answer(self.session, query, keys)
+        if answer is None:
+            return
 
-        headers = {"Content-Type": "application/json"}
-        data = {"contents": [{"parts": [{"text": prompt}]}]}
+        md_renderable = Markdown(answer, justify="left", code_theme="monokai")
+        panel = Panel(
+            Align.left(md_renderable),
+            title="[bold cyan]🌸 Orchid's Answer[/bold cyan]",
+            border_style="cyan",
+            padding=(1, 2),
+            expand=True,
+        )
+        self.console.print(panel)
+
+    def request_answer(self, session: Session, query: str, keys: List[str]) -> str | None:
+        """Asks Gemini to answer `query` over the context `keys` gathered in `session`."""
+        route = self._route(session, "answer", keys)
+        data, stats = session.build_request(
+            "answer",
+            ANSWER_INSTRUCTIONS,
+            keys,
+            lambda files, context, history: answer_turn(query, files, context, history),
+            model=route["model"],
+        )
+        self._report_context(stats)
+        session.record_turn(query)
 
         try:
-            with self.console.status(
+            with self.status(
                 "[bold green] OrchidAI is thinking and generating answer…", spinner="dots", spinner_style="green"
             ):
-                response = requests.post(
-                    config.GEMINI_API_URL, headers=headers, json=data, timeout=180
-                )
-                response.raise_for_status()
-
-            answer = response.json()["candidates"][0]["content"]["parts"][0]["text"].strip()
-
-            md_renderable = Markdown(answer, justify="left", code_theme="monokai")
-            panel = Panel(
-                Align.left(md_renderable),
-                title="[bold cyan]🌸 Orchid's Answer[/bold cyan]",
-                border_style="cyan",
-                padding=(1, 2),
-                expand=True,
-            )
-            self.console.print(panel)
-
+                return self._generate(session, "answer", route, data).strip()
         except requests.exceptions.RequestException as e:
             self.console.print(f"[bold red]Error during API request: {e}[/bold red]")
         except (KeyError, IndexError, ValueError):
             self.console.print(
                 "[bold red]Unexpected response format from Gemini API.[/bold red]"
             )
+        return None
     
-    def _execute_plan(self, full_plan):
+    def _execute_plan(self, full_plan) -> bool:
+        """Reviews the plan step by step and applies the approved changes; returns whether any were written."""
 
         if not full_plan:
             self.console.print("[bold red]No valid plan received. Aborting.[/bold red]")
-            return
+            return False
 
         self.console.print(Panel("[bold yellow]Gemini has generated the following plan. Please review carefully.[/bold yellow]", title="Execution Plan"))
         
@@ -714,28 +748,40 @@ class Agent:
         self.console.print(summary_table)
         if not inquirer.prompt([inquirer.Confirm('proceed_summary', message="Do you want to proceed with reviewing this plan step-by-step?", default=True)])['proceed_summary']:
             self.console.print("[bold yellow]Operation cancelled by user.[/bold yellow]")
-            return
+            return False
 
         dependencies = full_plan.get("dependencies", [])
+        install = None
         if dependencies:
-            self.act(f"Plan requires new dependencies: [bold yellow]{', '.join(dependencies)}[/bold yellow]")
-            if inquirer.prompt([inquirer.Confirm('install', message="Install them with 'npm install'?", default=True)])['install']:
-                try:
-                    command = ["npm", "install", "--legacy-peer-deps"] + dependencies
-                    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1, shell=True, cwd=config.PROJECT_ROOT) as proc:
-                        for line in proc.stdout: self.console.print(line, end='')
-                    
-                    if proc.returncode == 0:
-                        self.console.print("[green](✓) Dependencies installed.[/green]")
-                    else:
-                        self.console.print(f"[bold red]Installation failed with exit code {proc.returncode}. Aborting.[/bold red]")
-                        return
-                except Exception as e:
-                    self.console.print(f"[bold red]Error installing dependencies: {e}[/bold red]")
-                    return
-            else:
-                self.console.print("[yellow]Skipping dependency installation.[/yellow]")
+            installer = DependencyInstaller(self.project.root, log_dir=os.path.join(self.project.state_path, "logs"))
+            missing = installer.missing(dependencies)
+            already_installed = [d for d in dependencies if d.strip() not in missing]
+            if already_installed:
+                self.console.print(f"[dim]Already installed: {', '.join(already_installed)}[/dim]")
+            if missing:
+                self.act(f"Plan requires new dependencies: [bold yellow]{', '.join(missing)}[/bold yellow]")
+                if inquirer.prompt([inquirer.Confirm('install', message=f"Install them with '{installer.manager}'?", default=True)])['install']:
+                    try:
+                        install = installer.start(missing)
+                        self.console.print("[dim]Installing in the background while you review the plan…[/dim]")
+                    except InstallError as e:
+                        self.console.print(f"[bold red]Error installing dependencies: {e}[/bold red]")
+                        return False
+                else:
+                    self.console.print("[yellow]Skipping dependency installation.[/yellow]")
 
+        applied = False
+        try:
+            applied = self._apply_steps(plan_steps, install)
+        finally:
+            if install is not None and not applied:
+                # Nothing was applied, so the install must not leave package.json or the lockfile changed.
+                install.cancel()
+                self.console.print("[dim]Stopped the dependency installation and restored package.json and the lockfile.[/dim]")
+        return applied
+
+    def _apply_steps(self, plan_steps: List[dict], install: BackgroundInstall | None) -> bool:
+        """Asks for approval of each step and writes the approved changes in one transaction."""
         staged_changes = {}
         user_cancelled = False
 
@@ -754,27 +800,67 @@ class Agent:
                 user_cancelled = True
                 break
         
+        if install and staged_changes and not self._await_install(install):
+            if not inquirer.prompt([inquirer.Confirm('apply_anyway', message="Dependency installation failed. Apply the approved file changes anyway?", default=False)])['apply_anyway']:
+                self.console.print("[bold yellow]All changes have been discarded.[/bold yellow]")
+                return False
+
         if user_cancelled and staged_changes:
             if inquirer.prompt([inquirer.Confirm('partial_commit', message=f"You cancelled the operation. Apply the {len(staged_changes)} changes you already approved?", default=False)])['partial_commit']:
                  self.act("Applying previously approved changes...")
             else:
                 self.console.print("[bold yellow]All changes have been discarded.[/bold yellow]")
-                return
+                return False
         elif user_cancelled:
              self.console.print("[bold yellow]All changes have been discarded.[/bold yellow]")
-             return
+             return False
         
         if staged_changes:
+            if install is not None and install.proc.returncode == 0:
+                # Written through the journal too, so `undo` also reverts the dependency changes.
+                staged_changes.update(install.take_manifest_changes(staged_changes))
+                for path in install.conflicts:
+                    self.console.print(f"[yellow]Kept the plan's version of {path}; re-run the install for {', '.join(install.packages)} afterwards.[/yellow]")
+            elif install is not None:
+                install.cancel()
             self.act("Committing all approved changes to the filesystem...")
-            for path, code in staged_changes.items():
-                try:
-                    absolute_path = os.path.join(config.PROJECT_ROOT, path)
-                    if (dir_name := os.path.dirname(absolute_path)): os.makedirs(dir_name, exist_ok=True)
-                    with open(absolute_path, "w", encoding="utf-8") as f: f.write(code)
-                    self.console.print(f"[green](✓) Wrote changes to {path}[/green]")
-                except IOError as e:
-                    self.console.print(f"[bold red]Error writing file {path}: {e}[/bold red]")
+            try:
+                with self.console.status("[bold green]Writing changes…", spinner="dots"):
+                    txn_id = Journal(self.project.root, self.project.journal_path).apply(staged_changes)
+            except (TransactionError, OSError) as e:
+                self.console.print(f"[bold red]Error writing changes: {e}[/bold red]")
+                self.console.print("[yellow]No files were modified.[/yellow]")
+                return False
+            for path in staged_changes:
+                self.console.print(f"[green](✓) Wrote changes to {path}[/green]")
+            self.console.print(
+                f"[dim]Recorded as transaction {txn_id}. Run `python agent/orchid.py undo` to roll it back.[/dim]"
+            )
+            return True
+        return False
     
+    def _await_install(self, install: BackgroundInstall) -> bool:
+        """Blocks until the background install finishes and reports its outcome."""
+        if not install.done():
+            with self.console.status("[bold green]Waiting for dependency installation to finish…", spinner="dots"):
+                returncode = install.wait()
+        else:
+            returncode = install.wait()
+
+        if returncode == 0:
+            elapsed = time.time() - install.started_at
+            self.console.print(f"[green](✓) Dependencies installed: {', '.join(install.packages)} ({elapsed:.0f}s).[/green]")
+            return True
+        self.console.print(f"[bold red]Installation failed with exit code {returncode}.[/bold red]")
+        self.console.print(install.output_tail(), style="dim", markup=False)
+        self.console.print(f"[dim]Full log: {install.log_path}[/dim]")
+        return False
+
+    def close(self) -> None:
+        """Releases per-session resources such as server-side context caches."""
+        if self.session:
+            self.session.close()
+
     def start(self, query: str, user_files: List[str] = None):
         """Main entry point that classifies intent and routes to the correct workflow."""
         intent = self._classify_intent(query)
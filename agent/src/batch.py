@@ -0,0 +1,200 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+from rich.console import Console
+from rich.table import Table
+from src.ingest import OUTPUT_MARKER
+from src.session import LocalPromptCache
+from src.transaction import Journal, TransactionError
+
+
+def load_tasks(path: str) -> List[Dict]:
+    r"""
+    Reads a JSONL file of tasks. Each line needs the task text under `task`,
+    `prompt` or `title`/`body`; an id is taken from `id`, `task_id` or
+    `request_id` (falling back to the line number). Optional `files` lists
+    paths to treat as @-mentions, in addition to any `@path` in the text.
+
+    Ids name output files and worktrees, so characters outside `[\w.-]` are
+    replaced and a short hash of the original id is appended to keep e.g.
+    `a/b` and `a_b` apart. Duplicate ids are rejected.
+    """
+    tasks = []
+    seen: Dict[str, int] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = record.get("task") or record.get("prompt") or "\n\n".join(
+                part for part in (record.get("title"), record.get("body")) if part
+            )
+            if not text:
+                raise ValueError(f"{path}:{line_no}: task has no text")
+            task_id = str(record.get("id") or record.get("task_id") or record.get("request_id") or line_no)
+            safe_id = re.sub(r"[^\w.-]", "_", task_id)
+            if safe_id != task_id:
+                safe_id = f"{safe_id}-{hashlib.sha1(task_id.encode('utf-8')).hexdigest()[:8]}"
+            if safe_id in seen:
+                raise ValueError(f"{path}:{line_no}: duplicate task id {task_id!r} (first used on line {seen[safe_id]})")
+            seen[safe_id] = line_no
+            files = list(record.get("files", [])) + re.findall(r"@([\S]+)", text)
+            tasks.append({"id": safe_id, "task": text, "files": list(dict.fromkeys(files))})
+    return tasks
+
+
+class BatchRunner:
+    """
+    Runs classification, retrieval and plan generation for many tasks with a
+    bounded worker pool. All workers share the agent's vector store and LLM
+    client; each task gets its own session so contexts never mix.
+
+    Output goes to `out_dir` (by default `batch` in the project's state
+    directory); it is marked so indexing and @-mentions skip it even when it
+    lies inside the project. Scratch worktrees always live in the state
+    directory.
+    """
+
+    def __init__(self, agent, out_dir: Optional[str] = None, concurrency: int = 4, apply: bool = False) -> None:
+        self.console = Console()
+        self.agent = agent
+        self.out_dir = out_dir or os.path.join(agent.project.state_path, "batch")
+        self.worktree_dir = os.path.join(agent.project.state_path, "worktrees")
+        self.concurrency = concurrency
+        self.apply = apply
+        self._git_lock = threading.Lock()
+        os.makedirs(self.out_dir, exist_ok=True)
+        open(os.path.join(self.out_dir, OUTPUT_MARKER), "a").close()
+
+    def _write_json(self, name: str, payload) -> str:
+        path = os.path.join(self.out_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+        return path
+
+    def _git(self, *args: str, check: bool = True) -> subprocess.CompletedProcess:
+        return subprocess.run(["git", *args], cwd=self.agent.project.root, check=check, capture_output=True, text=True)
+
+    def _scratch_worktree(self, task_id: str) -> str:
+        """
+        Creates a detached git worktree of the project for applying one plan,
+        replacing the worktree an earlier run left at the same path.
+        """
+        worktree = os.path.abspath(os.path.join(self.worktree_dir, task_id))
+        # `git worktree` commands take a repository-wide lock; serialize them.
+        with self._git_lock:
+            if os.path.exists(worktree):
+                self._git("worktree", "remove", "--force", worktree, check=False)
+                shutil.rmtree(worktree, ignore_errors=True)
+            # Forget worktrees whose directories are gone (e.g. a deleted state directory).
+            self._git("worktree", "prune")
+            self._git("worktree", "add", "--detach", "--force", worktree, "HEAD")
+        return worktree
+
+    def _run_one(self, task: Dict) -> Dict:
+        result = {"id": task["id"], "status": "ok", "timings": {}}
+        timings = result["timings"]
+        started = time.perf_counter()
+
+        def lap(stage: str, since: float) -> float:
+            now = time.perf_counter()
+            timings[stage] = round(now - since, 3)
+            return now
+
+        try:
+            mark = started
+            result["intent"] = self.agent._classify_intent(task["task"])
+            if result["intent"] != "question":
+                result["db_type"] = self.agent.resolve_database(task["task"])
+            mark = lap("classify", mark)
+
+            session = self.agent.new_session(LocalPromptCache())
+            keys = session.gather(task["task"], task["files"])
+            mark = lap("retrieve", mark)
+
+            if result["intent"] == "question":
+                answer = self.agent.request_answer(session, task["task"], keys)
+                lap("generate", mark)
+                if answer is None:
+                    result["status"] = "failed"
+                else:
+                    with open(os.path.join(self.out_dir, f"{task['id']}.answer.md"), "w", encoding="utf-8") as f:
+                        f.write(answer)
+                return result
+
+            plan = self.agent.request_plan(session, task["task"], result["db_type"], keys)
+            mark = lap("generate", mark)
+            if plan is None:
+                result["status"] = "failed"
+                return result
+            self._write_json(f"{task['id']}.plan.json", {"task": task["task"], "db_type": result["db_type"], **plan})
+
+            if self.apply:
+                changes = {s["path"]: s["code"] for s in plan.get("plan", []) if s.get("path") and s.get("code")}
+                worktree = self._scratch_worktree(task["id"])
+                if changes:
+                    Journal(worktree, os.path.join(worktree, ".orchid", "journal")).apply(changes)
+                result["worktree"] = worktree
+                lap("apply", mark)
+        except (subprocess.CalledProcessError, TransactionError, OSError) as e:
+            result["status"] = "failed"
+            result["error"] = getattr(e, "stderr", None) or str(e)
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            timings["total"] = round(time.perf_counter() - started, 3)
+        return result
+
+    def run(self, tasks: List[Dict]) -> List[Dict]:
+        results: List[Dict] = []
+        started = time.perf_counter()
+        with self.console.status(f"[bold green]Running {len(tasks)} tasks ({self.concurrency} at a time)…", spinner="dots") as status:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                futures = [pool.submit(self._run_one, task) for task in tasks]
+                for future in as_completed(futures):
+                    results.append(future.result())
+                    status.update(f"[bold green]Completed {len(results)}/{len(tasks)} tasks…")
+
+        order = {t["id"]: n for n, t in enumerate(tasks)}
+        results.sort(key=lambda r: order[r["id"]])
+        wall = round(time.perf_counter() - started, 3)
+        self._write_json("summary.json", {"concurrency": self.concurrency, "wall_seconds": wall, "results": results})
+        self._report(results, wall)
+        return results
+
+    def _report(self, results: List[Dict], wall: float) -> None:
+        table = Table(title="Batch Results")
+        table.add_column("Task", style="cyan")
+        table.add_column("Intent", style="magenta")
+        table.add_column("Status")
+        for stage in ("classify", "retrieve", "generate", "apply", "total"):
+            table.add_column(f"{stage} (s)", justify="right")
+
+        for r in results:
+            status = "[green]ok[/green]" if r["status"] == "ok" else f"[red]{r['status']}[/red]"
+            table.add_row(
+                r["id"],
+                r.get("intent", "-"),
+                status,
+                *(f"{r['timings'][stage]:.1f}" if stage in r["timings"] else "-" for stage in ("classify", "retrieve", "generate", "apply", "total")),
+            )
+        self.console.print(table)
+
+        serial = sum(r["timings"].get("total", 0) for r in results)
+        failed = [r for r in results if r["status"] != "ok"]
+        self.console.print(
+            f"[bold]{len(results) - len(failed)}/{len(results)} tasks succeeded[/bold] in {wall:.1f}s wall "
+            f"({serial:.1f}s of task time, {serial / wall if wall else 0:.1f}x concurrency). Output: {self.out_dir}"
+        )
+        for r in failed:
+            if r.get("error"):
+                self.console.print(f"[red]{r['id']}: {r['error']}[/red]")
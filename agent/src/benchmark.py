@@ -0,0 +1,131 @@
+from __future__ import annotations
+import hashlib
+import itertools
+import json
+import os
+import statistics
+import time
+from typing import Dict, List, Sequence
+from rich.console import Console
+from rich.table import Table
+from src.ingest import chunk_text
+from src.project import Project
+from src.rate_limit import estimate_tokens
+from src.vector_store import VectorStore, chunk_payload
+
+
+def load_queries(path: str) -> List[Dict]:
+    """Reads a fixture of `{"query", "expected": [paths], "symbols": [names]}` records."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    queries = data["queries"] if isinstance(data, dict) else data
+    for n, q in enumerate(queries):
+        if not q.get("query") or not q.get("expected"):
+            raise ValueError(f"{path}: query #{n + 1} needs `query` and `expected`")
+    return queries
+
+
+def score(results: List[Dict], expected: Sequence[str], symbols: Sequence[str], project_root: str) -> Dict:
+    """recall@k and reciprocal rank over files, plus the share of expected symbols present in the results."""
+    paths = [os.path.relpath(r["path"], project_root).replace(os.sep, "/") for r in results]
+    expected = set(expected)
+    first_hit = next((rank for rank, path in enumerate(paths, start=1) if path in expected), None)
+    code = "\n".join(r["code"] for r in results)
+    return {
+        "recall": len(expected & set(paths)) / len(expected),
+        "rr": 1 / first_hit if first_hit else 0.0,
+        "symbol_recall": sum(1 for s in symbols if s in code) / len(symbols) if symbols else None,
+        "tokens": sum(estimate_tokens(r["code"]) for r in results),
+    }
+
+
+class RetrievalBenchmark:
+    """
+    Runs labeled queries through `VectorStore.search` for every combination of
+    chunk size, embedding model, k and reranking, and reports retrieval quality
+    against the prompt tokens it costs.
+
+    One collection is built per (chunk size, embedding model) under the
+    project's state dir and reused across runs while the files are unchanged.
+    Query embeddings are computed once per model before timing, so latency is
+    the search and reranking hot path only.
+    """
+
+    def __init__(self, agent, queries: List[Dict]) -> None:
+        self.console = Console()
+        self.agent = agent
+        self.project: Project = agent.project
+        self.queries = queries
+        self.qdrant_path = os.path.join(self.project.state_path, "bench_db")
+
+    def _store(self, files: List[str], chunk_chars: int, model: str) -> VectorStore:
+        hasher = hashlib.sha256(f"{chunk_chars}\0{model}".encode())
+        hasher.update(self.agent.project_hash(files).encode())
+        store = VectorStore(f"bench-{hasher.hexdigest()[:16]}", qdrant_path=self.qdrant_path, state_path=self.project.state_path, embedding_model=model)
+        if not store.is_complete():
+            chunks = []
+            for path in files:
+                with open(path, "r", encoding="utf-8", errors="replace") as f:
+                    text = f.read()
+                for offset, code in chunk_text(os.path.relpath(path, self.project.root), text, chunk_chars):
+                    chunks.append(chunk_payload(self.project.root, path, code, offset))
+            store.build_collection(chunks)
+        return store
+
+    def run(self, chunk_sizes: Sequence[int], ks: Sequence[int], reranks: Sequence[bool], models: Sequence[str]) -> List[Dict]:
+        files = self.agent.source_files()
+        rows: List[Dict] = []
+        for chunk_chars, model in itertools.product(chunk_sizes, models):
+            store = self._store(files, chunk_chars, model)
+            for q in self.queries:
+                store.embed_query(q["query"])
+            for k, rerank in itertools.product(ks, reranks):
+                scores, latencies = [], []
+                for q in self.queries:
+                    started = time.perf_counter()
+                    results = store.search(q["query"], k=k, rerank=rerank)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    scores.append(score(results, q["expected"], q.get("symbols", []), self.project.root))
+                symbol_scores = [s["symbol_recall"] for s in scores if s["symbol_recall"] is not None]
+                rows.append({
+                    "chunk_chars": chunk_chars,
+                    "model": model,
+                    "k": k,
+                    "rerank": rerank,
+                    "points": store.point_count(),
+                    "recall@k": statistics.mean(s["recall"] for s in scores),
+                    "mrr": statistics.mean(s["rr"] for s in scores),
+                    "symbol_recall": statistics.mean(symbol_scores) if symbol_scores else None,
+                    "tokens_per_query": statistics.mean(s["tokens"] for s in scores),
+                    "p50_ms": statistics.median(latencies),
+                    "p95_ms": sorted(latencies)[max(0, round(0.95 * len(latencies)) - 1)],
+                })
+            store.close()
+        return rows
+
+    def report(self, rows: List[Dict]) -> None:
+        table = Table(title=f"Retrieval benchmark ({len(self.queries)} queries)")
+        for column in ("Chunk", "Model", "k", "Rerank", "Points"):
+            table.add_column(column, style="cyan" if column == "Chunk" else None)
+        for column in ("Recall@k", "MRR", "Symbols", "Tokens/query", "p50 ms", "p95 ms", "Recall/1k tok"):
+            table.add_column(column, justify="right")
+
+        best = max(rows, key=lambda r: (r["recall@k"], r["mrr"], -r["tokens_per_query"]), default=None)
+        for r in rows:
+            style = "bold green" if r is best else None
+            table.add_row(
+                str(r["chunk_chars"]),
+                r["model"].removeprefix("models/"),
+                str(r["k"]),
+                "on" if r["rerank"] else "off",
+                str(r["points"]),
+                f"{r['recall@k']:.2f}",
+                f"{r['mrr']:.2f}",
+                "-" if r["symbol_recall"] is None else f"{r['symbol_recall']:.2f}",
+                f"{r['tokens_per_query']:,.0f}",
+                f"{r['p50_ms']:.1f}",
+                f"{r['p95_ms']:.1f}",
+                f"{1000 * r['recall@k'] / r['tokens_per_query']:.3f}" if r["tokens_per_query"] else "-",
+                style=style,
+            )
+        self.console.print(table)
@@ -10,7 +10,112 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(_config_dir))
 
 SRC_PATH = os.path.join(PROJECT_ROOT, "src")
 QDRANT_PATH = os.path.join(PROJECT_ROOT, "orchid_db")
+STATE_PATH = os.path.join(PROJECT_ROOT, ".orchid")
+JOURNAL_PATH = os.path.join(STATE_PATH, "journal")
 
-GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-pro:generateContent?key={GEMINI_API_KEY}"
+GEMINI_MODEL = "gemini-2.5-pro"
 EMBEDDING_MODEL = 'models/text-embedding-004'
 
+# Session context reuse across turns of `orchid.py run`.
+CONTEXT_CACHING = os.environ.get("ORCHID_CONTEXT_CACHING", "1") != "0"
+CONTEXT_CACHE_TTL = 900
+# Gemini rejects caches below a minimum token count (~4k tokens for 2.5 Pro); smaller prefixes are sent inline.
+CONTEXT_CACHE_MIN_CHARS = 16_000
+SESSION_MAX_CONTEXT_CHARS = 120_000
+# Retrieved chunks and loaded files a session keeps between turns (least recently used are dropped).
+SESSION_WORKING_SET_CHARS = 500_000
+
+# Model routing: tiers from fastest to strongest. Classifiers use a fixed tier; answers and
+# plans take the fastest tier whose limits their context fits, but never below their minimum.
+MODEL_ROUTING = os.environ.get("ORCHID_MODEL_ROUTING", "1") != "0"
+MODEL_TIERS = {
+    "fast": "gemini-2.5-flash-lite-preview-06-17",
+    "balanced": "gemini-2.5-flash",
+    "strong": GEMINI_MODEL,
+}
+# Tier -> (max context chars, max @-mentioned files) a request may have to be sent there.
+# The fast tier only takes requests whose prefix (context plus up to ~4k chars of
+# instructions) stays below CONTEXT_CACHE_MIN_CHARS and is sent inline anyway; anything
+# big enough to cache goes to a stronger tier. A session never moves back down a tier,
+# so its cached prefix is not re-uploaded for a different model on every turn.
+ROUTE_LIMITS = {
+    "fast": (CONTEXT_CACHE_MIN_CHARS - 4_000, 1),
+    "balanced": (60_000, 4),
+}
+ROUTE_TASK_TIERS = {
+    "classify_intent": "fast",
+    "classify_database": "balanced",
+    "answer": "fast",
+    "plan": "balanced",
+}
+# Hedging: a request of a task in HEDGE_TASKS that is still running past its model's observed
+# p95 latency for that task (HEDGE_AFTER_SECONDS until HEDGE_MIN_SAMPLES calls were timed) is
+# also sent to the next faster tier, and the first response wins (0 disables). Plans are not
+# hedged: they only leave their minimum tier when their context is too big for a faster one.
+HEDGE_AFTER_SECONDS = float(os.environ.get("ORCHID_HEDGE_AFTER", "25"))
+HEDGE_TASKS = ("answer",)
+HEDGE_MIN_SAMPLES = 20
+ROUTER_LATENCY_WINDOW = 200
+
+# `orchid.py serve` daemon; HTTP is bound to loopback only.
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = int(os.environ.get("ORCHID_PORT", "8765"))
+SERVER_SOCKET = os.path.join(STATE_PATH, "orchid.sock")
+
+# Open vector-store handles kept by one process across projects (LRU-evicted).
+INDEX_POOL_SIZE = int(os.environ.get("ORCHID_INDEX_POOL_SIZE", "4"))
+INDEX_POOL_MAX_BYTES = int(os.environ.get("ORCHID_INDEX_POOL_MAX_MB", "1024")) * 1024 * 1024
+
+# Post-retrieval reranking: maximal marginal relevance over over-fetched candidates.
+RERANK = os.environ.get("ORCHID_RERANK", "1") != "0"
+RERANK_OVERFETCH = 4
+RERANK_LAMBDA = 0.7
+RERANK_MAX_PER_FILE = 2
+RERANK_PATH_BOOST = 0.15
+RERANK_LEXICAL_BOOST = 0.1
+# Chunks retrieved per turn; diversified results need fewer of them.
+RETRIEVAL_K = 10 if RERANK else 15
+# Unscoped hits added when @dir/ or glob mentions scope the search.
+SCOPED_SEARCH_TOPUP = 3
+
+# Import-graph expansion: @-mentioned files pull in their direct imports and importers.
+EXPAND_IMPORTS = os.environ.get("ORCHID_EXPAND_IMPORTS", "1") != "0"
+IMPORT_EXPANSION_CHARS = 24_000
+
+# @-mention loading: per-file and per-turn caps (huge files are outlined or cut head/tail).
+FILE_CONTEXT_MAX_CHARS = 40_000
+FILE_CONTEXT_TOTAL_CHARS = 100_000
+MENTION_MAX_FILES = 50
+
+# Reuse of build plans for near-duplicate tasks (cosine similarity of task embeddings).
+PLAN_CACHE = os.environ.get("ORCHID_PLAN_CACHE", "1") != "0"
+PLAN_CACHE_THRESHOLD = 0.92
+PLAN_CACHE_MAX_ENTRIES = 200
+
+# Gemini quota per model: (requests per minute, tokens per minute). Adjust to your API tier.
+RATE_LIMITS = {
+    "gemini-2.5-pro": (150, 2_000_000),
+    "gemini-2.5-flash": (1_000, 1_000_000),
+    "gemini-2.5-flash-lite-preview-06-17": (4_000, 4_000_000),
+    "text-embedding-004": (1_500, 5_000_000),
+    "default": (60, 1_000_000),
+}
+# Fraction of each bucket background work (indexing) may use; the rest is kept for interactive calls.
+RATE_LIMIT_BACKGROUND_SHARE = 0.8
+
+# Texts per embedding request while indexing (the Gemini batch embedding limit is 100).
+EMBED_BATCH_SIZE = 100
+
+# Indexing: which files are embedded and how they are chunked.
+INDEX_EXTENSIONS = (".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs", ".json", ".sql", ".md", ".mdx", ".css", ".scss")
+# Glob patterns (or "dir/" prefixes) relative to the project root; a project's .orchidignore adds more.
+INDEX_EXCLUDE = [
+    "agent/", "public/", "*.min.js", "*.min.css", "*.map", "*.d.ts",
+    "package-lock.json", "pnpm-lock.yaml", "yarn.lock", "bun.lockb",
+    "components.json",
+]
+INDEX_MAX_FILE_BYTES = 256 * 1024
+# Minified/bundled files: nearly all characters on lines this long, or this many characters per line on average.
+INDEX_MINIFIED_LINE_CHARS = 2_000
+INDEX_MINIFIED_AVG_LINE_CHARS = 300
+CHUNK_CHARS = 1_000
@@ -0,0 +1,259 @@
+from __future__ import annotations
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+from typing import Dict, List, Optional, Set
+from src import config
+
+
+class InstallError(Exception):
+    """Raised when the package manager cannot be started."""
+
+
+LOCKFILES = [
+    ("package-lock.json", "npm"),
+    ("pnpm-lock.yaml", "pnpm"),
+    ("yarn.lock", "yarn"),
+    ("bun.lockb", "bun"),
+    ("bun.lock", "bun"),
+]
+
+INSTALL_COMMANDS = {
+    "npm": ["npm", "install", "--legacy-peer-deps"],
+    "pnpm": ["pnpm", "add"],
+    "yarn": ["yarn", "add"],
+    "bun": ["bun", "add"],
+}
+
+
+DEPENDENCY_SECTIONS = ("dependencies", "devDependencies", "peerDependencies", "optionalDependencies")
+
+
+def merge_dependency_sections(plan_text: str, installed_text: str, original_text: Optional[str]) -> str:
+    """
+    Applies what an install changed in package.json's dependency sections
+    (compared with `original_text`, the file before the install) to the
+    plan's version of the file, so the plan's other edits (scripts, config)
+    are kept. Raises ValueError when one of the versions is not JSON.
+    """
+    plan, installed = json.loads(plan_text), json.loads(installed_text)
+    original = json.loads(original_text) if original_text else {}
+    for section in DEPENDENCY_SECTIONS:
+        before, after = original.get(section) or {}, installed.get(section) or {}
+        merged = dict(plan.get(section) or {})
+        merged.update({name: version for name, version in after.items() if before.get(name) != version})
+        for name in set(before) - set(after):
+            merged.pop(name, None)
+        if merged or section in plan:
+            plan[section] = merged
+    indent = re.search(r"\n([ \t]+)\"", plan_text)
+    return json.dumps(plan, indent=indent.group(1) if indent else 2, ensure_ascii=False) + "\n"
+
+
+def package_name(spec: str) -> str:
+    """Strips the version from an npm spec: `@scope/pkg@^1.0` -> `@scope/pkg`."""
+    spec = spec.strip()
+    at = spec.find("@", 1 if spec.startswith("@") else 0)
+    return spec[:at] if at > 0 else spec
+
+
+class BackgroundInstall:
+    """
+    A package-manager process running while the user reviews the plan.
+
+    The manifest files it may rewrite (package.json and the lockfile) are
+    snapshotted before it starts: `cancel` stops the process and puts them
+    back, and `take_manifest_changes` hands the rewritten versions to the
+    caller so they are applied (and undone) with the plan's transaction,
+    merged with the plan's own edits to those files.
+    """
+
+    def __init__(self, packages: List[str], command: List[str], cwd: str, log_path: str, manifests: List[str] = ()) -> None:
+        self.packages = packages
+        self.cwd = cwd
+        self.log_path = log_path
+        self.started_at = time.time()
+        self.conflicts: List[str] = []
+        self._originals = {path: self._read(path) for path in manifests}
+        self._log = open(log_path, "w", encoding="utf-8")
+        try:
+            self.proc = subprocess.Popen(command, stdout=self._log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, cwd=cwd)
+        except BaseException:
+            self._log.close()
+            raise
+
+    @staticmethod
+    def _read(path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _restore(self, path: str) -> None:
+        data = self._originals[path]
+        if data is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def done(self) -> bool:
+        return self.proc.poll() is not None
+
+    def wait(self) -> int:
+        try:
+            return self.proc.wait()
+        finally:
+            self._log.close()
+
+    def cancel(self) -> None:
+        """Stops the install if it is still running and restores the manifest files."""
+        try:
+            if self.proc.poll() is None:
+                self.proc.terminate()
+                try:
+                    self.proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    self.proc.kill()
+                    self.proc.wait()
+        finally:
+            self._log.close()
+            for path in self._originals:
+                self._restore(path)
+
+    def take_manifest_changes(self, staged: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """
+        Returns `{project-relative path: new text}` for each text manifest the
+        finished install changed, and restores its previous content on disk
+        so the new one can be written through the transaction journal.
+
+        When the plan also changes a manifest (`staged`), the install's
+        dependency changes are merged into the plan's package.json; any other
+        manifest the plan edits keeps the plan's version. Paths whose changes
+        could not be merged are listed in `conflicts`.
+        """
+        staged = staged or {}
+        self.conflicts = []
+        changes = {}
+        for path, original in self._originals.items():
+            current = self._read(path)
+            if current is None or current == original:
+                continue
+            try:
+                text = current.decode("utf-8")
+            except UnicodeDecodeError:
+                continue  # Binary lockfiles (bun.lockb) stay as the install left them.
+            rel_path = os.path.relpath(path, self.cwd).replace(os.sep, "/")
+            self._restore(path)
+            if rel_path not in staged:
+                changes[rel_path] = text
+                continue
+            try:
+                if os.path.basename(rel_path) != "package.json":
+                    raise ValueError(f"{rel_path} cannot be merged")
+                changes[rel_path] = merge_dependency_sections(staged[rel_path], text, original.decode("utf-8") if original else None)
+            except (ValueError, UnicodeDecodeError):
+                self.conflicts.append(rel_path)
+        return changes
+
+    def output_tail(self, lines: int = 20) -> str:
+        try:
+            with open(self.log_path, "r", encoding="utf-8", errors="replace") as f:
+                return "".join(f.readlines()[-lines:])
+        except OSError:
+            return ""
+
+
+class DependencyInstaller:
+    """Diffs plan dependencies against the project and installs the missing ones."""
+
+    def __init__(self, project_root: str = config.PROJECT_ROOT, log_dir: str = os.path.join(config.STATE_PATH, "logs")) -> None:
+        self.project_root = project_root
+        self.log_dir = log_dir
+        self.lockfile, self.manager = self._detect_package_manager()
+
+    def _detect_package_manager(self) -> tuple[Optional[str], str]:
+        for lockfile, manager in LOCKFILES:
+            path = os.path.join(self.project_root, lockfile)
+            if os.path.exists(path):
+                return path, manager
+        return None, "npm"
+
+    def _declared(self) -> Set[str]:
+        try:
+            with open(os.path.join(self.project_root, "package.json"), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return set()
+        declared: Set[str] = set()
+        for section in ("dependencies", "devDependencies", "peerDependencies", "optionalDependencies"):
+            declared.update(manifest.get(section, {}) or {})
+        return declared
+
+    def _locked(self, names: Set[str]) -> Set[str]:
+        """Returns the subset of `names` the lockfile has resolved."""
+        if self.lockfile is None or self.lockfile.endswith(".lockb"):
+            # No lockfile (or a binary one) – trust package.json.
+            return set(names)
+        try:
+            with open(self.lockfile, "r", encoding="utf-8") as f:
+                content = f.read()
+        except OSError:
+            return set(names)
+
+        if self.manager == "npm":
+            try:
+                lock: Dict = json.loads(content)
+            except json.JSONDecodeError:
+                return set(names)
+            packages = lock.get("packages") or {}
+            legacy = lock.get("dependencies") or {}
+            return {n for n in names if f"node_modules/{n}" in packages or n in legacy}
+
+        locked = set()
+        for name in names:
+            escaped = re.escape(name)
+            if self.manager == "yarn":
+                pattern = rf'^"?{escaped}@'
+            else:
+                pattern = rf"^\s+'?{escaped}'?:"
+            if re.search(pattern, content, re.M):
+                locked.add(name)
+        return locked
+
+    def missing(self, dependencies: List[str]) -> List[str]:
+        """Returns the specs from `dependencies` that are not already installed."""
+        declared = self._declared()
+        locked = self._locked({package_name(d) for d in dependencies} & declared)
+        seen: Set[str] = set()
+        missing = []
+        for spec in dependencies:
+            name = package_name(spec)
+            if not name or name in seen:
+                continue
+            seen.add(name)
+            if name not in declared or name not in locked:
+                missing.append(spec.strip())
+        return missing
+
+    def start(self, packages: List[str]) -> BackgroundInstall:
+        """Launches the install without blocking; the caller awaits it later."""
+        executable = shutil.which(self.manager)
+        if executable is None:
+            raise InstallError(f"'{self.manager}' was not found on PATH.")
+        command = [executable] + INSTALL_COMMANDS[self.manager][1:] + packages
+
+        os.makedirs(self.log_dir, exist_ok=True)
+        log_path = os.path.join(self.log_dir, f"install-{time.strftime('%Y%m%d-%H%M%S')}.log")
+        # Without a lockfile, the install creates npm's; cancelling removes it again.
+        lockfile = self.lockfile or os.path.join(self.project_root, "package-lock.json")
+        manifests = [os.path.join(self.project_root, "package.json"), lockfile]
+        try:
+            return BackgroundInstall(packages, command, self.project_root, log_path, manifests)
+        except OSError as e:
+            raise InstallError(f"Could not start '{self.manager}': {e}") from e
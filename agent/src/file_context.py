@@ -0,0 +1,159 @@
+from __future__ import annotations
+import fnmatch
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from rich.console import Console
+from src import config
+from src.ingest import walk_project
+
+_DECLARATION = re.compile(
+    r"^\s*(?:export\s+(?:default\s+)?)?(?:async\s+)?"
+    r"(?:function\*?|class|interface|type|enum|const|let|var)\s+[A-Za-z_$][\w$]*"
+)
+_OUTLINE_EXTENSIONS = (".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs")
+
+
+def is_binary(sample: bytes) -> bool:
+    """Heuristic used by git and grep: a NUL byte in the first block means binary."""
+    return b"\0" in sample
+
+
+def head_tail(text: str, max_chars: int) -> str:
+    """Keeps the first two thirds and the last third of `max_chars`, marking the cut."""
+    if len(text) <= max_chars:
+        return text
+    head, tail = text[: max_chars * 2 // 3], text[-(max_chars // 3):]
+    omitted = text.count("\n", len(head), len(text) - len(tail))
+    return f"{head}\n… [{omitted} lines omitted] …\n{tail}"
+
+
+def outline(text: str, max_chars: int) -> str:
+    """Top-level imports and declarations of a JS/TS file, followed by as much of its head as fits."""
+    lines = [line.rstrip() for line in text.splitlines() if line.startswith(("import ", "export ")) or _DECLARATION.match(line)]
+    summary = "\n".join(lines)[: max_chars // 2]
+    remaining = max_chars - len(summary)
+    return f"// Outline (file truncated):\n{summary}\n// Beginning of file:\n{text[:remaining]}\n…"
+
+
+class FileContextLoader:
+    """
+    Reads files for @-mentions. Contents are cached by path and mtime, so long
+    sessions do not re-read unchanged files; binary files are skipped and huge
+    files are cut to `max_file_chars` (an outline plus the head for source
+    files, head and tail otherwise). `@dir/` and glob mentions are expanded
+    against an index of the project's files.
+    """
+
+    def __init__(self, project_root: str = config.PROJECT_ROOT, max_file_chars: int = config.FILE_CONTEXT_MAX_CHARS, max_entries: int = 256, console: Optional[Console] = None) -> None:
+        self.console = console or Console()
+        self.project_root = project_root
+        self.max_file_chars = max_file_chars
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[str, tuple[float, Optional[Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _absolute(self, path: str) -> str:
+        return path if os.path.isabs(path) else os.path.join(self.project_root, path)
+
+    def file_index(self) -> List[str]:
+        """Project-relative paths of all files outside ignored directories."""
+        return list(walk_project(self.project_root))
+
+    def expand(self, mentions: List[str], max_files: int = config.MENTION_MAX_FILES) -> List[str]:
+        """
+        Turns @-mentions into file paths: plain paths are kept, `dir/` mentions
+        become the files below the directory and glob patterns (`src/**/*.tsx`)
+        are matched against the file index. Each mention yields at most
+        `max_files` files.
+        """
+        expanded: List[str] = []
+        index: Optional[List[str]] = None
+        for mention in mentions:
+            mention = mention.rstrip(",.;:")
+            is_glob = any(c in mention for c in "*?[")
+            is_dir = not is_glob and (mention.endswith("/") or os.path.isdir(self._absolute(mention)))
+            if not (is_glob or is_dir):
+                expanded.append(mention)
+                continue
+            if index is None:
+                index = self.file_index()
+            if is_dir:
+                prefix = mention.rstrip("/") + "/"
+                matches = [p for p in index if p.startswith(prefix)]
+            else:
+                matches = [p for p in index if fnmatch.fnmatch(p, mention)]
+            if not matches:
+                self.console.print(f"[yellow]Warning: No files match @{mention}[/yellow]")
+            elif len(matches) > max_files:
+                self.console.print(f"[yellow]Warning: @{mention} matches {len(matches)} files; using the first {max_files}.[/yellow]")
+            expanded.extend(matches[:max_files])
+        return list(dict.fromkeys(expanded))
+
+    def scopes(self, mentions: List[str]) -> List[Dict]:
+        """
+        Search scopes implied by `@dir/` and glob mentions, as `scope_filter`
+        keyword arguments: `@src/components/ui/` scopes to that directory and
+        `@src/app/api/**/*.ts` to `.ts` files below `src/app/api`.
+        """
+        scopes = []
+        for mention in mentions:
+            mention = mention.rstrip(",.;:")
+            if any(c in mention for c in "*?["):
+                parts = mention.split("/")
+                static = next(i for i, part in enumerate(parts) if any(c in part for c in "*?["))
+                ext = re.fullmatch(r"\*\.(\w+)", parts[-1])
+                scopes.append({"directories": ["/".join(parts[:static])] if static else [], "extensions": [ext.group(1)] if ext else []})
+            elif mention.endswith("/") or os.path.isdir(self._absolute(mention)):
+                scopes.append({"directories": [mention.rstrip("/")], "extensions": []})
+        return [s for s in scopes if s["directories"] or s["extensions"]]
+
+    def load(self, rel_path: str) -> Optional[Dict]:
+        """
+        Returns `{"path", "abs_path", "mtime", "text", "truncated"}` for a file,
+        or None when it is missing, unreadable or binary.
+        """
+        abs_path = self._absolute(rel_path)
+        try:
+            mtime = os.path.getmtime(abs_path)
+        except OSError:
+            self.console.print(f"[yellow]Warning: File not found: {rel_path}[/yellow]")
+            return None
+
+        with self._lock:
+            cached = self._cache.get(abs_path)
+            if cached is not None and cached[0] == mtime:
+                self._cache.move_to_end(abs_path)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        entry = self._read(rel_path, abs_path, mtime)
+        with self._lock:
+            self._cache[abs_path] = (mtime, entry)
+            self._cache.move_to_end(abs_path)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return entry
+
+    def _read(self, rel_path: str, abs_path: str, mtime: float) -> Optional[Dict]:
+        try:
+            with open(abs_path, "rb") as f:
+                data = f.read()
+        except Exception as e:
+            self.console.print(f"[red]Error reading file {rel_path}: {e}[/red]")
+            return None
+        if is_binary(data[:8192]):
+            self.console.print(f"[yellow]Warning: Skipping binary file {rel_path}[/yellow]")
+            return None
+
+        text = data.decode("utf-8", errors="replace")
+        truncated = len(text) > self.max_file_chars
+        if truncated:
+            self.console.print(f"[dim]{rel_path} is {len(text):,} characters; sending a truncated view.[/dim]")
+            text = outline(text, self.max_file_chars) if rel_path.endswith(_OUTLINE_EXTENSIONS) else head_tail(text, self.max_file_chars)
+        return {"path": rel_path, "abs_path": abs_path, "mtime": mtime, "text": text, "truncated": truncated}
@@ -0,0 +1,190 @@
+from __future__ import annotations
+import json
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+from src.project import Project
+
+_IMPORT_PATTERNS = [
+    # import x from "y" / import { a, b } from "y" / export * from "y" (may span lines)
+    re.compile(r"(?:^|[;\n])\s*(?:import|export)\b[^;'\"]*?\bfrom\s*['\"]([^'\"]+)['\"]"),
+    # side-effect imports: import "y"
+    re.compile(r"(?:^|[;\n])\s*import\s*['\"]([^'\"]+)['\"]"),
+    # dynamic import("y") and require("y")
+    re.compile(r"\b(?:import|require)\s*\(\s*['\"]([^'\"]+)['\"]\s*\)"),
+]
+
+SOURCE_EXTENSIONS = (".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs")
+_RESOLVE_SUFFIXES = ["", *SOURCE_EXTENSIONS, ".json", ".css"] + [f"/index{ext}" for ext in SOURCE_EXTENSIONS]
+
+
+def parse_imports(source: str) -> List[str]:
+    """Returns the module specifiers imported by a JS/TS source file, in order."""
+    specs: List[str] = []
+    for pattern in _IMPORT_PATTERNS:
+        specs.extend(pattern.findall(source))
+    return list(dict.fromkeys(specs))
+
+
+class ImportGraph:
+    """
+    Module/import graph of a project, resolved to project-relative paths.
+
+    Relative specifiers and the path aliases from `tsconfig.json` (falling back
+    to the shadcn `@/` convention in `components.json`) are resolved; bare
+    package imports are ignored. The graph is persisted in the project's state
+    directory and refreshed incrementally by file mtime, so both directions
+    (`imports_of`, `importers_of`) are dictionary lookups.
+    """
+
+    VERSION = 1
+
+    def __init__(self, project: Project) -> None:
+        self.project = project
+        self.path = os.path.join(project.state_path, "import_graph.json")
+        self.aliases = self._load_aliases()
+        self._files: Dict[str, Dict] = {}
+        self._importers: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    # ── aliases ──────────────────────────────────────────────
+    def _read_json(self, name: str) -> Optional[Dict]:
+        try:
+            with open(os.path.join(self.project.root, name), "r", encoding="utf-8") as f:
+                # tsconfig allows comments and trailing commas; strip the common cases.
+                text = re.sub(r"^\s*//.*$", "", f.read(), flags=re.M)
+                return json.loads(re.sub(r",(\s*[}\]])", r"\1", text))
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _load_aliases(self) -> List[tuple[str, str]]:
+        """Returns (prefix, project-relative target) pairs, longest prefix first."""
+        aliases: List[tuple[str, str]] = []
+        tsconfig = self._read_json("tsconfig.json") or {}
+        options = tsconfig.get("compilerOptions", {})
+        base_url = options.get("baseUrl", ".")
+        for pattern, targets in (options.get("paths") or {}).items():
+            if not targets:
+                continue
+            prefix = pattern.rstrip("*")
+            target = os.path.normpath(os.path.join(base_url, targets[0].rstrip("*")))
+            aliases.append((prefix, "" if target == "." else target.replace(os.sep, "/") + "/"))
+
+        if not aliases and self._read_json("components.json") is not None:
+            # shadcn projects alias "@/..." to src/ (or the root when there is no src/).
+            aliases.append(("@/", "src/" if os.path.isdir(self.project.src_path) else ""))
+        return sorted(aliases, key=lambda a: len(a[0]), reverse=True)
+
+    # ── persistence ──────────────────────────────────────────
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        if data.get("version") != self.VERSION or data.get("aliases") != [list(a) for a in self.aliases]:
+            return
+        self._files = data.get("files", {})
+        self._rebuild_importers()
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            data = {"version": self.VERSION, "aliases": [list(a) for a in self.aliases], "files": self._files}
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def _rebuild_importers(self) -> None:
+        self._importers = {}
+        for source, entry in self._files.items():
+            for target in entry["imports"]:
+                self._importers.setdefault(target, set()).add(source)
+
+    # ── building ─────────────────────────────────────────────
+    def _relative(self, path: str) -> str:
+        if os.path.isabs(path):
+            path = os.path.relpath(path, self.project.root)
+        return os.path.normpath(path).replace(os.sep, "/")
+
+    def resolve(self, spec: str, importer: str) -> Optional[str]:
+        """Resolves an import specifier from `importer` to a project-relative file, if local."""
+        if spec.startswith("."):
+            base = os.path.normpath(os.path.join(os.path.dirname(importer), spec)).replace(os.sep, "/")
+        else:
+            match = next((a for a in self.aliases if spec.startswith(a[0])), None)
+            if match is None:
+                return None
+            base = match[1] + spec[len(match[0]):]
+        for suffix in _RESOLVE_SUFFIXES:
+            candidate = base + suffix
+            if os.path.isfile(os.path.join(self.project.root, candidate)):
+                return os.path.normpath(candidate).replace(os.sep, "/")
+        return None
+
+    def _parse(self, rel_path: str) -> List[str]:
+        try:
+            with open(os.path.join(self.project.root, rel_path), "r", encoding="utf-8", errors="replace") as f:
+                source = f.read()
+        except OSError:
+            return []
+        resolved = (self.resolve(spec, rel_path) for spec in parse_imports(source))
+        return list(dict.fromkeys(r for r in resolved if r and r != rel_path))
+
+    def update(self, paths: Iterable[str], complete: bool = True) -> int:
+        """
+        Re-parses the files in `paths` whose mtime changed since the last update.
+        With `complete=True`, `paths` is the full file list and files no longer
+        in it are dropped. Returns the number of files (re)parsed or removed.
+        """
+        rel_paths = {self._relative(p) for p in paths if p.endswith(SOURCE_EXTENSIONS)}
+        changed = 0
+        with self._lock:
+            if complete:
+                for gone in set(self._files) - rel_paths:
+                    del self._files[gone]
+                    changed += 1
+            for rel_path in rel_paths:
+                try:
+                    mtime = os.path.getmtime(os.path.join(self.project.root, rel_path))
+                except OSError:
+                    if self._files.pop(rel_path, None) is not None:
+                        changed += 1
+                    continue
+                entry = self._files.get(rel_path)
+                if entry is not None and entry["mtime"] == mtime:
+                    continue
+                self._files[rel_path] = {"mtime": mtime, "imports": self._parse(rel_path)}
+                changed += 1
+            if changed:
+                self._rebuild_importers()
+        if changed:
+            self.save()
+        return changed
+
+    # ── queries ──────────────────────────────────────────────
+    def imports_of(self, path: str) -> List[str]:
+        entry = self._files.get(self._relative(path))
+        return list(entry["imports"]) if entry else []
+
+    def importers_of(self, path: str) -> List[str]:
+        return sorted(self._importers.get(self._relative(path), ()))
+
+    def neighbors(self, paths: Iterable[str]) -> List[str]:
+        """
+        Direct imports, then direct importers, of `paths` (excluding `paths`
+        themselves), in a stable priority order for filling a token budget.
+        """
+        seeds = [self._relative(p) for p in paths]
+        seen = set(seeds)
+        ordered: List[str] = []
+        for lookup in (self.imports_of, self.importers_of):
+            for seed in seeds:
+                for neighbor in lookup(seed):
+                    if neighbor not in seen:
+                        seen.add(neighbor)
+                        ordered.append(neighbor)
+        return ordered
@@ -0,0 +1,95 @@
+from __future__ import annotations
+import contextlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from src import config
+from src.project import Project
+from src.vector_store import VectorStore
+
+
+class IndexPool:
+    """
+    A bounded, least-recently-used set of open vector stores, one per project.
+
+    A local Qdrant store loads its collections into memory and locks its
+    directory, so opening one per request is slow and opening one twice fails.
+    The pool keeps at most `max_open` handles and roughly `max_bytes` of
+    collections resident, closing the least recently used idle handles first.
+    Handles leased through `lease()` are never evicted while in use.
+    """
+
+    def __init__(self, max_open: int = config.INDEX_POOL_SIZE, max_bytes: int = config.INDEX_POOL_MAX_BYTES, on_evict: Optional[Callable[[Project], None]] = None) -> None:
+        self.max_open = max_open
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self._entries: "OrderedDict[Project, Dict]" = OrderedDict()
+        self._leases: Dict[Project, int] = {}
+        self._lock = threading.RLock()
+
+    def get(self, project: Project, collection_name: str) -> VectorStore:
+        """Returns the open store for `project`, opening it (and evicting others) if needed."""
+        with self._lock:
+            entry = self._entries.get(project)
+            if entry is not None and entry["store"].collection_name != collection_name:
+                # The project was re-indexed under a new collection. Leased requests keep
+                # searching the old handle; new ones get a handle sharing its client.
+                entry["store"] = entry["store"].with_collection(collection_name)
+                entry["bytes"] = entry["store"].memory_estimate()
+            if entry is None:
+                store = VectorStore(collection_name=collection_name, qdrant_path=project.qdrant_path, state_path=project.state_path)
+                entry = {"store": store, "bytes": store.memory_estimate(), "opened_at": time.time()}
+                self._entries[project] = entry
+            entry["last_used"] = time.time()
+            self._entries.move_to_end(project)
+            self._evict(keep=project)
+            return entry["store"]
+
+    @contextlib.contextmanager
+    def lease(self, project: Project):
+        """Pins `project`'s store so it cannot be evicted while a request uses it."""
+        with self._lock:
+            self._leases[project] = self._leases.get(project, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._leases[project] -= 1
+                if not self._leases[project]:
+                    del self._leases[project]
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(e["bytes"] for e in self._entries.values())
+
+    def _evict(self, keep: Project) -> None:
+        while len(self._entries) > self.max_open or self.total_bytes() > self.max_bytes:
+            victim = next((p for p in self._entries if p != keep and p not in self._leases), None)
+            if victim is None:
+                return
+            self._close(victim)
+
+    def _close(self, project: Project) -> None:
+        entry = self._entries.pop(project)
+        entry["store"].close()
+        if self.on_evict:
+            self.on_evict(project)
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {
+                    "project": p.root,
+                    "collection": e["store"].collection_name,
+                    "bytes": e["bytes"],
+                    "leases": self._leases.get(p, 0),
+                    "idle_seconds": round(time.time() - e["last_used"], 1),
+                }
+                for p, e in self._entries.items()
+            ]
+
+    def close_all(self) -> None:
+        with self._lock:
+            for project in list(self._entries):
+                self._close(project)
@@ -0,0 +1,236 @@
+from __future__ import annotations
+import fnmatch
+import json
+import os
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+from src import config
+
+# Directories never worth walking into, for indexing or @-mention lookup.
+# "orchid_batch" is where `orchid.py batch` wrote its output before it moved under .orchid/.
+IGNORED_DIRS = {"node_modules", ".next", ".git", ".orchid", "orchid_db", "orchid_batch", "dist", "build", "out", "coverage", "__pycache__"}
+# Agent output directories inside a project (e.g. `batch --out`) hold this file and are never walked.
+OUTPUT_MARKER = ".orchid-output"
+
+_GENERATED_MARKERS = re.compile(r"@generated|do not edit|auto-?generated|automatically generated", re.I)
+_MD_HEADING = re.compile(r"^#{1,6}\s", re.M)
+_MD_FENCE = re.compile(r"^(```|~~~)", re.M)
+_SQL_BREAKPOINT = "--> statement-breakpoint"
+# Bump when `chunk_text` splits files differently: chunk boundaries decide point ids, so
+# points from another chunker version or size must not be mixed into one index.
+CHUNKER_VERSION = 1
+
+
+def walk_project(root: str) -> Iterator[str]:
+    """Project-relative paths of all files outside `IGNORED_DIRS` and agent output directories, in a stable order."""
+    for dir_path, dirs, files in os.walk(root):
+        dirs[:] = sorted(
+            d for d in dirs if d not in IGNORED_DIRS and not os.path.exists(os.path.join(dir_path, d, OUTPUT_MARKER))
+        )
+        for name in sorted(files):
+            yield os.path.relpath(os.path.join(dir_path, name), root).replace(os.sep, "/")
+
+
+def looks_generated(text: str) -> bool:
+    """
+    Generated-file banners near the top, or minified code: nearly all of the file on
+    very long lines (a few long SVG paths in a component do not count).
+    """
+    if _GENERATED_MARKERS.search(text[:1000]):
+        return True
+    lines = text.splitlines() or [""]
+    long_chars = sum(len(line) for line in lines if len(line) > config.INDEX_MINIFIED_LINE_CHARS)
+    return long_chars > len(text) * 0.8 or len(text) / len(lines) > config.INDEX_MINIFIED_AVG_LINE_CHARS
+
+
+class IngestRules:
+    """
+    Decides which project files are indexed: files with an indexed extension
+    that match no exclude pattern (from `config.INDEX_EXCLUDE` plus an optional
+    `.orchidignore` at the project root, one glob per line), are at most
+    `max_bytes` large and do not look generated or minified. `skipped` records
+    why each other candidate was left out.
+
+    With a `cache_path`, the generated/minified verdict of each file is kept
+    there by size and mtime, so only new or changed files are read.
+    """
+
+    def __init__(self, project_root: str, extensions: Tuple[str, ...] = config.INDEX_EXTENSIONS, max_bytes: int = config.INDEX_MAX_FILE_BYTES, cache_path: Optional[str] = None) -> None:
+        self.project_root = project_root
+        self.extensions = extensions
+        self.max_bytes = max_bytes
+        self.cache_path = cache_path
+        self.exclude = list(config.INDEX_EXCLUDE) + self._read_ignore_file()
+        self.skipped: Dict[str, List[str]] = {"excluded": [], "too large": [], "generated": []}
+
+    def _read_ignore_file(self) -> List[str]:
+        try:
+            with open(os.path.join(self.project_root, ".orchidignore"), "r", encoding="utf-8") as f:
+                return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        except OSError:
+            return []
+
+    def excluded(self, rel_path: str) -> bool:
+        for pattern in self.exclude:
+            if pattern.endswith("/"):
+                if rel_path.startswith(pattern) or f"/{pattern}" in f"/{rel_path}":
+                    return True
+            elif fnmatch.fnmatch(rel_path, pattern) or fnmatch.fnmatch(os.path.basename(rel_path), pattern):
+                return True
+        return False
+
+    def _load_cache(self) -> Dict[str, List]:
+        if self.cache_path is None:
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _save_cache(self, cache: Dict[str, List]) -> None:
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _generated(self, abs_path: str, stat: os.stat_result, cached: Optional[List]) -> bool:
+        if cached is not None and cached[:2] == [stat.st_size, stat.st_mtime]:
+            return cached[2]
+        with open(abs_path, "r", encoding="utf-8", errors="replace") as f:
+            return looks_generated(f.read())
+
+    def discover(self) -> List[str]:
+        """Absolute paths of the files to index."""
+        selected = []
+        cache = self._load_cache()
+        verdicts: Dict[str, List] = {}
+        for rel_path in walk_project(self.project_root):
+            if not rel_path.endswith(self.extensions):
+                continue
+            if self.excluded(rel_path):
+                self.skipped["excluded"].append(rel_path)
+                continue
+            abs_path = os.path.join(self.project_root, rel_path)
+            try:
+                stat = os.stat(abs_path)
+                if stat.st_size > self.max_bytes:
+                    self.skipped["too large"].append(rel_path)
+                    continue
+                generated = self._generated(abs_path, stat, cache.get(rel_path))
+            except OSError:
+                continue
+            verdicts[rel_path] = [stat.st_size, stat.st_mtime, generated]
+            if generated:
+                self.skipped["generated"].append(rel_path)
+                continue
+            selected.append(abs_path)
+        if self.cache_path is not None and verdicts != cache:
+            self._save_cache(verdicts)
+        return selected
+
+
+# ── chunkers ─────────────────────────────────────────────────
+# Each returns the offsets at which a new logical section starts.
+
+def _json_sections(text: str) -> List[int]:
+    """Starts of the top-level keys of a JSON object."""
+    starts, depth, in_string, escaped, last = [], 0, False, False, ""
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            # A string right after "{" or "," at depth one is a top-level key.
+            if depth == 1 and last in ",{":
+                starts.append(i)
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+        if not ch.isspace():
+            last = ch
+    return starts
+
+
+def _sql_sections(text: str) -> List[int]:
+    """Starts of SQL statements (after `;` or drizzle statement breakpoints)."""
+    starts = [0]
+    for match in re.finditer(rf";[ \t]*\n|{re.escape(_SQL_BREAKPOINT)}\s*\n", text):
+        starts.append(match.end())
+    return starts
+
+
+def _markdown_sections(text: str) -> List[int]:
+    """Starts of headings that are not inside fenced code blocks."""
+    fences = [m.start() for m in _MD_FENCE.finditer(text)]
+    def in_fence(pos: int) -> bool:
+        return sum(1 for f in fences if f < pos) % 2 == 1
+    return [0] + [m.start() for m in _MD_HEADING.finditer(text) if not in_fence(m.start())]
+
+
+def _css_sections(text: str) -> List[int]:
+    """Starts of top-level rule blocks (after each closing brace at depth zero)."""
+    starts, depth = [0], 0
+    for i, ch in enumerate(text):
+        if ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth = max(0, depth - 1)
+            if depth == 0:
+                starts.append(i + 1)
+    return starts
+
+
+_SECTIONERS = {
+    ".json": _json_sections,
+    ".sql": _sql_sections,
+    ".md": _markdown_sections,
+    ".mdx": _markdown_sections,
+    ".css": _css_sections,
+    ".scss": _css_sections,
+}
+
+
+def _windows(text: str, offset: int, max_chars: int) -> List[Tuple[int, str]]:
+    return [(offset + i, text[i:i + max_chars]) for i in range(0, len(text), max_chars)]
+
+
+def chunk_settings(max_chars: int = config.CHUNK_CHARS) -> Dict:
+    """The parameters that decide chunk boundaries, as recorded in index snapshots."""
+    return {"chunker": CHUNKER_VERSION, "chunk_chars": max_chars}
+
+
+def chunk_text(rel_path: str, text: str, max_chars: int = config.CHUNK_CHARS) -> List[Tuple[int, str]]:
+    """
+    Splits a file into `(offset, text)` chunks of at most `max_chars`. JSON is
+    split by top-level key, SQL by statement, Markdown by heading and CSS by
+    rule block, with small neighbouring sections merged; other files (and
+    sections that are still too large) use fixed-size windows.
+    """
+    sectioner = _SECTIONERS.get(os.path.splitext(rel_path)[1].lower())
+    if sectioner is None:
+        return _windows(text, 0, max_chars)
+
+    bounds = sorted({0, *(b for b in sectioner(text) if 0 < b < len(text))}) + [len(text)]
+    chunks: List[Tuple[int, str]] = []
+    start = prev = 0
+    for end in bounds[1:]:
+        if end - start > max_chars and prev > start:
+            # Close the merged run of sections before the one that would overflow it.
+            chunks.append((start, text[start:prev]))
+            start = prev
+        if end - start > max_chars:
+            chunks.extend(_windows(text[start:end], start, max_chars))
+            start = end
+        prev = end
+    if start < len(text):
+        chunks.extend(_windows(text[start:], start, max_chars))
+    return [(offset, chunk) for offset, chunk in chunks if chunk.strip()]
@@ -0,0 +1,92 @@
+from __future__ import annotations
+import json
+import threading
+from typing import Dict, List, Optional
+import google.generativeai as genai
+import requests
+import requests.adapters
+from src import config
+from src.rate_limit import estimate_tokens, is_rate_limited, limiter
+
+
+def embed_content(content, task_type: str, model: str = config.EMBEDDING_MODEL) -> List:
+    """`genai.embed_content` through the shared rate limiter; returns the embedding(s)."""
+    texts = content if isinstance(content, list) else [content]
+    limiter.acquire(model, sum(estimate_tokens(t) for t in texts))
+    try:
+        embedding = genai.embed_content(model=model, content=content, task_type=task_type)["embedding"]
+    except Exception as e:
+        if is_rate_limited(e):
+            limiter.record_rate_limited(model)
+        raise
+    limiter.record_success(model)
+    return embedding
+
+
+def generate_text(model: str, prompt: str) -> str:
+    """One-shot `GenerativeModel.generate_content` through the shared rate limiter."""
+    limiter.acquire(model, estimate_tokens(prompt))
+    try:
+        response = genai.GenerativeModel(model).generate_content(prompt)
+    except Exception as e:
+        if is_rate_limited(e):
+            limiter.record_rate_limited(model)
+        raise
+    limiter.record_success(model)
+    return response.text
+
+
+class GeminiClient:
+    """
+    Thin wrapper around the Gemini REST API that reuses one HTTP connection
+    pool for every request instead of opening a new connection per call.
+    Requests wait for quota in the process-wide rate limiter.
+    """
+
+    BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+
+    def __init__(self, api_key: str = config.GEMINI_API_KEY, model: str = config.GEMINI_MODEL, pool_size: int = 10) -> None:
+        self.api_key = api_key
+        self.model = model
+        self.http = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.http.mount("https://", adapter)
+        self.http.headers.update({"Content-Type": "application/json"})
+
+    def _url(self, path: str) -> str:
+        return f"{self.BASE_URL}/{path}?key={self.api_key}"
+
+    def _post(self, path: str, body: Dict, model: str, timeout: float, cancel: Optional[threading.Event] = None) -> requests.Response:
+        limiter.acquire(model, estimate_tokens(json.dumps(body)), cancel=cancel)
+        response = self.http.post(self._url(path), json=body, timeout=timeout)
+        try:
+            response.raise_for_status()
+        except requests.HTTPError as e:
+            if is_rate_limited(e):
+                limiter.record_rate_limited(model)
+            raise
+        limiter.record_success(model)
+        return response
+
+    def generate(self, body: Dict, model: Optional[str] = None, timeout: float = 180, cancel: Optional[threading.Event] = None) -> str:
+        """
+        POSTs a `generateContent` body and returns the text of the first
+        candidate. Setting `cancel` withdraws the request while it still waits
+        for quota (it raises `CancelledError`); one already sent runs to the end.
+        """
+        model = model or self.model
+        response = self._post(f"models/{model}:generateContent", body, model, timeout, cancel)
+        return response.json()["candidates"][0]["content"]["parts"][0]["text"]
+
+    def create_cached_content(self, text: str, ttl_seconds: int, model: Optional[str] = None) -> str:
+        """Uploads `text` as a Gemini context cache and returns its resource name."""
+        body = {
+            "model": f"models/{model or self.model}",
+            "contents": [{"role": "user", "parts": [{"text": text}]}],
+            "ttl": f"{ttl_seconds}s",
+        }
+        response = self._post("cachedContents", body, model or self.model, timeout=60)
+        return response.json()["name"]
+
+    def delete_cached_content(self, name: str) -> None:
+        self.http.delete(self._url(name), timeout=30)
@@ -0,0 +1,129 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from src import config
+from src.llm import embed_content
+from src.project import Project
+
+
+def file_digest(path: str) -> Optional[str]:
+    """sha256 of a file's bytes, or None when it does not exist."""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+class PlanCache:
+    """
+    Build plans from earlier tasks, keyed by the task's embedding.
+
+    Only applied plans are stored. Each entry records the database type and a
+    digest of every file the plan touches (and every @-mentioned file) as they
+    were before the plan was applied. A lookup returns the most similar earlier
+    task above `threshold` whose database type matches and whose files are
+    byte-for-byte in that pre-apply state again (after an undo, or in another
+    checkout), so a hit is a plan for the same code the new task would see.
+    """
+
+    VERSION = 1
+
+    def __init__(self, project: Project, threshold: float = config.PLAN_CACHE_THRESHOLD, max_entries: int = config.PLAN_CACHE_MAX_ENTRIES) -> None:
+        self.project = project
+        self.path = os.path.join(project.state_path, "plan_cache.json")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: List[Dict] = self._load()
+
+    def _load(self) -> List[Dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return []
+        if data.get("version") != self.VERSION or data.get("embedding_model") != config.EMBEDDING_MODEL:
+            return []
+        return data.get("entries", [])
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "embedding_model": config.EMBEDDING_MODEL, "entries": self._entries}, f)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def embed(task: str) -> List[float]:
+        return embed_content(task, task_type="SEMANTIC_SIMILARITY")
+
+    def _digests(self, paths: Iterable[str]) -> Dict[str, Optional[str]]:
+        return {p: file_digest(os.path.join(self.project.root, p)) for p in sorted(set(paths))}
+
+    def has_entries(self, db_type: str) -> bool:
+        """Whether a lookup for `db_type` could hit at all (so the task embedding can be skipped)."""
+        with self._lock:
+            return any(e["db_type"] == db_type for e in self._entries)
+
+    def lookup(self, task: str, db_type: str, embedding: List[float]) -> Optional[Dict]:
+        """
+        Returns the best reusable earlier entry (`task`, `db_type`, `embedding`,
+        `files`, `plan`, `created_at`) plus its `similarity`, or None.
+        """
+        with self._lock:
+            candidates = [e for e in self._entries if e["db_type"] == db_type]
+        if not candidates:
+            return None
+
+        matrix = np.asarray([e["embedding"] for e in candidates], dtype=np.float32)
+        query = np.asarray(embedding, dtype=np.float32)
+        scores = matrix @ query / np.maximum(np.linalg.norm(matrix, axis=1) * np.linalg.norm(query), 1e-12)
+        for i in np.argsort(-scores):
+            if scores[i] < self.threshold:
+                break
+            entry = candidates[i]
+            # The plan only still applies if none of the files it was made against changed.
+            if self._digests(entry["files"]) == entry["files"]:
+                return {**entry, "similarity": float(scores[i])}
+        return None
+
+    def prepare(self, task: str, db_type: str, plan: Dict, user_files: Iterable[str] = (), embedding: Optional[List[float]] = None) -> Dict:
+        """
+        Builds the entry for a freshly generated plan, with the digests of its
+        files taken now, before the plan is applied. Pass it to `store` once
+        the plan has been applied.
+        """
+        touched = [step["path"] for step in plan.get("plan", []) if step.get("path")]
+        return {
+            "task": task,
+            "db_type": db_type,
+            "embedding": list(embedding) if embedding is not None else None,
+            "files": self._digests([*touched, *user_files]),
+            "plan": plan,
+            "created_at": time.time(),
+        }
+
+    def store(self, entry: Dict) -> None:
+        """Saves an entry from `prepare` (or `lookup`), embedding its task if that was skipped."""
+        entry = {k: v for k, v in entry.items() if k != "similarity"}
+        if entry["embedding"] is None:
+            entry["embedding"] = self.embed(entry["task"])
+        with self._lock:
+            self._entries = [e for e in self._entries if e["task"] != entry["task"] or e["db_type"] != entry["db_type"]]
+            self._entries.append(entry)
+            del self._entries[: -self.max_entries]
+            self._save()
+
+    def discard(self, task: str, db_type: str) -> None:
+        """Drops the entry for `task`, e.g. after its plan was offered again and declined."""
+        with self._lock:
+            kept = [e for e in self._entries if e["task"] != task or e["db_type"] != db_type]
+            if len(kept) != len(self._entries):
+                self._entries = kept
+                self._save()
@@ -0,0 +1,28 @@
+from __future__ import annotations
+import os
+from typing import Optional
+from src import config
+
+
+class Project:
+    """
+    Paths of one frontend project the agent works on. Each project keeps its
+    own index namespace (`qdrant_path`) and agent state (`state_path`) under
+    its root, so a single agent process can serve many projects.
+    """
+
+    def __init__(self, root: Optional[str] = None) -> None:
+        self.root = os.path.abspath(root or config.PROJECT_ROOT)
+        self.src_path = os.path.join(self.root, "src")
+        self.qdrant_path = os.path.join(self.root, "orchid_db")
+        self.state_path = os.path.join(self.root, ".orchid")
+        self.journal_path = os.path.join(self.state_path, "journal")
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Project) and other.root == self.root
+
+    def __hash__(self) -> int:
+        return hash(self.root)
+
+    def __repr__(self) -> str:
+        return f"Project({self.root!r})"
@@ -0,0 +1,181 @@
+from __future__ import annotations
+import contextlib
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import CancelledError
+from typing import Dict, List, Optional
+from src import config
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("orchid_rate_priority", default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def priority(level: int):
+    """Runs the Gemini calls made inside the block (on this thread) at `level`."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for quota accounting (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """True for HTTP 429s from the REST client and ResourceExhausted from the SDK."""
+    response = getattr(exc, "response", None)
+    if response is not None and getattr(response, "status_code", None) == 429:
+        return True
+    return type(exc).__name__ == "ResourceExhausted" or getattr(exc, "code", None) == 429
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, holding at most one minute's worth."""
+
+    def __init__(self, per_minute: int) -> None:
+        self.capacity = float(per_minute)
+        self.base_rate = per_minute / 60.0
+        self.scale = 1.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.base_rate * self.scale
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float, reserve: float = 0.0) -> float:
+        """Seconds until `amount` can be taken while leaving `reserve` in the bucket."""
+        self._refill(now)
+        # Requests larger than the bucket wait for a full bucket instead of forever.
+        need = min(min(amount, self.capacity) + reserve, self.capacity)
+        return 0.0 if self.level >= need else (need - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+
+class _ModelState:
+    def __init__(self, rpm: int, tpm: int) -> None:
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.waiters: List[tuple[int, int]] = []
+        self.granted = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets per model, shared by
+    every Gemini call in the process.
+
+    Waiting callers are served in priority order (interactive before
+    background), and background work may only use `background_share` of each
+    bucket so an interactive request always finds headroom. A 429 halves the
+    model's refill rate; each success wins back a little of it.
+    """
+
+    def __init__(self, limits: Dict[str, tuple[int, int]] = config.RATE_LIMITS, background_share: float = config.RATE_LIMIT_BACKGROUND_SHARE) -> None:
+        self.limits = limits
+        self.background_share = background_share
+        self._models: Dict[str, _ModelState] = {}
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+
+    @staticmethod
+    def _key(model: str) -> str:
+        return model.removeprefix("models/")
+
+    def _state(self, model: str) -> _ModelState:
+        key = self._key(model)
+        if key not in self._models:
+            self._models[key] = _ModelState(*self.limits.get(key, self.limits["default"]))
+        return self._models[key]
+
+    def acquire(self, model: str, tokens: int = 0, level: Optional[int] = None, cancel: Optional[threading.Event] = None) -> float:
+        """
+        Blocks until `model` has quota for one request of `tokens` tokens; returns
+        the seconds waited. Raises `CancelledError` without taking any quota when
+        `cancel` is set while the request is still queued.
+        """
+        level = _priority.get() if level is None else level
+        started = time.monotonic()
+        with self._cond:
+            state = self._state(model)
+            ticket = (level, next(self._seq))
+            heapq.heappush(state.waiters, ticket)
+            try:
+                while True:
+                    if cancel is not None and cancel.is_set():
+                        raise CancelledError(f"request to {model} was withdrawn while waiting for quota")
+                    timeout = None
+                    if state.waiters[0] == ticket:
+                        now = time.monotonic()
+                        share = 1.0 if level == INTERACTIVE else self.background_share
+                        timeout = max(
+                            state.requests.delay(1, now, reserve=(1 - share) * state.requests.capacity),
+                            state.tokens.delay(tokens, now, reserve=(1 - share) * state.tokens.capacity),
+                        )
+                        if timeout <= 0:
+                            state.requests.take(1)
+                            state.tokens.take(tokens)
+                            break
+                    # Woken early when the queue changes (e.g. an interactive request arrives).
+                    if cancel is not None:
+                        timeout = min(timeout, 0.5) if timeout is not None else 0.5
+                    self._cond.wait(timeout)
+            finally:
+                state.waiters.remove(ticket)
+                heapq.heapify(state.waiters)
+                self._cond.notify_all()
+            waited = time.monotonic() - started
+            state.granted += 1
+            state.wait_seconds += waited
+        return waited
+
+    def record_success(self, model: str) -> None:
+        with self._cond:
+            for bucket in (self._state(model).requests, self._state(model).tokens):
+                bucket.scale = min(1.0, bucket.scale + 0.05)
+
+    def record_rate_limited(self, model: str) -> None:
+        """Backs off after a 429: halves the refill rate and empties the request bucket."""
+        with self._cond:
+            state = self._state(model)
+            state.throttled += 1
+            for bucket in (state.requests, state.tokens):
+                bucket.scale = max(0.05, bucket.scale / 2)
+            state.requests.level = 0.0
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Dict]:
+        """Queue depth by priority, effective limits and wait totals per model."""
+        with self._cond:
+            return {
+                model: {
+                    "queued": {name: sum(1 for w in state.waiters if w[0] == lvl) for lvl, name in PRIORITY_NAMES.items()},
+                    "rpm": round(state.requests.rate * 60, 1),
+                    "tpm": round(state.tokens.rate * 60),
+                    "granted": state.granted,
+                    "throttled": state.throttled,
+                    "wait_seconds": round(state.wait_seconds, 3),
+                }
+                for model, state in self._models.items()
+            }
+
+
+limiter = RateLimiter()
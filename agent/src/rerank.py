@@ -0,0 +1,77 @@
+from __future__ import annotations
+import os
+import re
+from typing import Dict, List, Sequence
+import numpy as np
+from src import config
+
+_TERM = re.compile(r"[A-Za-z_][A-Za-z0-9_\-]{2,}")
+_STOPWORDS = {
+    "the", "and", "for", "with", "what", "does", "how", "why", "where", "which", "this", "that",
+    "from", "into", "add", "can", "you", "please", "should", "would", "are", "our", "use", "make",
+}
+
+
+def _terms(text: str) -> set[str]:
+    return {t.lower() for t in _TERM.findall(text)} - _STOPWORDS
+
+
+def lexical_boosts(query: str, payloads: Sequence[Dict], path_boost: float = config.RERANK_PATH_BOOST, lexical_boost: float = config.RERANK_LEXICAL_BOOST) -> np.ndarray:
+    """
+    Extra relevance for candidates whose file is named in the query (e.g.
+    "what does use-mobile.ts do") and for lexical overlap between the query
+    terms and the chunk's code.
+    """
+    query_lower = query.lower()
+    terms = _terms(query)
+    boosts = np.zeros(len(payloads), dtype=np.float32)
+    for i, payload in enumerate(payloads):
+        path = payload.get("path", "")
+        stem = os.path.splitext(os.path.basename(path))[0].lower()
+        if stem and (stem in query_lower or path.lower().replace(os.sep, "/") in query_lower):
+            boosts[i] += path_boost
+        if terms:
+            boosts[i] += lexical_boost * len(terms & _terms(payload.get("code", ""))) / len(terms)
+    return boosts
+
+
+def mmr(query_vec: Sequence[float], doc_vecs: Sequence[Sequence[float]], k: int, lambda_: float = config.RERANK_LAMBDA, boosts: np.ndarray | None = None, groups: Sequence[str] | None = None, max_per_group: int | None = config.RERANK_MAX_PER_FILE) -> List[int]:
+    """
+    Maximal marginal relevance: greedily picks the candidate that maximizes
+    `lambda * relevance - (1 - lambda) * max similarity to already picked`,
+    skipping groups (files) that already hold `max_per_group` picks.
+    Returns the indices of the selected candidates in pick order.
+    """
+    docs = np.asarray(doc_vecs, dtype=np.float32)
+    if docs.size == 0 or k <= 0:
+        return []
+    docs = docs / np.maximum(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vec, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = docs @ query
+    if boosts is not None:
+        relevance = relevance + boosts
+    similarity = docs @ docs.T
+
+    n = len(docs)
+    available = np.ones(n, dtype=bool)
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    group_ids = None
+    if groups is not None and max_per_group:
+        _, group_ids = np.unique(np.asarray(groups), return_inverse=True)
+        group_counts = np.zeros(group_ids.max() + 1, dtype=np.int32)
+
+    picked: List[int] = []
+    while len(picked) < k and available.any():
+        scores = lambda_ * relevance - (1 - lambda_) * np.where(np.isinf(redundancy), 0.0, redundancy)
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[:, best])
+        if group_ids is not None:
+            group_counts[group_ids[best]] += 1
+            if group_counts[group_ids[best]] >= max_per_group:
+                available &= group_ids != group_ids[best]
+    return picked
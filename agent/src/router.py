@@ -0,0 +1,198 @@
+from __future__ import annotations
+import contextlib
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, CancelledError, Future, TimeoutError as FutureTimeout, wait
+from typing import Deque, Dict, Optional
+from src import config
+
+
+def _percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, round(q * len(ordered)) - 1)]
+
+
+class ModelRouter:
+    """
+    Picks the Gemini model for each request and keeps per-model latency stats.
+
+    Every task kind has a minimum tier (`task_tiers`). Answers and plans are
+    routed upwards from there: they go to the fastest tier whose `limits`
+    (context chars, @-mentioned files) they fit, and to the strongest tier
+    otherwise. With hedging, a request of a task in `hedge_tasks` that is
+    still running past its model's p95 latency for that task (`hedge_after`
+    seconds until `min_samples` calls were timed) is also sent to the next
+    faster tier allowed for its task, and whichever response arrives first is
+    used; the other one is withdrawn if it is still waiting for quota.
+    """
+
+    def __init__(
+        self,
+        tiers: Dict[str, str] = config.MODEL_TIERS,
+        limits: Dict[str, tuple[int, int]] = config.ROUTE_LIMITS,
+        task_tiers: Dict[str, str] = config.ROUTE_TASK_TIERS,
+        hedge_after: float = config.HEDGE_AFTER_SECONDS,
+        hedge_tasks: tuple[str, ...] = config.HEDGE_TASKS,
+        min_samples: int = config.HEDGE_MIN_SAMPLES,
+        enabled: bool = config.MODEL_ROUTING,
+        window: int = config.ROUTER_LATENCY_WINDOW,
+    ) -> None:
+        self.tiers = tiers
+        self.order = list(tiers)
+        self.limits = limits
+        self.task_tiers = task_tiers
+        self.hedge_after = hedge_after
+        self.hedge_tasks = hedge_tasks
+        self.min_samples = min_samples
+        self.enabled = enabled
+        self.window = window
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._task_latencies: Dict[tuple[str, str], Deque[float]] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _min_tier(self, task: str) -> int:
+        return self.order.index(self.task_tiers.get(task, self.order[-1]))
+
+    def model_for(self, task: str) -> str:
+        """The model of `task`'s fixed tier (used for the classifiers)."""
+        return self.tiers[self.order[self._min_tier(task)]]
+
+    def route(self, task: str, context_chars: int = 0, files: int = 0, at_least: Optional[str] = None) -> Dict:
+        """
+        Returns `{"task", "tier", "model", "fallback"}` for a request of `task`
+        with `context_chars` of context and `files` @-mentioned files, never
+        below tier `at_least` (a session's previous tier, so it only moves up).
+        `fallback` is the hedging model, or None.
+        """
+        start = self._min_tier(task)
+        floor = max(start, self.order.index(at_least)) if at_least in self.order else start
+        index = len(self.order) - 1
+        if self.enabled:
+            for i in range(floor, len(self.order) - 1):
+                max_chars, max_files = self.limits.get(self.order[i], (0, 0))
+                if context_chars <= max_chars and files <= max_files:
+                    index = i
+                    break
+        fallback = None
+        if self.hedge_after > 0 and task in self.hedge_tasks and index > start:
+            fallback = self.tiers[self.order[index - 1]]
+        model = self.tiers[self.order[index]]
+        self._count(model, "routed")
+        return {"task": task, "tier": self.order[index], "model": model, "fallback": fallback}
+
+    def _count(self, model: str, event: str) -> None:
+        with self._lock:
+            counts = self._counts.setdefault(model, {"routed": 0, "requests": 0, "errors": 0, "hedged": 0, "hedge_wins": 0, "withdrawn": 0})
+            counts[event] += 1
+
+    @contextlib.contextmanager
+    def track(self, model: str, task: Optional[str] = None):
+        """
+        Records the wall-clock latency (including rate-limit waits) of the call
+        made inside the block, per model and, with `task`, per model and task.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except CancelledError:
+            self._count(model, "withdrawn")
+            raise
+        except Exception:
+            self._count(model, "errors")
+            raise
+        elapsed = time.perf_counter() - started
+        self._count(model, "requests")
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=self.window)).append(elapsed)
+            if task is not None:
+                self._task_latencies.setdefault((model, task), deque(maxlen=self.window)).append(elapsed)
+
+    def hedge_deadline(self, model: str, task: str) -> float:
+        """Seconds a `task` request to `model` may run before it is hedged: its observed p95 once known."""
+        with self._lock:
+            latencies = self._task_latencies.get((model, task))
+            if latencies is None or len(latencies) < self.min_samples:
+                return self.hedge_after
+            return _percentile(latencies, 0.95)
+
+    def _call(self, client, model: str, body: Dict, timeout: float, task: Optional[str] = None, cancel: Optional[threading.Event] = None) -> str:
+        with self.track(model, task):
+            if cancel is None:
+                return client.generate(body, model=model, timeout=timeout)
+            return client.generate(body, model=model, timeout=timeout, cancel=cancel)
+
+    def _submit(self, client, model: str, body: Dict, timeout: float, task: str) -> tuple[Future, threading.Event]:
+        """
+        Runs the call on a daemon thread, so a losing request that is still in
+        flight never holds up interpreter exit. The caller's context (and so its
+        rate-limit priority) carries over. Setting the returned event withdraws
+        the request while it waits for quota.
+        """
+        future: Future = Future()
+        cancel = threading.Event()
+        context = contextvars.copy_context()
+
+        def run() -> None:
+            try:
+                future.set_result(context.run(self._call, client, model, body, timeout, task, cancel))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name=f"orchid-{model}", daemon=True).start()
+        return future, cancel
+
+    def generate(self, client, route: Dict, body: Dict, fallback_body: Optional[Dict] = None, timeout: float = 180) -> tuple[str, str]:
+        """
+        Sends `body` to the routed model through `client` (a `GeminiClient`)
+        and returns `(text, model that answered)`. When the route has a fallback
+        and `fallback_body` is given, the fallback model receives it once the
+        primary is past its `hedge_deadline`. `fallback_body` must not use
+        cached contents, since those belong to one model. The first successful
+        response wins and the other request is withdrawn if it has not been
+        sent yet; if both fail, the primary's error is raised.
+        """
+        task = route["task"]
+        if route["fallback"] is None or fallback_body is None:
+            return self._call(client, route["model"], body, timeout, task), route["model"]
+
+        primary, cancel_primary = self._submit(client, route["model"], body, timeout, task)
+        try:
+            return primary.result(timeout=self.hedge_deadline(route["model"], task)), route["model"]
+        except FutureTimeout:
+            pass
+
+        self._count(route["model"], "hedged")
+        hedge, cancel_hedge = self._submit(client, route["fallback"], fallback_body, timeout, task)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count(route["fallback"], "hedge_wins")
+                        cancel_primary.set()
+                        return future.result(), route["fallback"]
+                    cancel_hedge.set()
+                    return future.result(), route["model"]
+        raise primary.exception()
+
+    def stats(self) -> Dict[str, Dict]:
+        """Routing and hedging counts plus p50/p95/mean latency per model."""
+        with self._lock:
+            stats = {}
+            for model, counts in self._counts.items():
+                latencies = self._latencies.get(model)
+                stats[model] = dict(counts)
+                if latencies:
+                    stats[model].update(
+                        p50_ms=round(_percentile(latencies, 0.5) * 1000),
+                        p95_ms=round(_percentile(latencies, 0.95) * 1000),
+                        mean_ms=round(sum(latencies) / len(latencies) * 1000),
+                    )
+            return stats
+
+
+router = ModelRouter()
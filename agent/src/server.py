@@ -0,0 +1,362 @@
+from __future__ import annotations
+import http.client
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+from rich.console import Console
+from src import config
+from src.index_pool import IndexPool
+from src.project import Project
+from src.rate_limit import limiter
+from src.router import router
+from src.session import LocalPromptCache, Session
+from src.vector_store import scope_filter
+
+
+class ServerError(Exception):
+    """Raised by the client when the daemon is unreachable or returns an error."""
+
+
+class RequestError(Exception):
+    """Raised for a request payload the daemon cannot use (answered with 400)."""
+
+
+class UnknownRoute(LookupError):
+    """Raised for a method and path the daemon has no handler for (answered with 404)."""
+
+
+class OrchidService:
+    """
+    The state a daemon keeps warm between requests: one agent per project
+    (sharing the Gemini client and its connection pool), the pool of open
+    indexes, and the sessions of multi-turn callers.
+
+    Agents are not refreshed on their own: after files change, `POST
+    /reindex` embeds the changes through the daemon's open store (other
+    processes cannot open it while the daemon runs) and reloads the agent.
+    """
+
+    def __init__(self, agent_factory: Callable[[Project], object], index_pool: IndexPool, default_project: Optional[Project] = None, max_sessions: int = 64) -> None:
+        self.agent_factory = agent_factory
+        self.index_pool = index_pool
+        self.index_pool.on_evict = self._forget
+        self.default_project = default_project or Project()
+        self.started_at = time.time()
+        self.requests = 0
+        self.max_sessions = max_sessions
+        self._agents: Dict[Project, object] = {}
+        self._loading: Dict[Project, Future] = {}
+        self._reindexing: Dict[Project, threading.Lock] = {}
+        self._sessions: Dict[tuple[Project, str], tuple[Session, threading.Lock]] = {}
+        self._lock = threading.RLock()
+
+    def _project(self, payload: Dict) -> Project:
+        root = payload.get("project")
+        return Project(root) if root else self.default_project
+
+    def _agent(self, project: Project):
+        """
+        Returns `project`'s agent. A cold project is loaded outside the service
+        lock, so other requests (and other projects) are not held up; concurrent
+        requests for the same project wait for the one load in progress.
+        """
+        with self._lock:
+            agent = self._agents.get(project)
+            if agent is not None:
+                return agent
+            loading = self._loading.get(project)
+            if loading is None:
+                loading = self._loading[project] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return loading.result()
+
+        try:
+            try:
+                agent = self.agent_factory(project)
+            except SystemExit:
+                raise ServerError(f"Project {project.root} is not initialized; run `orchid.py init --project {project.root}`.")
+        except BaseException as e:
+            with self._lock:
+                self._loading.pop(project, None)
+            loading.set_exception(e)
+            raise
+        with self._lock:
+            self._agents[project] = agent
+            self._loading.pop(project, None)
+        loading.set_result(agent)
+        return agent
+
+    def warm(self, project: Project) -> None:
+        """Loads `project`'s agent and index ahead of the first request."""
+        with self.index_pool.lease(project):
+            self._agent(project)
+
+    def _forget(self, project: Project) -> None:
+        """Drops the agent and sessions of a project whose index was evicted."""
+        with self._lock:
+            self._agents.pop(project, None)
+            for key in [k for k in self._sessions if k[0] == project]:
+                self._sessions.pop(key)[0].close()
+
+    def _session(self, agent, session_id: Optional[str]) -> tuple[Session, threading.Lock]:
+        """Returns the caller's session and the lock serializing its turns."""
+        if not session_id:
+            return agent.new_session(LocalPromptCache()), threading.Lock()
+        key = (agent.project, session_id)
+        with self._lock:
+            entry = self._sessions.pop(key, None)
+            if entry is None:
+                entry = (agent.new_session(LocalPromptCache()), threading.Lock())
+            # Re-insert so the dict stays in least-recently-used order.
+            self._sessions[key] = entry
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.pop(next(iter(self._sessions)))[0].close()
+            return entry
+
+    def health(self, payload: Dict) -> Dict:
+        return {
+            "status": "ok",
+            "default_project": self.default_project.root,
+            "open_indexes": self.index_pool.stats(),
+            "index_bytes": self.index_pool.total_bytes(),
+            "rate_limits": limiter.stats(),
+            "models": router.stats(),
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "requests": self.requests,
+            "sessions": len(self._sessions),
+        }
+
+    def search(self, payload: Dict) -> Dict:
+        agent = self._agent(self._project(payload))
+        try:
+            k = int(payload.get("k", 15))
+        except (TypeError, ValueError):
+            raise RequestError(f"k must be an integer, got {payload.get('k')!r}")
+        query_filter = scope_filter(payload.get("directories", ()), payload.get("extensions", ()), payload.get("kinds", ()))
+        if query_filter is not None and not agent.vector_store.schema_current():
+            raise ServerError(f"The index of {agent.project.root} predates scoped search; rebuild it with `orchid.py init` to filter by directory, extension or kind.")
+        results = agent.vector_store.search(payload["query"], k=k, query_filter=query_filter)
+        return {"results": results}
+
+    def ask(self, payload: Dict) -> Dict:
+        agent = self._agent(self._project(payload))
+        session, lock = self._session(agent, payload.get("session"))
+        with lock:
+            keys = session.gather(payload["query"], payload.get("files"))
+            answer = agent.request_answer(session, payload["query"], keys)
+        if answer is None:
+            raise ServerError("Gemini did not return an answer.")
+        return {"answer": answer}
+
+    def plan(self, payload: Dict) -> Dict:
+        agent = self._agent(self._project(payload))
+        task = payload["task"]
+        db_type = payload.get("db_type") or agent.resolve_database(task)
+        session, lock = self._session(agent, payload.get("session"))
+        with lock:
+            keys = session.gather(task, payload.get("files"))
+            plan = agent.request_plan(session, task, db_type, keys)
+        if plan is None:
+            raise ServerError("Gemini did not return a valid plan.")
+        return {"db_type": db_type, "plan": plan}
+
+    def reindex(self, payload: Dict) -> Dict:
+        """Embeds the project's changed files and, if anything changed, reloads its agent and sessions."""
+        project = self._project(payload)
+        with self._lock:
+            lock = self._reindexing.setdefault(project, threading.Lock())
+        with lock:
+            result = self._agent(project).refresh_index()
+            if result["changed"]:
+                self._forget(project)
+        return result
+
+    # Route -> (handler, payload keys it requires).
+    def _routes(self) -> Dict[tuple[str, str], tuple[Callable[[Dict], Dict], tuple[str, ...]]]:
+        return {
+            ("GET", "/health"): (self.health, ()),
+            ("POST", "/search"): (self.search, ("query",)),
+            ("POST", "/ask"): (self.ask, ("query",)),
+            ("POST", "/plan"): (self.plan, ("task",)),
+            ("POST", "/reindex"): (self.reindex, ()),
+        }
+
+    def dispatch(self, method: str, path: str, payload: Dict) -> Dict:
+        route = self._routes().get((method, path))
+        if route is None:
+            raise UnknownRoute(f"No route for {method} {path}")
+        handler, required = route
+        if not isinstance(payload, dict):
+            raise RequestError("The request body must be a JSON object.")
+        missing = [key for key in required if not isinstance(payload.get(key), str) or not payload[key].strip()]
+        if missing:
+            raise RequestError(f"Missing {', '.join(missing)}.")
+        with self._lock:
+            self.requests += 1
+        started = time.perf_counter()
+        with self.index_pool.lease(self._project(payload)):
+            result = handler(payload)
+        result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+
+def _make_handler(service: OrchidService):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status: int, body: Dict) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _handle(self, method: str) -> None:
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                self._send(200, service.dispatch(method, self.path.split("?", 1)[0], payload))
+            except UnknownRoute as e:
+                self._send(404, {"error": str(e)})
+            except (json.JSONDecodeError, RequestError) as e:
+                self._send(400, {"error": f"Bad request: {e}"})
+            except Exception as e:
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+        def do_GET(self) -> None:
+            self._handle("GET")
+
+        def do_POST(self) -> None:
+            self._handle("POST")
+
+        def address_string(self) -> str:
+            # Unix-socket peers have no (host, port) tuple.
+            return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    return Handler
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+class OrchidServer:
+    """Serves an `OrchidService` over a local Unix socket and/or loopback HTTP."""
+
+    def __init__(self, service: OrchidService, host: str = config.SERVER_HOST, port: Optional[int] = config.SERVER_PORT, socket_path: Optional[str] = config.SERVER_SOCKET) -> None:
+        self.console = Console()
+        self.service = service
+        self.servers = []
+        handler = _make_handler(service)
+        if socket_path and hasattr(socket, "AF_UNIX"):
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+            unix_server = _UnixHTTPServer(socket_path, handler)
+            os.chmod(socket_path, 0o600)
+            self.servers.append((f"unix:{socket_path}", unix_server))
+        if port:
+            http_server = ThreadingHTTPServer((host, port), handler)
+            http_server.daemon_threads = True
+            self.servers.append((f"http://{host}:{port}", http_server))
+        if not self.servers:
+            raise ServerError("Nothing to listen on: give a port or a socket path.")
+
+    def serve_forever(self) -> None:
+        threads = []
+        for address, server in self.servers:
+            thread = threading.Thread(target=server.serve_forever, name=address, daemon=True)
+            thread.start()
+            threads.append(thread)
+            self.console.print(f"[bold green]Listening on {address}[/bold green]")
+        try:
+            while any(t.is_alive() for t in threads):
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            self.console.print("\n[bold magenta]Shutting down… 🌸[/bold magenta]")
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        for address, server in self.servers:
+            server.shutdown()
+            server.server_close()
+            if address.startswith("unix:") and os.path.exists(address[5:]):
+                os.remove(address[5:])
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class OrchidClient:
+    """Thin client for a running `orchid.py serve` daemon."""
+
+    def __init__(self, host: str = config.SERVER_HOST, port: int = config.SERVER_PORT, socket_path: Optional[str] = config.SERVER_SOCKET, timeout: float = 300, project: Optional[str] = None) -> None:
+        self.project = os.path.abspath(project) if project else None
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self.socket_path and hasattr(socket, "AF_UNIX") and os.path.exists(self.socket_path):
+            return _UnixHTTPConnection(self.socket_path, self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method: str, path: str, payload: Optional[Dict] = None) -> Dict:
+        conn = self._connection()
+        try:
+            body = json.dumps(payload).encode("utf-8") if payload is not None else None
+            conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            data = json.loads(response.read() or b"{}")
+        except (OSError, http.client.HTTPException, json.JSONDecodeError) as e:
+            raise ServerError(f"Could not reach the Orchid daemon ({e}). Start it with `python agent/orchid.py serve`.") from e
+        finally:
+            conn.close()
+        if response.status != 200:
+            raise ServerError(data.get("error", f"HTTP {response.status}"))
+        return data
+
+    def health(self) -> Dict:
+        return self.request("GET", "/health")
+
+    def search(self, query: str, k: int = 15, directories=None, extensions=None, kinds=None) -> Dict:
+        return self.request("POST", "/search", {
+            "query": query, "k": k, "project": self.project,
+            "directories": directories or [], "extensions": extensions or [], "kinds": kinds or [],
+        })
+
+    def ask(self, query: str, files=None, session: Optional[str] = None) -> Dict:
+        return self.request("POST", "/ask", {"query": query, "files": files or [], "session": session, "project": self.project})
+
+    def plan(self, task: str, files=None, session: Optional[str] = None) -> Dict:
+        return self.request("POST", "/plan", {"task": task, "files": files or [], "session": session, "project": self.project})
+
+    def reindex(self) -> Dict:
+        return self.request("POST", "/reindex", {"project": self.project})
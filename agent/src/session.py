@@ -0,0 +1,314 @@
+from __future__ import annotations
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+import requests
+from rich.console import Console
+from src import config
+from src.file_context import FileContextLoader
+from src.import_graph import ImportGraph
+from src.llm import GeminiClient
+from src.vector_store import scope_filter, union_filter
+
+
+def render_block(path: str, text: str) -> str:
+    return f"--- START OF {path} ---\n{text}\n--- END OF {path} ---"
+
+
+def _user_content(*texts: str) -> Dict:
+    return {"role": "user", "parts": [{"text": t} for t in texts]}
+
+
+class LocalPromptCache:
+    """
+    Local stand-in for Gemini context caching.
+
+    Requests have the same shape as with a real cache (stable prefix + per-turn
+    suffix) but the prefix is always sent inline. Hits and misses are counted so
+    prefix reuse can be observed without network access.
+    """
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self._current: Dict[str, str] = {}
+
+    @staticmethod
+    def _key(model: str, prefix: str) -> str:
+        return hashlib.sha256(f"{model}\0{prefix}".encode("utf-8")).hexdigest()
+
+    def _record(self, kind: str, key: str) -> bool:
+        hit = self._current.get(kind) == key
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._current[kind] = key
+        return hit
+
+    def body(self, kind: str, prefix: str, turn: str, model: str) -> Dict:
+        self._record(kind, self._key(model, prefix))
+        return {"contents": [_user_content(prefix, turn)]}
+
+    def close(self) -> None:
+        self._current.clear()
+
+
+class GeminiPromptCache(LocalPromptCache):
+    """
+    Stores the stable prefix of each prompt kind with Gemini `cachedContents`,
+    so follow-up turns only upload and pay for the per-turn suffix. Falls back
+    to inline prefixes when the prefix is too small or caching is unavailable.
+    """
+
+    def __init__(self, client: GeminiClient, ttl_seconds: int = config.CONTEXT_CACHE_TTL, min_chars: int = config.CONTEXT_CACHE_MIN_CHARS) -> None:
+        super().__init__()
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.min_chars = min_chars
+        self._names: Dict[str, tuple[str, str, float]] = {}  # kind -> (key, name, expires_at)
+        self._unavailable: Set[str] = set()
+
+    def body(self, kind: str, prefix: str, turn: str, model: str) -> Dict:
+        key = self._key(model, prefix)
+        if len(prefix) < self.min_chars or key in self._unavailable:
+            return super().body(kind, prefix, turn, model)
+
+        entry = self._names.get(kind)
+        if entry is None or entry[0] != key or entry[2] <= time.time():
+            if entry is not None:
+                self._delete(entry[1])
+            try:
+                name = self.client.create_cached_content(prefix, self.ttl_seconds, model=model)
+            except (requests.RequestException, KeyError, ValueError):
+                self._names.pop(kind, None)
+                self._unavailable.add(key)
+                return super().body(kind, prefix, turn, model)
+            # Refresh a little before the server-side TTL runs out.
+            self._names[kind] = (key, name, time.time() + self.ttl_seconds * 0.9)
+
+        self._record(kind, key)
+        return {"cachedContent": self._names[kind][1], "contents": [_user_content(turn)]}
+
+    def _delete(self, name: str) -> None:
+        try:
+            self.client.delete_cached_content(name)
+        except requests.RequestException:
+            pass
+
+    def close(self) -> None:
+        for _, name, _ in self._names.values():
+            self._delete(name)
+        self._names.clear()
+        super().close()
+
+
+class Session:
+    """
+    Context carried across the turns of one interactive session.
+
+    Keeps a working set of retrieved chunks, @-mentioned files and (with an
+    import graph) the files they import or are imported by, dropped as
+    soon as the file's mtime changes or, least recently used first, once the
+    set exceeds `max_working_set_chars`; the last few requests; and one stable
+    prompt prefix per prompt kind. Items already in the prefix are not resent;
+    only new context travels with each turn. Warnings go to the caller's
+    `console`, so they follow its quiet mode in batch and daemon runs.
+    """
+
+    def __init__(self, vector_store, prompt_cache: LocalPromptCache, project_root: str = config.PROJECT_ROOT, max_context_chars: int = config.SESSION_MAX_CONTEXT_CHARS, max_working_set_chars: int = config.SESSION_WORKING_SET_CHARS, import_graph: Optional[ImportGraph] = None, file_loader: Optional[FileContextLoader] = None, console: Optional[Console] = None) -> None:
+        self.console = console or Console()
+        self.vector_store = vector_store
+        self.prompt_cache = prompt_cache
+        self.project_root = project_root
+        self.import_graph = import_graph
+        self.file_loader = file_loader or FileContextLoader(project_root, console=self.console)
+        self.max_context_chars = max_context_chars
+        self.max_working_set_chars = max_working_set_chars
+        self.history: List[str] = []
+        self._items: "OrderedDict[str, Dict]" = OrderedDict()
+        self._prefixes: Dict[str, tuple[str, List[str]]] = {}
+        self._turns: Dict[str, str] = {}
+        # Highest model tier each prompt kind was routed to; see `ModelRouter.route(at_least=...)`.
+        self.route_tiers: Dict[str, str] = {}
+
+    @staticmethod
+    def _mtime(path: str) -> Optional[float]:
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+
+    def _absolute(self, path: str) -> str:
+        return path if os.path.isabs(path) else os.path.join(self.project_root, path)
+
+    def _invalidate(self) -> None:
+        changed = {k for k, item in self._items.items() if self._mtime(item["abs_path"]) != item["mtime"]}
+        for key in changed:
+            del self._items[key]
+        # A reloaded file comes back under the same key, so prefixes that carried the old text go too.
+        for kind in [kind for kind, (_, prefix_keys) in self._prefixes.items() if changed.intersection(prefix_keys)]:
+            del self._prefixes[kind]
+
+    def _evict(self, keep: Set[str]) -> None:
+        """Drops least recently used items (other than `keep` and the cached prefixes) beyond the working-set cap."""
+        pinned = keep.union(*(prefix_keys for _, prefix_keys in self._prefixes.values()))
+        total = sum(len(item["text"]) for item in self._items.values())
+        for key in list(self._items):
+            if total <= self.max_working_set_chars:
+                break
+            if key not in pinned:
+                total -= len(self._items.pop(key)["text"])
+
+    def _add(self, key: str, item: Dict) -> None:
+        self._items[key] = item
+        self._items.move_to_end(key)
+
+    def _load_file(self, rel_path: str, kind: str = "file") -> Optional[str]:
+        key = f"{kind}:{rel_path}"
+        if key in self._items:
+            self._items.move_to_end(key)
+            return key
+        entry = self.file_loader.load(rel_path)
+        if entry is None:
+            return None
+        self._add(key, {"kind": kind, **entry})
+        return key
+
+    def _expand_imports(self, user_files: List[str], budget: int) -> List[str]:
+        """Loads the direct imports, then importers, of `user_files` while they fit in `budget` chars."""
+        self.import_graph.update([self._absolute(f) for f in user_files], complete=False)
+        keys = []
+        for rel_path in self.import_graph.neighbors(user_files):
+            key = self._load_file(rel_path, kind="related")
+            if key is None or len(self._items[key]["text"]) > budget:
+                continue
+            budget -= len(self._items[key]["text"])
+            keys.append(key)
+        return keys
+
+    def _search(self, query: str, mentions: List[str], k: int) -> List[Dict]:
+        """
+        Vector search scoped to the directories/globs among the @-mentions,
+        topped up with a few unscoped hits for cross-cutting context.
+        """
+        query_filter = union_filter([scope_filter(**scope) for scope in self.file_loader.scopes(mentions)])
+        # Collections from before scoped search have no fields to filter on.
+        if query_filter is None or not self.vector_store.schema_current():
+            return self.vector_store.search(query, k=k)
+        scoped = self.vector_store.search(query, k=k, query_filter=query_filter)
+        return scoped + self.vector_store.search(query, k=config.SCOPED_SEARCH_TOPUP)
+
+    def gather(self, query: str, user_files: Optional[List[str]] = None, k: int = config.RETRIEVAL_K, expand_imports: bool = config.EXPAND_IMPORTS) -> List[str]:
+        """
+        Collects the context for one turn: @-mentioned files (served from the
+        working set while unchanged on disk), their direct imports and importers
+        when `expand_imports` is set, plus freshly searched chunks (scoped by
+        `@dir/` and glob mentions). Returns the keys of the items relevant to
+        this turn.
+        """
+        self._invalidate()
+        keys, budget = [], config.FILE_CONTEXT_TOTAL_CHARS
+        for rel_path in self.file_loader.expand(user_files or []):
+            key = self._load_file(rel_path)
+            if key is None:
+                continue
+            size = len(self._items[key]["text"])
+            if size > budget:
+                self.console.print(f"[yellow]Warning: Skipping @{rel_path}; the mentioned files exceed {config.FILE_CONTEXT_TOTAL_CHARS:,} characters.[/yellow]")
+                continue
+            budget -= size
+            keys.append(key)
+        if expand_imports and self.import_graph is not None and keys:
+            mentioned = [self._items[key]["path"] for key in keys]
+            keys += [key for key in self._expand_imports(mentioned, config.IMPORT_EXPANSION_CHARS) if key not in keys]
+        for chunk in self._search(query, user_files or [], k):
+            digest = hashlib.sha1(chunk["code"].encode("utf-8")).hexdigest()[:12]
+            key = f"chunk:{chunk['path']}:{digest}"
+            if key not in self._items:
+                abs_path = self._absolute(chunk["path"])
+                self._add(key, {"kind": "chunk", "path": chunk["path"], "abs_path": abs_path, "mtime": self._mtime(abs_path), "text": chunk["code"]})
+            else:
+                self._items.move_to_end(key)
+            if key not in keys:
+                keys.append(key)
+        self._evict(set(keys))
+        return keys
+
+    def _select(self, keys: List[str]) -> List[str]:
+        selected, total = [], 0
+        for key in keys:
+            size = len(self._items[key]["text"])
+            if total + size > self.max_context_chars:
+                continue
+            selected.append(key)
+            total += size
+        return selected
+
+    def _render(self, keys: List[str]) -> tuple[str, str]:
+        files = "\n\n".join(render_block(self._items[k]["path"], self._items[k]["text"]) for k in keys if self._items[k]["kind"] == "file")
+        # Files pulled in through the import graph travel with the snippets, not as user-provided files.
+        chunks = "\n".join(render_block(self._items[k]["path"], self._items[k]["text"]) for k in keys if self._items[k]["kind"] != "file")
+        return files, chunks
+
+    def _prefix(self, kind: str, instructions: str, keys: List[str]) -> tuple[str, List[str]]:
+        """Returns the prefix for `kind`, rebuilding it when it went stale or drifted too far."""
+        current = self._prefixes.get(kind)
+        if current is not None:
+            prefix, prefix_keys = current
+            still_valid = all(k in self._items for k in prefix_keys)
+            delta_chars = sum(len(self._items[k]["text"]) for k in keys if k not in prefix_keys)
+            if still_valid and delta_chars <= max(len(prefix) // 2, 4000):
+                return current
+
+        prefix_keys = self._select(keys)
+        files, chunks = self._render(prefix_keys)
+        prefix = f"{instructions}\n\n## Session Context\n{files}\n\n{chunks}"
+        self._prefixes[kind] = (prefix, prefix_keys)
+        return self._prefixes[kind]
+
+    def context_size(self, keys: List[str]) -> Dict[str, int]:
+        """Characters of context and number of @-mentioned files a turn over `keys` carries."""
+        selected = self._select(keys)
+        return {
+            "context_chars": sum(len(self._items[k]["text"]) for k in selected),
+            "files": sum(1 for k in selected if self._items[k]["kind"] == "file"),
+        }
+
+    def build_request(self, kind: str, instructions: str, keys: List[str], make_turn, model: str) -> tuple[Dict, Dict]:
+        """
+        Builds the `generateContent` body for one turn. `make_turn` receives the
+        rendered user-file context, snippet context and session history for the
+        items that are not already part of the cached prefix.
+        """
+        prefix, prefix_keys = self._prefix(kind, instructions, keys)
+        new_keys = self._select([k for k in keys if k not in prefix_keys])
+        files, chunks = self._render(new_keys)
+        reused = sorted({self._items[k]["path"] for k in keys if k in prefix_keys})
+        if reused:
+            chunks = f"(Already in Session Context: {', '.join(reused)})\n{chunks}"
+        history = "\n".join(f"- {h}" for h in self.history[-3:])
+        turn = make_turn(files, chunks, history)
+        self._turns[kind] = turn
+
+        cached_before = self.prompt_cache.hits
+        body = self.prompt_cache.body(kind, prefix, turn, model)
+        stats = {
+            "prefix_chars": len(prefix),
+            "turn_chars": len(turn),
+            "prefix_reused": self.prompt_cache.hits > cached_before,
+            "cached": "cachedContent" in body,
+        }
+        return body, stats
+
+    def inline_body(self, kind: str) -> Dict:
+        """The last request built for `kind` with its prefix inline, so any model can serve it."""
+        return {"contents": [_user_content(self._prefixes[kind][0], self._turns[kind])]}
+
+    def record_turn(self, query: str) -> None:
+        self.history.append(query.strip())
+
+    def close(self) -> None:
+        self.prompt_cache.close()
@@ -0,0 +1,133 @@
+from __future__ import annotations
+import gzip
+import json
+import os
+import subprocess
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+from src import config
+from src.ingest import chunk_settings
+from src.plan_cache import file_digest
+from src.project import Project
+from src.vector_store import PAYLOAD_SCHEMA, VectorStore
+
+FORMAT = "orchid-index"
+VERSION = 2
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot cannot be written, read or used with this project."""
+
+
+def git_commit(root: str) -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def file_hashes(project: Project, file_paths: List[str]) -> Dict[str, Optional[str]]:
+    """sha256 of each file, keyed by its project-relative path."""
+    return {
+        os.path.relpath(path, project.root).replace(os.sep, "/"): file_digest(path)
+        for path in file_paths
+    }
+
+
+def export_snapshot(vector_store: VectorStore, project: Project, file_paths: List[str], out_path: str) -> Dict:
+    """
+    Writes the collection to a gzip-compressed JSONL file: a manifest line
+    (format version, embedding model, chunk settings, payload schema,
+    dimension, source commit and a hash of every indexed file) followed by one `{"vector", "payload"}` line per
+    point. Payload paths are stored relative to the project root so the
+    snapshot can be loaded from any checkout. Returns the manifest.
+    """
+    if not vector_store.is_complete():
+        raise SnapshotError("The index is missing or incomplete; run `python agent/orchid.py init` first.")
+
+    manifest = {
+        "format": FORMAT,
+        "version": VERSION,
+        "embedding_model": config.EMBEDDING_MODEL,
+        "chunking": chunk_settings(),
+        "payload_schema": PAYLOAD_SCHEMA,
+        "dim": vector_store.dimension(),
+        "points": vector_store.point_count(),
+        "git_commit": git_commit(project.root),
+        "created_at": time.time(),
+        "files": file_hashes(project, file_paths),
+    }
+    tmp_path = f"{out_path}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        f.write(json.dumps(manifest) + "\n")
+        for vector, payload in vector_store.iter_points():
+            rel_path = os.path.relpath(payload["path"], project.root).replace(os.sep, "/")
+            f.write(json.dumps({"vector": vector, "payload": {**payload, "path": rel_path}}) + "\n")
+    os.replace(tmp_path, out_path)
+    return manifest
+
+
+def read_manifest(path: str) -> Dict:
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            manifest = json.loads(f.readline())
+    except (OSError, EOFError, json.JSONDecodeError) as e:
+        raise SnapshotError(f"{path} is not a readable index snapshot: {e}") from e
+    if manifest.get("format") != FORMAT:
+        raise SnapshotError(f"{path} is not an Orchid index snapshot.")
+    if manifest.get("version") != VERSION:
+        raise SnapshotError(f"Snapshot format version {manifest.get('version')} is not supported (expected {VERSION}).")
+    return manifest
+
+
+def import_snapshot(path: str, vector_store: VectorStore, project: Project, file_paths: List[str]) -> Dict:
+    """
+    Loads the points of every file whose content still matches the snapshot
+    into `vector_store`, leaving its build checkpointed as unfinished so the
+    caller's `build_collection` embeds only changed and new files (and drops
+    the points of chunks that no longer exist). Snapshots made with another
+    embedding model, chunking or payload schema are rejected, since their
+    points cannot be mixed with freshly built ones. Returns what was loaded
+    and what still needs indexing.
+    """
+    manifest = read_manifest(path)
+    if manifest["embedding_model"] != config.EMBEDDING_MODEL:
+        raise SnapshotError(
+            f"Snapshot was embedded with {manifest['embedding_model']}, but this agent uses {config.EMBEDDING_MODEL}."
+        )
+    if manifest.get("chunking") != chunk_settings():
+        raise SnapshotError(
+            f"Snapshot was chunked with {manifest.get('chunking')}, but this agent uses {chunk_settings()}; "
+            "run `python agent/orchid.py init` to build the index instead."
+        )
+    if manifest.get("payload_schema") != PAYLOAD_SCHEMA:
+        raise SnapshotError(
+            f"Snapshot payloads use schema {manifest.get('payload_schema')}, but this agent needs {PAYLOAD_SCHEMA}; "
+            "run `python agent/orchid.py init` to build the index instead."
+        )
+
+    current = file_hashes(project, file_paths)
+    unchanged = {p for p, digest in current.items() if digest is not None and manifest["files"].get(p) == digest}
+
+    def records() -> Iterator[Tuple[List[float], Dict]]:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            f.readline()
+            for line_no, line in enumerate(f, start=2):
+                record = json.loads(line)
+                if len(record["vector"]) != manifest["dim"]:
+                    raise SnapshotError(f"{path}:{line_no}: vector has {len(record['vector'])} dimensions, expected {manifest['dim']}.")
+                payload = record["payload"]
+                if payload["path"] in unchanged:
+                    yield record["vector"], {**payload, "path": os.path.join(project.root, *payload["path"].split("/"))}
+
+    loaded = vector_store.restore(records(), manifest["dim"])
+    return {
+        "loaded_points": loaded,
+        "snapshot_points": manifest["points"],
+        "unchanged_files": len(unchanged),
+        "changed_files": sorted(set(current) - unchanged),
+        "removed_files": sorted(set(manifest["files"]) - set(current)),
+        "snapshot_commit": manifest.get("git_commit"),
+        "commit": git_commit(project.root),
+    }
@@ -0,0 +1,250 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from src import config
+
+
+class TransactionError(Exception):
+    """Raised when a change set could not be applied (or undone) cleanly."""
+
+
+def _fsync_dir(path: str) -> None:
+    # Directory fsync makes renames durable on POSIX; Windows has no equivalent.
+    if os.name != "posix":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_temp(target: str, data: bytes, mode: Optional[int]) -> str:
+    """Writes `data` to a fsynced temp file next to `target` and returns its path."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".orchid-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return tmp_path
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _file_digest(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return _digest(f.read())
+    except OSError:
+        return None
+
+
+def _default_mode() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+class Journal:
+    """
+    Applies staged changes as a single transaction and keeps a journal of the
+    previous file contents so the last applied plan can be rolled back.
+
+    Every transaction lives in its own directory under `journal_path`:
+    a `manifest.json` describing the touched files (with a digest of the
+    content written to each) plus one backup file per path that existed
+    before the change.
+    """
+
+    def __init__(self, project_root: str = config.PROJECT_ROOT, journal_path: str = config.JOURNAL_PATH, max_workers: int = 8) -> None:
+        self.project_root = os.path.abspath(project_root)
+        self.journal_path = journal_path
+        self.max_workers = max_workers
+
+    def _resolve(self, rel_path: str) -> str:
+        absolute_path = os.path.abspath(os.path.join(self.project_root, rel_path))
+        if os.path.commonpath([absolute_path, self.project_root]) != self.project_root:
+            raise TransactionError(f"Refusing to write outside the project: {rel_path}")
+        return absolute_path
+
+    @staticmethod
+    def _write_manifest(entry_dir: str, manifest: Dict) -> None:
+        manifest_path = os.path.join(entry_dir, "manifest.json")
+        tmp_path = _write_temp(manifest_path, json.dumps(manifest, indent=2).encode("utf-8"), None)
+        os.replace(tmp_path, manifest_path)
+        _fsync_dir(entry_dir)
+
+    def _prepare(self, changes: Dict[str, str]) -> tuple[str, Dict]:
+        """Records the current state of every target before anything is touched."""
+        targets = {rel_path: self._resolve(rel_path) for rel_path in sorted(changes)}
+        txn_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        entry_dir = os.path.join(self.journal_path, txn_id)
+        os.makedirs(os.path.join(entry_dir, "backup"))
+
+        files, created_dirs = [], []
+        for n, (rel_path, absolute_path) in enumerate(targets.items()):
+            record = {"path": rel_path, "existed": os.path.exists(absolute_path), "backup": None, "mode": None}
+            if record["existed"]:
+                record["backup"] = os.path.join("backup", str(n))
+                record["mode"] = os.stat(absolute_path).st_mode & 0o7777
+                shutil.copyfile(absolute_path, os.path.join(entry_dir, record["backup"]))
+            files.append(record)
+
+            missing, parent = [], os.path.dirname(absolute_path)
+            while parent and not os.path.isdir(parent):
+                missing.append(parent)
+                parent = os.path.dirname(parent)
+            created_dirs.extend(d for d in reversed(missing) if d not in created_dirs)
+
+        manifest = {
+            "id": txn_id,
+            "created_at": time.time(),
+            "status": "prepared",
+            "files": files,
+            "created_dirs": [os.path.relpath(d, self.project_root) for d in created_dirs],
+        }
+        self._write_manifest(entry_dir, manifest)
+        return entry_dir, manifest
+
+    def _restore(self, entry_dir: str, record: Dict) -> None:
+        absolute_path = self._resolve(record["path"])
+        if record["existed"]:
+            with open(os.path.join(entry_dir, record["backup"]), "rb") as f:
+                data = f.read()
+            os.makedirs(os.path.dirname(absolute_path), exist_ok=True)
+            os.replace(_write_temp(absolute_path, data, record["mode"]), absolute_path)
+        elif os.path.exists(absolute_path):
+            os.remove(absolute_path)
+
+    def _remove_created_dirs(self, manifest: Dict) -> None:
+        for rel_dir in reversed(manifest.get("created_dirs", [])):
+            try:
+                os.rmdir(os.path.join(self.project_root, rel_dir))
+            except OSError:
+                pass
+
+    def apply(self, changes: Dict[str, str]) -> str:
+        """
+        Writes every change to a temp file in parallel, then renames them into
+        place. Either all files are replaced or the tree is left as it was.
+        Returns the transaction id.
+        """
+        if not changes:
+            raise TransactionError("No changes to apply.")
+
+        entry_dir, manifest = self._prepare(changes)
+        records = {r["path"]: r for r in manifest["files"]}
+        for rel_dir in manifest["created_dirs"]:
+            os.makedirs(os.path.join(self.project_root, rel_dir), exist_ok=True)
+
+        def stage(item):
+            rel_path, code = item
+            return rel_path, _write_temp(self._resolve(rel_path), code.encode("utf-8"), records[rel_path]["mode"] or _default_mode())
+
+        temp_files: Dict[str, str] = {}
+        errors: List[str] = []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(changes))) as pool:
+            futures = [pool.submit(stage, item) for item in changes.items()]
+            for future in futures:
+                try:
+                    rel_path, tmp_path = future.result()
+                    temp_files[rel_path] = tmp_path
+                except Exception as e:
+                    errors.append(str(e))
+
+        if errors:
+            for tmp_path in temp_files.values():
+                os.remove(tmp_path)
+            self._remove_created_dirs(manifest)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            raise TransactionError(f"Could not stage changes: {'; '.join(errors)}")
+
+        replaced: List[str] = []
+        try:
+            for rel_path, tmp_path in temp_files.items():
+                os.replace(tmp_path, self._resolve(rel_path))
+                replaced.append(rel_path)
+            for parent in {os.path.dirname(self._resolve(p)) for p in replaced}:
+                _fsync_dir(parent)
+        except OSError as e:
+            for rel_path in replaced:
+                self._restore(entry_dir, records[rel_path])
+            for rel_path, tmp_path in temp_files.items():
+                if rel_path not in replaced and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            self._remove_created_dirs(manifest)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            raise TransactionError(f"Could not apply changes, rolled back: {e}") from e
+
+        for rel_path, code in changes.items():
+            records[rel_path]["digest"] = _digest(code.encode("utf-8"))
+        manifest["status"] = "committed"
+        self._write_manifest(entry_dir, manifest)
+        return manifest["id"]
+
+    def _entries(self) -> List[tuple[str, Dict]]:
+        if not os.path.isdir(self.journal_path):
+            return []
+        entries = []
+        for name in sorted(os.listdir(self.journal_path)):
+            manifest_path = os.path.join(self.journal_path, name, "manifest.json")
+            try:
+                with open(manifest_path, "r", encoding="utf-8") as f:
+                    entries.append((os.path.join(self.journal_path, name), json.load(f)))
+            except (OSError, json.JSONDecodeError):
+                continue
+        return sorted(entries, key=lambda e: e[1].get("created_at", 0))
+
+    def modified_since(self, manifest: Dict) -> List[str]:
+        """Paths of a committed transaction whose content on disk is no longer what it wrote."""
+        if manifest.get("status") != "committed":
+            return []
+        return [
+            record["path"] for record in manifest["files"]
+            if "digest" in record and _file_digest(self._resolve(record["path"])) != record["digest"]
+        ]
+
+    def undo(self, force: bool = False) -> Optional[Dict]:
+        """
+        Rolls back the most recent applied (or interrupted) transaction.
+        Returns its manifest, or None if there is nothing to undo. Refuses
+        (unless `force`) when files it wrote were changed afterwards, since
+        restoring them would discard those later edits.
+        """
+        pending = [(d, m) for d, m in self._entries() if m.get("status") in {"committed", "prepared"}]
+        if not pending:
+            return None
+        entry_dir, manifest = pending[-1]
+        modified = self.modified_since(manifest)
+        if modified and not force:
+            raise TransactionError(
+                f"Files changed after transaction {manifest['id']} was applied: {', '.join(modified)}. "
+                "Undoing it would discard those edits; use --force to undo anyway."
+            )
+        try:
+            for record in manifest["files"]:
+                self._restore(entry_dir, record)
+        except OSError as e:
+            raise TransactionError(f"Could not undo transaction {manifest['id']}: {e}") from e
+        self._remove_created_dirs(manifest)
+
+        manifest["status"] = "undone"
+        manifest["undone_at"] = time.time()
+        self._write_manifest(entry_dir, manifest)
+        return manifest
@@ -1,25 +1,148 @@
 from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+import copy
+import threading
 import uuid
-from typing import List, Dict
-import google.generativeai as genai
+import warnings
+from collections import OrderedDict
+from typing import List, Dict, Iterable, Iterator, Optional, Sequence, Tuple
 from qdrant_client import QdrantClient, models
 from rich.console import Console
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeElapsedColumn
 from src import config
+from src.llm import embed_content
+from src.rate_limit import BACKGROUND, priority
+from src.rerank import lexical_boosts, mmr
+
+
+# Keyword payload fields indexed for filtered search; see `chunk_payload`.
+INDEXED_FIELDS = ("directory", "dirs", "extension", "kind")
+# Bumped whenever `chunk_payload` gains fields that searches rely on; older collections are rebuilt.
+PAYLOAD_SCHEMA = 2
+
+_FILE_KINDS = {".json": "config", ".sql": "schema", ".md": "docs", ".mdx": "docs", ".css": "style", ".scss": "style"}
+_HOOK = re.compile(r"\b(?:function\s+|const\s+)use[A-Z]\w*")
+_COMPONENT = re.compile(r"\b(?:function\s+|const\s+)[A-Z]\w*|<[A-Za-z][\w.]*[\s/>]")
+_TYPE = re.compile(r"\b(?:interface|type|enum)\s+[A-Z]\w*")
+_FUNCTION = re.compile(r"\b(?:function\s+\w+|const\s+\w+\s*=\s*(?:async\s*)?\()")
+
+
+def symbol_kind(rel_path: str, code: str) -> str:
+    """Coarse kind of a chunk: config, schema, docs, style, route, hook, component, type, function or code."""
+    name = os.path.basename(rel_path)
+    extension = os.path.splitext(name)[1].lower()
+    if extension in _FILE_KINDS:
+        return _FILE_KINDS[extension]
+    if "/api/" in f"/{rel_path}" or name.startswith(("route.", "middleware.")):
+        return "route"
+    if _HOOK.search(code):
+        return "hook"
+    if name.endswith((".tsx", ".jsx")) and _COMPONENT.search(code):
+        return "component"
+    if _TYPE.search(code):
+        return "type"
+    if _FUNCTION.search(code):
+        return "function"
+    return "code"
+
+
+def chunk_payload(project_root: str, path: str, code: str, offset: int = 0) -> Dict:
+    """
+    Chunk payload with the keyword fields used to scope searches. `path` is
+    the absolute path the chunk was read from (snapshots store it relative
+    and re-root it on import); the filter fields are project-relative.
+    """
+    rel_path = os.path.relpath(path, project_root).replace(os.sep, "/")
+    directory = os.path.dirname(rel_path)
+    parts = directory.split("/") if directory else []
+    return {
+        "path": path,
+        "code": code,
+        "offset": offset,
+        "directory": directory,
+        # Every ancestor, so a filter on "src/components" also matches "src/components/ui".
+        "dirs": ["/".join(parts[: i + 1]) for i in range(len(parts))],
+        "extension": os.path.splitext(rel_path)[1].lstrip("."),
+        "kind": symbol_kind(rel_path, code),
+    }
+
+
+def scope_filter(directories: Sequence[str] = (), extensions: Sequence[str] = (), kinds: Sequence[str] = ()) -> Optional[models.Filter]:
+    """Builds a Qdrant filter; each non-empty argument must match (any of its values)."""
+    conditions = [
+        models.FieldCondition(key=key, match=models.MatchAny(any=list(values)))
+        for key, values in (
+            ("dirs", [d.strip("/") for d in directories]),
+            ("extension", [e.lstrip(".") for e in extensions]),
+            ("kind", kinds),
+        )
+        if values
+    ]
+    return models.Filter(must=conditions) if conditions else None
+
+
+def union_filter(filters: Sequence[Optional[models.Filter]]) -> Optional[models.Filter]:
+    """Matches points that satisfy any of `filters`; None (unscoped) if any of them is None."""
+    if not filters or any(f is None for f in filters):
+        return None
+    return filters[0] if len(filters) == 1 else models.Filter(should=list(filters))
+
+
+def chunk_id(chunk: Dict) -> str:
+    """Deterministic point id for a chunk (same file, offset and code give the same id)."""
+    digest = hashlib.sha1(chunk["code"].encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{chunk['path']}#{chunk.get('offset', 0)}#{digest}"))
+
+
+class IndexLockedError(RuntimeError):
+    """Raised when another process (usually `orchid.py serve`) has the project's index open."""
 
 
 class VectorStore:
-    def __init__(self, collection_name: str) -> None:
+    def __init__(self, collection_name: str, qdrant_path: str = config.QDRANT_PATH, state_path: str = config.STATE_PATH, embedding_model: str = config.EMBEDDING_MODEL) -> None:
         self.console = Console()
         self.collection_name = collection_name
+        self.qdrant_path = qdrant_path
+        self.embedding_model = embedding_model
+        # Index checkpoints live in the project's state dir (`Project.state_path`).
+        self.checkpoint_path = os.path.join(state_path, "index", f"{collection_name}.json")
+        # The local (embedded) Qdrant client is not safe for concurrent use.
+        self._lock = threading.Lock()
+        self._query_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._schema: Optional[Tuple[str, int]] = None  # (collection, payload schema) of the last check
         self.console.print("[bold blue]I will create a light-weight vector store for your codebase. (using Qdrant)")
         with self.console.status(
-            f"[bold cyan]Connecting to vector database (for gathering context on codebase) ({config.QDRANT_PATH})…[/bold cyan]",
+            f"[bold cyan]Connecting to vector database (for gathering context on codebase) ({qdrant_path})…[/bold cyan]",
             spinner="dots",
         ):
-            self.client = QdrantClient(path=config.QDRANT_PATH)
+            try:
+                self.client = QdrantClient(path=qdrant_path)
+            except RuntimeError as e:
+                # Embedded Qdrant locks its directory to one client per machine.
+                if "already accessed" not in str(e):
+                    raise
+                raise IndexLockedError(
+                    f"The index at {qdrant_path} is open in another process. If `orchid.py serve` is running, "
+                    "stop it first, or use `orchid.py client` (and `orchid.py client reindex`) to go through it."
+                ) from e
         
-        self.console.print(f"[dim]Your vector store & indices are ready to view at {config.QDRANT_PATH}[/dim]\n")
+        self.console.print(f"[dim]Your vector store & indices are ready to view at {qdrant_path}[/dim]\n")
+
+    def with_collection(self, collection_name: str) -> "VectorStore":
+        """
+        A handle on another collection of the same store that shares this one's
+        Qdrant client (a second client on the same directory cannot be opened).
+        Closing either handle closes the shared client.
+        """
+        other = copy.copy(self)
+        other.collection_name = collection_name
+        other.checkpoint_path = os.path.join(os.path.dirname(self.checkpoint_path), f"{collection_name}.json")
+        other._query_cache = OrderedDict()
+        other._schema = None
+        return other
 
     def collection_exists(self) -> bool:
         try:
@@ -28,82 +151,316 @@ class VectorStore:
         except Exception:  
             return False
 
-    def build_collection(self, chunks: List[Dict]) -> None: 
+    def memory_estimate(self) -> int:
+        """Approximate resident size of the collection in bytes (vectors + payloads)."""
+        try:
+            info = self.client.get_collection(self.collection_name)
+        except Exception:
+            return 0
+        points = info.points_count or 0
+        dim = info.config.params.vectors.size
+        # float32 vectors plus roughly one 1000-char chunk of payload per point.
+        return points * (dim * 4 + 1100)
+
+    def close(self) -> None:
+        with self._lock:
+            self.client.close()
+
+    # ── checkpoints ──────────────────────────────────────────
+    def _read_checkpoint(self) -> Optional[Dict]:
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    @property
+    def _done_path(self) -> str:
+        # Ids of stored chunks, one per line, appended after every batch next to the checkpoint.
+        return f"{os.path.splitext(self.checkpoint_path)[0]}.done"
+
+    def _read_done(self, checkpoint: Optional[Dict]) -> set:
+        """Ids of the chunks the checkpointed build already stored."""
+        done = set(checkpoint.get("done", [])) if checkpoint else set()  # checkpoints written before the id log
+        try:
+            with open(self._done_path, "r", encoding="utf-8") as f:
+                # A line cut short by a crash mid-append lacks its newline and is skipped.
+                done.update(line[:-1] for line in f if line.endswith("\n"))
+        except OSError:
+            pass
+        return done
+
+    def _append_done(self, ids: Iterable[str]) -> None:
+        """Durably appends the ids of a stored batch to the id log."""
+        with open(self._done_path, "a", encoding="utf-8") as f:
+            f.writelines(f"{i}\n" for i in ids)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _reset_done(self, done: Iterable[str]) -> None:
+        """Replaces the id log atomically with `done`."""
+        tmp_path = f"{self._done_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(f"{i}\n" for i in sorted(done))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._done_path)
+
+    def _write_checkpoint(self, total: int, complete: bool = False) -> None:
+        """Durably records the build's settings and progress, replacing the file atomically."""
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "collection": self.collection_name,
+                "embedding_model": self.embedding_model,
+                "payload_schema": PAYLOAD_SCHEMA,
+                "total": total,
+                "complete": complete,
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def payload_schema(self) -> int:
+        """
+        Payload schema of the existing collection: from its checkpoint, or, for
+        collections built before checkpoints recorded it, from a stored point
+        (1 when it lacks the scoped-search fields).
+        """
+        if self._schema is not None and self._schema[0] == self.collection_name:
+            return self._schema[1]
+        checkpoint = self._read_checkpoint()
+        if checkpoint is not None and "payload_schema" in checkpoint:
+            schema = checkpoint["payload_schema"]
+        else:
+            with self._lock:
+                points, _ = self.client.scroll(self.collection_name, limit=1, with_payload=True)
+            schema = PAYLOAD_SCHEMA if not points or all(f in points[0].payload for f in INDEXED_FIELDS) else 1
+        self._schema = (self.collection_name, schema)
+        return schema
+
+    def schema_current(self) -> bool:
+        """False for an existing collection whose payloads predate `PAYLOAD_SCHEMA`."""
+        return not self.collection_exists() or self.payload_schema() == PAYLOAD_SCHEMA
+
+    def is_complete(self) -> bool:
+        """
+        True when the collection exists, has the current payload schema and its
+        build ran to the end. Collections built before checkpoints existed have
+        no checkpoint file and were written in one step, so they count as
+        complete if their payloads are current.
+        """
+        if not self.collection_exists() or not self.schema_current():
+            return False
+        checkpoint = self._read_checkpoint()
+        return checkpoint is None or bool(checkpoint.get("complete"))
 
+    def _create_collection(self, dim: int) -> None:
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE),
+        )
+        with warnings.catch_warnings():
+            # Embedded Qdrant filters without indexes and warns about them; a Qdrant server uses them.
+            warnings.simplefilter("ignore", UserWarning)
+            for field in INDEXED_FIELDS:
+                self.client.create_payload_index(self.collection_name, field, models.PayloadSchemaType.KEYWORD)
+        self.console.print(
+            f"\n[dim cyan]Created collection [id: {self.collection_name}] [dim cyan]({dim}-dimensional vectors)[/dim cyan]\n"
+        )
+
+    def point_count(self) -> int:
+        return self.client.count(self.collection_name, exact=True).count
+
+    def dimension(self) -> int:
+        return self.client.get_collection(self.collection_name).config.params.vectors.size
+
+    def iter_points(self, batch_size: int = 256) -> Iterator[Tuple[List[float], Dict]]:
+        """Yields `(vector, payload)` for every point in the collection."""
+        offset = None
+        while True:
+            with self._lock:
+                points, offset = self.client.scroll(
+                    self.collection_name, limit=batch_size, offset=offset, with_vectors=True, with_payload=True,
+                )
+            for point in points:
+                yield point.vector, point.payload
+            if offset is None:
+                return
+
+    def point_ids(self, batch_size: int = 1024) -> set:
+        """Ids of all points in the collection."""
+        ids: set = set()
+        offset = None
+        while True:
+            with self._lock:
+                points, offset = self.client.scroll(
+                    self.collection_name, limit=batch_size, offset=offset, with_vectors=False, with_payload=False,
+                )
+            ids.update(str(point.id) for point in points)
+            if offset is None:
+                return ids
+
+    def _prune(self, keep: set) -> int:
+        """Deletes the points whose ids are not in `keep` (chunks that changed or disappeared)."""
+        stale = sorted(self.point_ids() - keep)
+        for start in range(0, len(stale), 1024):
+            with self._lock:
+                self.client.delete(self.collection_name, points_selector=models.PointIdsList(points=stale[start:start + 1024]), wait=True)
+        return len(stale)
+
+    def restore(self, records: Iterable[Tuple[List[float], Dict]], dim: int, batch_size: int = 256) -> int:
+        """
+        Replaces the collection with already-embedded `(vector, payload)` records
+        and checkpoints them as an unfinished build, so a following
+        `build_collection` only embeds the chunks that are still missing.
+        Returns the number of points stored.
+        """
         if self.collection_exists():
+            self.client.delete_collection(self.collection_name)
+        self._schema = None
+        self._write_checkpoint(0)
+        self._reset_done(())
+        self._create_collection(dim)
+        stored = 0
+        batch: List[models.PointStruct] = []
+        for vector, payload in records:
+            batch.append(models.PointStruct(id=chunk_id(payload), vector=vector, payload=payload))
+            if len(batch) >= batch_size:
+                self.client.upsert(collection_name=self.collection_name, points=batch, wait=True)
+                self._append_done(str(p.id) for p in batch)
+                stored += len(batch)
+                batch = []
+        if batch:
+            self.client.upsert(collection_name=self.collection_name, points=batch, wait=True)
+            self._append_done(str(p.id) for p in batch)
+            stored += len(batch)
+        self._write_checkpoint(stored)
+        return stored
+
+    def build_collection(self, chunks: List[Dict], batch_size: int = config.EMBED_BATCH_SIZE) -> None:
+        """
+        Embeds and stores `chunks` in batches, appending the stored chunk ids to
+        the checkpoint's id log after every batch. Point ids are derived from
+        the chunk, so an interrupted build resumes with the chunks that are
+        still missing; once a resumed build is done, points and logged ids of
+        chunks that are no longer in `chunks` are dropped.
+        """
+        if self.is_complete():
             self.console.print("\n[bold yellow]I already have latest knowledge of your codebase; you can use the 'run' command.[/bold yellow]")
             return
         if not chunks:
             self.console.print("\n[bold yellow]No chunks provided; skipping indexing.[/bold yellow]")
             return
 
-        self.console.print("\n[bold blue]Codebase indexing in progress[/bold blue]\n")
-
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[progress.description]{task.description}"),
-            BarColumn(bar_width=20),
-            TimeElapsedColumn(),
-            console=self.console,
-        ) as progress:
-            t_embed = progress.add_task("Embedding snippets", total=len(chunks))
-            # task_type set to RETRIEVAL but modify it
-            embeddings = genai.embed_content(
-                model=config.EMBEDDING_MODEL,
-                content=[c["code"] for c in chunks],
-                task_type="RETRIEVAL_DOCUMENT",
-            )["embedding"]
-
-            progress.update(t_embed, completed=len(chunks))
-
-        dim = len(embeddings[0])
-        self.console.print(
-            f"\n[dim cyan]Created collection [id: {self.collection_name}] [dim cyan]({dim}-dimensional vectors)[/dim cyan]\n"
-        )
-        self.client.recreate_collection(
-            collection_name=self.collection_name,
-            vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE),
-        )
+        ids = [chunk_id(chunk) for chunk in chunks]
+        checkpoint = self._read_checkpoint()
+        done: set = set()
+        resumed = False
+        if self.collection_exists():
+            if checkpoint and checkpoint.get("embedding_model") == self.embedding_model and self.schema_current():
+                done = self._read_done(checkpoint) & set(ids)
+                resumed = True
+                self.console.print(f"\n[bold blue]Resuming indexing: {len(done)}/{len(chunks)} snippets are already stored.[/bold blue]\n")
+            else:
+                if not self.schema_current():
+                    self.console.print("\n[bold yellow]The index was built by an older version without the fields scoped search needs; rebuilding it.[/bold yellow]")
+                self.client.delete_collection(self.collection_name)
+        self._schema = None
+        # Written before the collection exists, so a crash from here on is seen as incomplete.
+        self._write_checkpoint(len(chunks))
+        if not resumed:
+            self._reset_done(())
 
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[progress.description]{task.description}"),
-            BarColumn(bar_width=20),
-            TimeElapsedColumn(),
-            console=self.console,
-        ) as progress:
-            t_upsert = progress.add_task("Storing embeddings", total=len(chunks))
-            points = [
-                models.PointStruct(
-                    id=str(uuid.uuid4()), vector=emb, payload=chunk
-                )
-                for emb, chunk in zip(embeddings, chunks, strict=True)
-            ]
-            self.client.upsert(
-                collection_name=self.collection_name,
-                points=points,
-                wait=True,
+        pending = [(i, c) for i, c in zip(ids, chunks) if i not in done]
+        self.console.print("\n[bold blue]Codebase indexing in progress[/bold blue]\n")
+        try:
+            with Progress(
+                SpinnerColumn(),
+                TextColumn("[progress.description]{task.description}"),
+                BarColumn(bar_width=20),
+                TimeElapsedColumn(),
+                console=self.console,
+            ) as progress:
+                t_index = progress.add_task("Embedding & storing snippets", total=len(chunks), completed=len(done))
+                for start in range(0, len(pending), batch_size):
+                    batch = pending[start:start + batch_size]
+                    # Indexing yields quota to interactive requests.
+                    with priority(BACKGROUND):
+                        embeddings = embed_content([c["code"] for _, c in batch], task_type="RETRIEVAL_DOCUMENT", model=self.embedding_model)
+                    if not self.collection_exists():
+                        self._create_collection(len(embeddings[0]))
+                    self.client.upsert(
+                        collection_name=self.collection_name,
+                        points=[
+                            models.PointStruct(id=point_id, vector=emb, payload=chunk)
+                            for emb, (point_id, chunk) in zip(embeddings, batch, strict=True)
+                        ],
+                        wait=True,
+                    )
+                    self._append_done(point_id for point_id, _ in batch)
+                    done.update(point_id for point_id, _ in batch)
+                    progress.update(t_index, completed=len(done))
+        except BaseException:
+            self.console.print(
+                f"\n[bold yellow]Indexing stopped after {len(done)}/{len(chunks)} snippets. "
+                "Run `python agent/orchid.py init` again to resume.[/bold yellow]\n"
             )
-            progress.update(t_upsert, completed=len(chunks))
+            raise
 
+        if resumed:
+            pruned = self._prune(set(ids))
+            if pruned:
+                self.console.print(f"[dim]Removed {pruned} stale snippets of changed or deleted files.[/dim]")
+            self._reset_done(done)
+        self._write_checkpoint(len(chunks), complete=True)
         self.console.print(
             f"\n[dim cyan]Indexed {len(chunks)} snippets into [id: {self.collection_name}].[/dim cyan]\n"
         )
 
-    def search(self, query: str, k: int = 15) -> List[Dict]:
+    def embed_query(self, query: str) -> List[float]:
+        """Query embedding, memoized for the most recent 256 queries (so `search` can be timed warm)."""
+        with self._lock:
+            if query in self._query_cache:
+                self._query_cache.move_to_end(query)
+                return self._query_cache[query]
+        query_vec = embed_content(query, task_type="RETRIEVAL_QUERY", model=self.embedding_model)
+        with self._lock:
+            self._query_cache[query] = query_vec
+            if len(self._query_cache) > 256:
+                self._query_cache.popitem(last=False)
+        return query_vec
+
+    def search(self, query: str, k: int = 15, rerank: bool | None = None, query_filter: Optional[models.Filter] = None) -> List[Dict]:
+        """
+        Top-k chunks for `query`. `query_filter` (see `scope_filter`) restricts
+        the scan to matching payloads, e.g. one directory or file extension.
+        """
+        rerank = config.RERANK if rerank is None else rerank
         try:
-            query_vec = genai.embed_content(
-                model=config.EMBEDDING_MODEL,
-                content=query,
-                task_type="RETRIEVAL_QUERY",
-            )["embedding"]
-
-            res = self.client.search(
-                collection_name=self.collection_name,
-                query_vector=query_vec,
-                limit=k,
+            query_vec = self.embed_query(query)
+
+            with self._lock:
+                res = self.client.query_points(
+                    collection_name=self.collection_name,
+                    query=query_vec,
+                    query_filter=query_filter,
+                    limit=k * config.RERANK_OVERFETCH if rerank else k,
+                    with_vectors=rerank,
+                ).points
+            if not rerank:
+                return [hit.payload for hit in res]
+
+            payloads = [hit.payload for hit in res]
+            picked = mmr(
+                query_vec,
+                [hit.vector for hit in res],
+                k,
+                boosts=lexical_boosts(query, payloads),
+                groups=[p["path"] for p in payloads],
             )
-            return [hit.payload for hit in res]
+            return [payloads[i] for i in picked]
         except Exception as exc: 
             self.console.print(f"[red]Search error: {exc}[/red]")
             return []
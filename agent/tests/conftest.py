@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the agent's modules the same way orchid.py does (`from src import ...`).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
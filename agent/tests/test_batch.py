@@ -0,0 +1,61 @@
+import json
+from types import SimpleNamespace
+import pytest
+from src.batch import BatchRunner, load_tasks
+from src.ingest import IngestRules
+from src.project import Project
+
+
+def write_tasks(path, *records):
+    path.write_text("\n".join(json.dumps(r) for r in records) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_reads_text_ids_and_mentions(tmp_path):
+    path = write_tasks(
+        tmp_path / "tasks.jsonl",
+        {"request_id": "r-1", "title": "Add login", "body": "Use @src/auth.ts and @src/auth.ts"},
+        {"prompt": "Fix the footer", "files": ["src/footer.tsx"]},
+    )
+
+    tasks = load_tasks(path)
+
+    assert tasks[0] == {"id": "r-1", "task": "Add login\n\nUse @src/auth.ts and @src/auth.ts", "files": ["src/auth.ts"]}
+    assert tasks[1] == {"id": "2", "task": "Fix the footer", "files": ["src/footer.tsx"]}
+
+
+def test_unsafe_ids_are_sanitised_without_collisions(tmp_path):
+    path = write_tasks(tmp_path / "tasks.jsonl", {"id": "a/b", "task": "one"}, {"id": "a_b", "task": "two"})
+
+    first, second = load_tasks(path)
+
+    assert first["id"].startswith("a_b-") and len(first["id"]) == len("a_b-") + 8
+    assert second["id"] == "a_b"
+
+
+def test_duplicate_ids_are_rejected(tmp_path):
+    path = write_tasks(tmp_path / "tasks.jsonl", {"id": "x", "task": "one"}, {"id": "x", "task": "two"})
+    with pytest.raises(ValueError, match="duplicate task id 'x' \\(first used on line 1\\)"):
+        load_tasks(path)
+
+
+def test_task_without_text_is_rejected(tmp_path):
+    path = write_tasks(tmp_path / "tasks.jsonl", {"id": "x"})
+    with pytest.raises(ValueError, match="task has no text"):
+        load_tasks(path)
+
+
+def test_output_defaults_to_the_state_dir_and_is_never_indexed(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src/a.ts").write_text("export {}\n", encoding="utf-8")
+    agent = SimpleNamespace(project=Project(str(tmp_path)))
+
+    runner = BatchRunner(agent)
+    custom = BatchRunner(agent, str(tmp_path / "reports"))
+    (tmp_path / "reports/t1.plan.json").write_text("{}", encoding="utf-8")
+    (tmp_path / "orchid_batch").mkdir()
+    (tmp_path / "orchid_batch/t0.plan.json").write_text("{}", encoding="utf-8")
+
+    assert runner.out_dir == str(tmp_path / ".orchid" / "batch")
+    assert custom.worktree_dir == str(tmp_path / ".orchid" / "worktrees")
+    assert IngestRules(str(tmp_path)).discover() == [str(tmp_path / "src/a.ts")]
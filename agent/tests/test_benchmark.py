@@ -0,0 +1,42 @@
+import json
+import pytest
+from src.benchmark import load_queries, score
+from src.rate_limit import estimate_tokens
+
+ROOT = "/project"
+
+
+def results(*paths):
+    return [{"path": f"{ROOT}/{path}", "code": f"// {path}\nexport function {path.split('/')[-1].split('.')[0]}() {{}}"} for path in paths]
+
+
+def test_recall_and_reciprocal_rank_of_a_ranking():
+    ranking = results("src/a.ts", "src/b.ts", "src/c.ts", "src/b.ts", "src/d.ts")
+
+    s = score(ranking, ["src/b.ts", "src/d.ts", "src/missing.ts"], [], ROOT)
+
+    assert s["recall"] == pytest.approx(2 / 3)
+    assert s["rr"] == pytest.approx(1 / 2)
+    assert s["symbol_recall"] is None
+    assert s["tokens"] == sum(estimate_tokens(r["code"]) for r in ranking)
+
+
+def test_first_rank_hit_and_complete_miss():
+    assert score(results("src/a.ts", "src/b.ts"), ["src/a.ts"], [], ROOT)["rr"] == 1.0
+    miss = score(results("src/a.ts", "src/b.ts"), ["src/z.ts"], [], ROOT)
+    assert miss["recall"] == 0.0 and miss["rr"] == 0.0
+
+
+def test_symbol_recall_counts_symbols_found_in_the_code():
+    s = score(results("src/a.ts", "src/b.ts"), ["src/a.ts"], ["a", "b", "useMissing"], ROOT)
+    assert s["symbol_recall"] == pytest.approx(2 / 3)
+
+
+def test_load_queries_requires_query_and_expected(tmp_path):
+    path = tmp_path / "queries.json"
+    path.write_text(json.dumps({"queries": [{"query": "q", "expected": ["src/a.ts"]}]}), encoding="utf-8")
+    assert load_queries(str(path)) == [{"query": "q", "expected": ["src/a.ts"]}]
+
+    path.write_text(json.dumps([{"query": "q", "expected": []}]), encoding="utf-8")
+    with pytest.raises(ValueError, match="query #1"):
+        load_queries(str(path))
@@ -0,0 +1,117 @@
+import json
+import sys
+import time
+import pytest
+from src.dependencies import BackgroundInstall, DependencyInstaller, merge_dependency_sections, package_name
+
+
+@pytest.mark.parametrize("spec, name", [
+    ("react", "react"),
+    ("react@^18.2.0", "react"),
+    ("@scope/pkg", "@scope/pkg"),
+    ("@scope/pkg@1.0.0", "@scope/pkg"),
+    ("  drizzle-orm@latest ", "drizzle-orm"),
+])
+def test_package_name_strips_versions(spec, name):
+    assert package_name(spec) == name
+
+
+def write_json(path, data):
+    path.write_text(json.dumps(data), encoding="utf-8")
+
+
+def test_missing_skips_declared_and_locked_packages(tmp_path):
+    write_json(tmp_path / "package.json", {"dependencies": {"react": "^18", "zod": "^3"}, "devDependencies": {"@types/node": "^20"}})
+    write_json(tmp_path / "package-lock.json", {"packages": {"node_modules/react": {}, "node_modules/@types/node": {}}})
+    installer = DependencyInstaller(str(tmp_path), log_dir=str(tmp_path / "logs"))
+
+    assert installer.manager == "npm"
+    # zod is declared but not in the lockfile, so it still needs installing; duplicates are dropped.
+    assert installer.missing(["react@18", "@types/node", "zod", "drizzle-orm", "drizzle-orm@1"]) == ["zod", "drizzle-orm"]
+
+
+def test_missing_reads_yarn_and_pnpm_lockfiles(tmp_path):
+    write_json(tmp_path / "package.json", {"dependencies": {"react": "^18", "zod": "^3"}})
+    (tmp_path / "yarn.lock").write_text('"react@^18":\n  version "18.2.0"\n', encoding="utf-8")
+    assert DependencyInstaller(str(tmp_path)).missing(["react", "zod"]) == ["zod"]
+
+    (tmp_path / "yarn.lock").unlink()
+    (tmp_path / "pnpm-lock.yaml").write_text("dependencies:\n  zod:\n    version: 3.0.0\n", encoding="utf-8")
+    installer = DependencyInstaller(str(tmp_path))
+    assert installer.manager == "pnpm"
+    assert installer.missing(["react", "zod"]) == ["react"]
+
+
+def fake_install(tmp_path, script):
+    manifests = [str(tmp_path / "package.json"), str(tmp_path / "package-lock.json")]
+    return BackgroundInstall(["x"], [sys.executable, "-c", script], str(tmp_path), str(tmp_path / "install.log"), manifests)
+
+
+REWRITE = (
+    "import time\n"
+    "open('package.json', 'w').write('{\"dependencies\": {\"x\": \"1\"}}')\n"
+    "open('package-lock.json', 'w').write('lock')\n"
+)
+
+
+def test_cancel_stops_the_install_and_restores_manifests(tmp_path):
+    write_json(tmp_path / "package.json", {})
+    install = fake_install(tmp_path, REWRITE + "time.sleep(30)\n")
+    deadline = time.monotonic() + 5
+    while not (tmp_path / "package-lock.json").exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    install.cancel()
+
+    assert install.done()
+    assert json.loads((tmp_path / "package.json").read_text(encoding="utf-8")) == {}
+    assert not (tmp_path / "package-lock.json").exists()
+
+
+def test_take_manifest_changes_hands_over_the_new_content(tmp_path):
+    write_json(tmp_path / "package.json", {})
+    install = fake_install(tmp_path, REWRITE)
+    assert install.wait() == 0
+
+    changes = install.take_manifest_changes()
+
+    assert changes == {"package.json": '{"dependencies": {"x": "1"}}', "package-lock.json": "lock"}
+    # The files are back in their pre-install state until the journal writes the changes.
+    assert json.loads((tmp_path / "package.json").read_text(encoding="utf-8")) == {}
+    assert not (tmp_path / "package-lock.json").exists()
+
+
+def test_merge_keeps_the_plan_edits_and_adds_installed_dependencies():
+    original = json.dumps({"name": "app", "dependencies": {"react": "^18", "left-pad": "1"}})
+    installed = json.dumps({"name": "app", "dependencies": {"react": "^18", "drizzle-orm": "^0.30"}, "devDependencies": {"drizzle-kit": "^0.20"}})
+    plan = '{\n    "name": "app",\n    "scripts": {"db:push": "drizzle-kit push"},\n    "dependencies": {"react": "^18", "left-pad": "1", "zod": "^3"}\n}\n'
+
+    merged = merge_dependency_sections(plan, installed, original)
+
+    assert json.loads(merged) == {
+        "name": "app",
+        "scripts": {"db:push": "drizzle-kit push"},
+        "dependencies": {"react": "^18", "zod": "^3", "drizzle-orm": "^0.30"},
+        "devDependencies": {"drizzle-kit": "^0.20"},
+    }
+    assert merged.startswith('{\n    "name"')
+
+
+def test_take_manifest_changes_merges_into_the_staged_package_json(tmp_path):
+    write_json(tmp_path / "package.json", {})
+    install = fake_install(tmp_path, REWRITE)
+    assert install.wait() == 0
+    staged = {"package.json": '{"scripts": {"dev": "next dev"}}', "package-lock.json": "plan lock"}
+
+    changes = install.take_manifest_changes(staged)
+
+    assert json.loads(changes["package.json"]) == {"scripts": {"dev": "next dev"}, "dependencies": {"x": "1"}}
+    assert "package-lock.json" not in changes and install.conflicts == ["package-lock.json"]
+
+
+def test_unparsable_plan_package_json_is_a_conflict(tmp_path):
+    write_json(tmp_path / "package.json", {})
+    install = fake_install(tmp_path, REWRITE)
+    install.wait()
+    changes = install.take_manifest_changes({"package.json": "not json"})
+    assert "package.json" not in changes and install.conflicts == ["package.json"]
@@ -0,0 +1,72 @@
+import os
+from src.file_context import FileContextLoader, head_tail
+
+
+def write(root, rel_path, data):
+    path = root / rel_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(data, bytes):
+        path.write_bytes(data)
+    else:
+        path.write_text(data, encoding="utf-8")
+
+
+def make_project(tmp_path):
+    for name in ("a", "b", "c"):
+        write(tmp_path, f"src/ui/{name}.tsx", f"export const {name} = 1\n")
+    write(tmp_path, "src/app/api/route.ts", "export function GET() {}\n")
+    write(tmp_path, "node_modules/pkg/index.js", "ignored\n")
+    return FileContextLoader(str(tmp_path))
+
+
+def test_expand_keeps_plain_paths_and_expands_dirs_and_globs(tmp_path):
+    loader = make_project(tmp_path)
+
+    expanded = loader.expand(["src/app/api/route.ts,", "src/ui/", "src/**/*.ts", "src/ui/a.tsx"])
+
+    assert expanded == ["src/app/api/route.ts", "src/ui/a.tsx", "src/ui/b.tsx", "src/ui/c.tsx"]
+
+
+def test_expand_caps_each_mention_at_max_files(tmp_path):
+    loader = make_project(tmp_path)
+    assert loader.expand(["src/ui"], max_files=2) == ["src/ui/a.tsx", "src/ui/b.tsx"]
+    assert loader.expand(["src/**/*.tsx", "src/app/"], max_files=1) == ["src/ui/a.tsx", "src/app/api/route.ts"]
+    assert loader.expand(["lib/*.ts"]) == []
+
+
+def test_scopes_from_dir_and_glob_mentions(tmp_path):
+    loader = make_project(tmp_path)
+    assert loader.scopes(["src/ui/", "src/app/api/**/*.ts", "src/ui/a.tsx"]) == [
+        {"directories": ["src/ui"], "extensions": []},
+        {"directories": ["src/app/api"], "extensions": ["ts"]},
+    ]
+
+
+def test_load_caches_by_mtime_and_skips_binary(tmp_path):
+    loader = make_project(tmp_path)
+    write(tmp_path, "public/logo.png", b"\x89PNG\0\0data")
+
+    first = loader.load("src/ui/a.tsx")
+    assert loader.load("src/ui/a.tsx") is first
+    assert (loader.hits, loader.misses) == (1, 1)
+
+    path = tmp_path / "src/ui/a.tsx"
+    path.write_text("export const a = 2\n", encoding="utf-8")
+    os.utime(path, (first["mtime"] + 10, first["mtime"] + 10))
+    assert loader.load("src/ui/a.tsx")["text"] == "export const a = 2\n"
+
+    assert loader.load("public/logo.png") is None
+    assert loader.load("missing.ts") is None
+
+
+def test_large_files_are_truncated(tmp_path):
+    loader = FileContextLoader(str(tmp_path), max_file_chars=400)
+    source = "import x from 'y'\nexport function big() {}\n" + "const filler = 1\n" * 100
+    write(tmp_path, "big.ts", source)
+    write(tmp_path, "big.txt", "line\n" * 200)
+
+    ts = loader.load("big.ts")
+    assert ts["truncated"] and ts["text"].startswith("// Outline (file truncated):\nimport x from 'y'\nexport function big() {}")
+    txt = loader.load("big.txt")
+    assert txt["truncated"] and txt["text"] == head_tail("line\n" * 200, 400)
+    assert "lines omitted" in txt["text"]
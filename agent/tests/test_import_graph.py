@@ -0,0 +1,64 @@
+import json
+from src.import_graph import ImportGraph, parse_imports
+from src.project import Project
+
+
+def write(root, rel_path, text=""):
+    path = root / rel_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def test_parse_imports_finds_static_dynamic_and_side_effect_imports():
+    source = (
+        'import React from "react";\n'
+        "import {\n  a,\n  b,\n} from './a';\n"
+        'import "./styles.css";\n'
+        "export * from './b';\n"
+        "const c = await import('./c');\n"
+        "const d = require('./d');\n"
+    )
+    assert parse_imports(source) == ["react", "./a", "./b", "./styles.css", "./c", "./d"]
+
+
+def test_tsconfig_paths_are_resolved(tmp_path):
+    write(tmp_path, "tsconfig.json", '{\n  // comment\n  "compilerOptions": {"baseUrl": ".", "paths": {"~/*": ["./app/*"],}}\n}')
+    write(tmp_path, "app/lib/utils.ts")
+    write(tmp_path, "app/ui/index.tsx")
+    graph = ImportGraph(Project(str(tmp_path)))
+
+    assert graph.aliases == [("~/", "app/")]
+    assert graph.resolve("~/lib/utils", "app/page.tsx") == "app/lib/utils.ts"
+    assert graph.resolve("~/ui", "app/page.tsx") == "app/ui/index.tsx"
+    assert graph.resolve("react", "app/page.tsx") is None
+
+
+def test_components_json_aliases_at_to_src(tmp_path):
+    write(tmp_path, "components.json", json.dumps({"style": "default"}))
+    write(tmp_path, "src/components/button.tsx")
+    graph = ImportGraph(Project(str(tmp_path)))
+
+    assert graph.resolve("@/components/button", "src/app.tsx") == "src/components/button.tsx"
+    assert graph.resolve("../components/button", "src/pages/home.tsx") == "src/components/button.tsx"
+
+
+def test_imports_and_importers_update_and_persist(tmp_path):
+    write(tmp_path, "components.json", "{}")
+    write(tmp_path, "src/button.tsx", "export const Button = () => null")
+    write(tmp_path, "src/app.tsx", "import { Button } from '@/button'\nimport React from 'react'")
+    write(tmp_path, "src/page.tsx", "import { Button } from './button'")
+    project = Project(str(tmp_path))
+    graph = ImportGraph(project)
+    files = [str(tmp_path / p) for p in ("src/button.tsx", "src/app.tsx", "src/page.tsx")]
+
+    assert graph.update(files) == 3
+    assert graph.imports_of("src/app.tsx") == ["src/button.tsx"]
+    assert graph.importers_of("src/button.tsx") == ["src/app.tsx", "src/page.tsx"]
+    assert graph.neighbors(["src/app.tsx"]) == ["src/button.tsx"]
+
+    reloaded = ImportGraph(project)
+    assert reloaded.update(files) == 0
+    assert reloaded.importers_of("src/button.tsx") == ["src/app.tsx", "src/page.tsx"]
+
+    assert reloaded.update(files[:2]) == 1
+    assert reloaded.importers_of("src/button.tsx") == ["src/app.tsx"]
@@ -0,0 +1,78 @@
+import pytest
+from src import index_pool
+from src.index_pool import IndexPool
+from src.project import Project
+
+
+class FakeStore:
+    def __init__(self, collection_name, qdrant_path, state_path):
+        self.collection_name = collection_name
+        self.closed = False
+
+    def memory_estimate(self):
+        return 100
+
+    def with_collection(self, collection_name):
+        other = FakeStore(collection_name, None, None)
+        other.shared_with = self
+        return other
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fake_store(monkeypatch):
+    monkeypatch.setattr(index_pool, "VectorStore", FakeStore)
+
+
+def projects(tmp_path, n):
+    return [Project(str(tmp_path / f"p{i}")) for i in range(n)]
+
+
+def test_get_reuses_open_stores_and_evicts_the_least_recently_used(tmp_path):
+    evicted = []
+    pool = IndexPool(max_open=2, on_evict=evicted.append)
+    a, b, c = projects(tmp_path, 3)
+    store_a = pool.get(a, "ca")
+    pool.get(b, "cb")
+    assert pool.get(a, "ca") is store_a
+
+    pool.get(c, "cc")
+
+    assert evicted == [b]
+    assert [s["project"] for s in pool.stats()] == [a.root, c.root]
+
+
+def test_leased_stores_are_not_evicted(tmp_path):
+    pool = IndexPool(max_open=1)
+    a, b = projects(tmp_path, 2)
+    store_a = pool.get(a, "ca")
+    with pool.lease(a):
+        pool.get(b, "cb")
+        assert not store_a.closed and len(pool.stats()) == 2
+        assert next(s for s in pool.stats() if s["project"] == a.root)["leases"] == 1
+    pool.get(b, "cb")
+    assert store_a.closed and len(pool.stats()) == 1
+
+
+def test_byte_budget_evicts_idle_stores(tmp_path):
+    pool = IndexPool(max_open=10, max_bytes=250)
+    a, b, c = projects(tmp_path, 3)
+    for project in (a, b, c):
+        pool.get(project, "c")
+    assert pool.total_bytes() == 200 and [s["project"] for s in pool.stats()] == [b.root, c.root]
+
+
+def test_new_collection_gets_a_new_handle_and_leaves_the_leased_one_alone(tmp_path):
+    pool = IndexPool()
+    (a,) = projects(tmp_path, 1)
+    old = pool.get(a, "v1")
+    with pool.lease(a):
+        new = pool.get(a, "v2")
+        assert old.collection_name == "v1" and not old.closed
+        assert new.collection_name == "v2" and new.shared_with is old
+    assert pool.get(a, "v2") is new
+
+    pool.close_all()
+    assert new.closed and pool.stats() == []
@@ -0,0 +1,103 @@
+import json
+import os
+from src import ingest
+from src.ingest import IngestRules, chunk_text, looks_generated
+
+
+def reassembled(chunks, text):
+    """Chunks cover the text in order, each at its own offset."""
+    for offset, chunk in chunks:
+        assert text[offset:offset + len(chunk)] == chunk
+    return "".join(chunk for _, chunk in chunks)
+
+
+def test_plain_files_use_fixed_windows():
+    text = "x" * 250
+    chunks = chunk_text("src/a.ts", text, max_chars=100)
+    assert [(offset, len(chunk)) for offset, chunk in chunks] == [(0, 100), (100, 100), (200, 50)]
+
+
+def test_json_is_split_by_top_level_key():
+    data = {"name": "app", "scripts": {"dev": "next dev", "build": "next build"}, "dependencies": {"react": "^18"}}
+    text = json.dumps(data, indent=2)
+    chunks = chunk_text("package.json", text, max_chars=80)
+
+    assert reassembled(chunks, text) == text
+    assert all(len(chunk) <= 80 for _, chunk in chunks)
+    assert [chunk.lstrip().split(":")[0] for _, chunk in chunks[1:]] == ['"scripts"', '"dependencies"']
+
+
+def test_sql_is_split_by_statement_and_breakpoint():
+    statements = [
+        "CREATE TABLE users (id serial primary key, email text not null);\n",
+        "--> statement-breakpoint\n",
+        "CREATE TABLE posts (id serial primary key, user_id integer references users);\n",
+    ]
+    text = "".join(statements)
+    chunks = chunk_text("drizzle/0001.sql", text, max_chars=90)
+    assert [chunk for _, chunk in chunks] == [statements[0] + statements[1], statements[2]]
+
+
+def test_markdown_headings_inside_fences_do_not_split():
+    intro = "# Setup\n" + "Install the app.\n" * 3
+    code = "## Usage\n```sh\n# not a heading\nnpm run dev\n```\n"
+    text = intro + code
+    chunks = chunk_text("README.md", text, max_chars=max(len(intro), len(code)) + 5)
+    assert [chunk for _, chunk in chunks] == [intro, code]
+
+
+def test_css_rules_are_merged_until_the_limit():
+    rule = ".a { color: red; }\n"
+    text = rule * 6
+    chunks = chunk_text("src/styles.css", text, max_chars=len(rule) * 2 + 1)
+    assert reassembled(chunks, text) == text
+    assert all(len(chunk) <= len(rule) * 2 + 1 for _, chunk in chunks)
+    assert len(chunks) == 3
+
+
+def test_looks_generated():
+    assert looks_generated("// @generated by prisma\nexport {}")
+    assert looks_generated("var a=1;" * 1_000)
+    assert not looks_generated("export const a = 1\n" * 100)
+
+
+def write(root, rel_path, text):
+    path = root / rel_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def test_rules_exclude_oversized_and_generated_files(tmp_path):
+    write(tmp_path, "src/app.tsx", "export default function App() {}\n")
+    write(tmp_path, "src/types.d.ts", "declare const x: number\n")
+    write(tmp_path, "src/big.ts", "const x = 1\n" * 200)
+    write(tmp_path, "src/gen.ts", "// This file is auto-generated\nexport {}\n")
+    write(tmp_path, "src/legacy/old.ts", "export {}\n")
+    write(tmp_path, "node_modules/pkg/index.js", "module.exports = 1\n")
+    write(tmp_path, "logo.svg", "<svg/>")
+    write(tmp_path, ".orchidignore", "# comment\nsrc/legacy/\n")
+
+    rules = IngestRules(str(tmp_path), max_bytes=1_000)
+
+    assert rules.discover() == [str(tmp_path / "src/app.tsx")]
+    assert rules.skipped == {"excluded": ["src/types.d.ts", "src/legacy/old.ts"], "too large": ["src/big.ts"], "generated": ["src/gen.ts"]}
+
+
+def test_generated_verdicts_are_cached_by_size_and_mtime(tmp_path, monkeypatch):
+    write(tmp_path, "src/a.ts", "export const a = 1\n")
+    write(tmp_path, "src/b.ts", "export const b = 1\n")
+    cache_path = str(tmp_path / ".orchid/ingest_cache.json")
+    assert len(IngestRules(str(tmp_path), cache_path=cache_path).discover()) == 2
+
+    reads = []
+    original = ingest.looks_generated
+    monkeypatch.setattr(ingest, "looks_generated", lambda text: reads.append(text) or original(text))
+    assert len(IngestRules(str(tmp_path), cache_path=cache_path).discover()) == 2
+    assert reads == []
+
+    path = tmp_path / "src/b.ts"
+    path.write_text("// @generated\nexport const b = 2\n", encoding="utf-8")
+    os.utime(path, (1, 1))
+    rules = IngestRules(str(tmp_path), cache_path=cache_path)
+    assert rules.discover() == [str(tmp_path / "src/a.ts")]
+    assert reads == ["// @generated\nexport const b = 2\n"]
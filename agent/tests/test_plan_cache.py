@@ -0,0 +1,85 @@
+import json
+import os
+import pytest
+from src import plan_cache
+from src.plan_cache import PlanCache
+from src.project import Project
+
+PLAN = {"plan": [{"path": "src/app.tsx", "action": "modify"}, {"path": "src/new.tsx", "action": "create"}]}
+
+
+@pytest.fixture
+def project(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src/app.tsx").write_text("v1", encoding="utf-8")
+    return Project(str(tmp_path))
+
+
+@pytest.fixture(autouse=True)
+def fake_embedding(monkeypatch):
+    calls = []
+
+    def embed(text, task_type=None):
+        calls.append(text)
+        return [1.0, 0.0]
+
+    monkeypatch.setattr(plan_cache, "embed_content", embed)
+    return calls
+
+
+def stored(project, task="add a button", db_type="supabase", embedding=(1.0, 0.0), threshold=0.9):
+    cache = PlanCache(project, threshold=threshold)
+    cache.store(cache.prepare(task, db_type, PLAN, user_files=["src/app.tsx"], embedding=embedding))
+    return cache
+
+
+def test_prepare_takes_digests_before_apply(project):
+    entry = PlanCache(project).prepare("t", "none", PLAN)
+    assert set(entry["files"]) == {"src/app.tsx", "src/new.tsx"}
+    assert entry["files"]["src/new.tsx"] is None
+    assert entry["embedding"] is None
+
+
+def test_lookup_hits_similar_task_with_unchanged_files(project):
+    cache = stored(project)
+
+    hit = cache.lookup("add a blue button", "supabase", [0.99, 0.1])
+
+    assert hit["plan"] == PLAN and hit["similarity"] > 0.99
+    # Persisted across instances.
+    assert PlanCache(project, threshold=0.9).lookup("x", "supabase", [1.0, 0.0]) is not None
+
+
+def test_lookup_misses_below_threshold_or_other_db_type(project):
+    cache = stored(project)
+    assert cache.lookup("x", "supabase", [0.5, 0.5]) is None
+    assert cache.lookup("x", "firebase", [1.0, 0.0]) is None
+    assert cache.has_entries("supabase") and not cache.has_entries("firebase")
+
+
+def test_lookup_misses_once_the_plan_was_applied(project):
+    cache = stored(project)
+    new_file = os.path.join(project.src_path, "new.tsx")
+    open(new_file, "w").close()
+    assert cache.lookup("x", "supabase", [1.0, 0.0]) is None
+
+    # After an undo the files are back in their pre-apply state.
+    os.remove(new_file)
+    assert cache.lookup("x", "supabase", [1.0, 0.0]) is not None
+
+
+def test_store_replaces_same_task_embeds_lazily_and_trims(project, fake_embedding):
+    cache = PlanCache(project, max_entries=2)
+    for task in ("a", "b", "a", "c"):
+        cache.store(cache.prepare(task, "none", PLAN))
+
+    assert fake_embedding == ["a", "b", "a", "c"]
+    with open(cache.path, encoding="utf-8") as f:
+        assert [e["task"] for e in json.load(f)["entries"]] == ["a", "c"]
+
+
+def test_discard_removes_the_entry(project):
+    cache = stored(project)
+    cache.discard("add a button", "supabase")
+    assert not cache.has_entries("supabase")
+    assert not PlanCache(project).has_entries("supabase")
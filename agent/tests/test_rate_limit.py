@@ -0,0 +1,83 @@
+import threading
+import time
+import pytest
+from src.rate_limit import BACKGROUND, INTERACTIVE, RateLimiter, TokenBucket, estimate_tokens, is_rate_limited, priority
+
+
+def test_bucket_delay_take_and_refill():
+    bucket = TokenBucket(60)  # one unit per second
+    now = bucket.updated
+
+    assert bucket.delay(60, now) == 0
+    bucket.take(60)
+    assert bucket.delay(1, now) == pytest.approx(1.0)
+    assert bucket.delay(1, now + 0.5) == pytest.approx(0.5)
+    # Requests larger than the bucket wait for a full bucket, not forever.
+    assert bucket.delay(1_000, now + 0.5) == pytest.approx(59.5)
+    assert bucket.delay(1, now + 120) == 0 and bucket.level == bucket.capacity
+
+
+def test_reserve_keeps_headroom():
+    bucket = TokenBucket(60)
+    assert bucket.delay(1, bucket.updated, reserve=30) == 0
+    bucket.take(40)
+    assert bucket.delay(1, bucket.updated, reserve=30) == pytest.approx(11.0)
+
+
+def test_rate_limited_halves_the_rate_and_success_wins_it_back():
+    limiter = RateLimiter({"default": (60, 60_000)})
+    limiter.acquire("models/gemini-x")
+
+    limiter.record_rate_limited("gemini-x")
+    stats = limiter.stats()["gemini-x"]
+    assert (stats["rpm"], stats["tpm"], stats["throttled"]) == (30.0, 30_000, 1)
+
+    limiter.record_success("gemini-x")
+    assert limiter.stats()["gemini-x"]["rpm"] == 33.0
+
+
+def test_interactive_requests_are_served_before_queued_background_work():
+    limiter = RateLimiter({"default": (600, 1_000_000)}, background_share=1.0)
+    limiter.acquire("m")
+    limiter.record_rate_limited("m")  # empty bucket, one request per 0.2s
+    order = []
+
+    def run(name, level=None):
+        limiter.acquire("m", level=level)
+        order.append(name)
+
+    background = threading.Thread(target=run, args=("background", BACKGROUND))
+    background.start()
+    time.sleep(0.05)
+    with priority(INTERACTIVE):
+        run("interactive")
+    background.join(timeout=5)
+
+    assert order == ["interactive", "background"]
+
+
+def test_background_share_leaves_room_for_interactive():
+    limiter = RateLimiter({"default": (600, 1_000_000)}, background_share=0.5)
+    for _ in range(300):
+        limiter.acquire("m", level=BACKGROUND)
+    # Half the bucket is reserved: interactive calls still get through at once,
+    # further background calls wait for the refill.
+    assert limiter.acquire("m", level=INTERACTIVE) < 0.05
+    assert limiter.acquire("m", level=BACKGROUND) > 0.05
+    assert limiter.stats()["m"]["granted"] == 302
+
+
+def test_estimate_tokens_and_rate_limit_detection():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("x" * 400) == 101
+
+    class ResourceExhausted(Exception):
+        pass
+
+    class Response:
+        status_code = 429
+
+    http_error = Exception()
+    http_error.response = Response()
+    assert is_rate_limited(ResourceExhausted()) and is_rate_limited(http_error)
+    assert not is_rate_limited(ValueError())
@@ -0,0 +1,44 @@
+import numpy as np
+from src.rerank import lexical_boosts, mmr
+
+
+QUERY = [1.0, 0.0, 0.0]
+# Two near-duplicates of the query, one slightly less relevant but different chunk.
+DOCS = [[1.0, 0.05, 0.0], [1.0, 0.06, 0.0], [0.8, 0.0, 0.6]]
+
+
+def test_pure_relevance_keeps_similarity_order():
+    assert mmr(QUERY, DOCS, k=3, lambda_=1.0, max_per_group=None) == [0, 1, 2]
+
+
+def test_diversity_skips_near_duplicates():
+    assert mmr(QUERY, DOCS, k=2, lambda_=0.5, max_per_group=None) == [0, 2]
+
+
+def test_max_per_group_caps_picks_from_one_file():
+    groups = ["a.ts", "a.ts", "b.ts"]
+    assert mmr(QUERY, DOCS, k=3, lambda_=1.0, groups=groups, max_per_group=1) == [0, 2]
+
+
+def test_boosts_lift_a_less_similar_candidate():
+    boosts = np.array([0.0, 0.0, 0.5], dtype=np.float32)
+    assert mmr(QUERY, DOCS, k=1, lambda_=1.0, boosts=boosts, max_per_group=None) == [2]
+
+
+def test_empty_input_or_zero_k():
+    assert mmr(QUERY, [], k=3) == []
+    assert mmr(QUERY, DOCS, k=0) == []
+
+
+def test_lexical_boosts_for_named_file_and_shared_terms():
+    payloads = [
+        {"path": "src/hooks/use-mobile.ts", "code": "export function useMobile() {}"},
+        {"path": "src/lib/utils.ts", "code": "const breakpoint = 768"},
+        {"path": "src/app.tsx", "code": "render()"},
+    ]
+
+    boosts = lexical_boosts("what does use-mobile.ts do with the breakpoint", payloads, path_boost=1.0, lexical_boost=1.0)
+
+    assert boosts[0] >= 1.0
+    assert 0 < boosts[1] < 1.0
+    assert boosts[2] == 0
@@ -0,0 +1,122 @@
+import threading
+import time
+from concurrent.futures import CancelledError
+import pytest
+from src.rate_limit import RateLimiter
+from src.router import ModelRouter
+
+TIERS = {"fast": "m-fast", "balanced": "m-balanced", "strong": "m-strong"}
+LIMITS = {"fast": (1_000, 1), "balanced": (10_000, 4)}
+TASK_TIERS = {"answer": "fast", "plan": "balanced", "classify_database": "balanced"}
+
+
+def make_router(**kwargs):
+    options = dict(tiers=TIERS, limits=LIMITS, task_tiers=TASK_TIERS, hedge_after=0.05, hedge_tasks=("answer",), min_samples=3, enabled=True)
+    return ModelRouter(**{**options, **kwargs})
+
+
+def test_route_picks_the_fastest_tier_that_fits_above_the_task_floor():
+    router = make_router()
+    assert router.route("answer", context_chars=500, files=1)["tier"] == "fast"
+    assert router.route("answer", context_chars=5_000)["tier"] == "balanced"
+    assert router.route("answer", context_chars=50_000)["tier"] == "strong"
+    assert router.route("plan", context_chars=10)["tier"] == "balanced"
+    assert router.route("answer", files=9)["tier"] == "strong"
+    assert router.model_for("classify_database") == "m-balanced"
+
+
+def test_at_least_keeps_a_session_on_its_tier():
+    router = make_router()
+    assert router.route("answer", context_chars=10, at_least="balanced")["tier"] == "balanced"
+    assert router.route("answer", context_chars=10, at_least="unknown")["tier"] == "fast"
+
+
+def test_fallback_is_the_next_faster_tier_and_only_for_hedged_tasks():
+    router = make_router()
+    assert router.route("answer", context_chars=10)["fallback"] is None
+    assert router.route("answer", context_chars=50_000)["fallback"] == "m-balanced"
+    assert router.route("answer", context_chars=5_000)["fallback"] == "m-fast"
+    # Plans are escalated because their context is too big for a faster tier, so they are not hedged there.
+    assert router.route("plan", context_chars=50_000)["fallback"] is None
+    assert make_router(hedge_after=0).route("answer", context_chars=50_000)["fallback"] is None
+
+
+def test_routing_disabled_uses_the_strongest_tier():
+    assert make_router(enabled=False).route("answer")["tier"] == "strong"
+
+
+class FakeClient:
+    """Answers after a per-model delay; a cancelled request raises like a withdrawn rate-limit wait."""
+
+    def __init__(self, delays, fail=()):
+        self.delays = delays
+        self.fail = set(fail)
+        self.calls = []
+
+    def generate(self, body, model=None, timeout=180, cancel=None):
+        self.calls.append(model)
+        if cancel is not None and cancel.wait(self.delays[model]):
+            raise CancelledError()
+        if cancel is None:
+            time.sleep(self.delays[model])
+        if model in self.fail:
+            raise RuntimeError(f"{model} failed")
+        return f"from {model}"
+
+
+def route_with_fallback(router):
+    return router.route("answer", context_chars=50_000)
+
+
+def test_fast_primary_is_not_hedged():
+    router = make_router(hedge_after=1)
+    client = FakeClient({"m-strong": 0.01, "m-balanced": 0.01})
+    assert router.generate(client, route_with_fallback(router), {}, {}) == ("from m-strong", "m-strong")
+    assert client.calls == ["m-strong"]
+    assert router.stats()["m-strong"]["hedged"] == 0
+
+
+def test_slow_primary_is_hedged_and_withdrawn():
+    router = make_router()
+    client = FakeClient({"m-strong": 2, "m-balanced": 0.01})
+
+    assert router.generate(client, route_with_fallback(router), {}, {}) == ("from m-balanced", "m-balanced")
+
+    deadline = time.monotonic() + 2
+    while router.stats()["m-strong"]["withdrawn"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stats = router.stats()
+    assert stats["m-strong"]["hedged"] == 1 and stats["m-strong"]["withdrawn"] == 1
+    assert stats["m-balanced"]["hedge_wins"] == 1 and stats["m-balanced"]["requests"] == 1
+
+
+def test_primary_error_is_raised_when_both_fail():
+    router = make_router()
+    client = FakeClient({"m-strong": 0.1, "m-balanced": 0.01}, fail={"m-strong", "m-balanced"})
+    with pytest.raises(RuntimeError, match="m-strong failed"):
+        router.generate(client, route_with_fallback(router), {}, {})
+    assert router.stats()["m-strong"]["errors"] == 1
+
+
+def test_hedge_deadline_follows_the_observed_p95():
+    router = make_router(hedge_after=25)
+    assert router.hedge_deadline("m-strong", "answer") == 25
+    client = FakeClient({"m-strong": 0.02})
+    route = {"task": "answer", "model": "m-strong", "fallback": None, "tier": "strong"}
+    for _ in range(3):
+        router.generate(client, route, {})
+
+    assert 0.02 <= router.hedge_deadline("m-strong", "answer") < 1
+    assert router.hedge_deadline("m-strong", "plan") == 25
+    assert set(router.stats()["m-strong"]) >= {"p50_ms", "p95_ms", "mean_ms"}
+
+
+def test_limiter_withdraws_a_queued_request():
+    limiter = RateLimiter({"default": (60, 1_000_000)})
+    limiter.acquire("m")
+    limiter.record_rate_limited("m")
+    cancel = threading.Event()
+    threading.Timer(0.05, cancel.set).start()
+    with pytest.raises(CancelledError):
+        limiter.acquire("m", cancel=cancel)
+    assert limiter.stats()["m"]["queued"] == {"interactive": 0, "background": 0}
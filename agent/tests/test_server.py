@@ -0,0 +1,151 @@
+import threading
+import pytest
+from src.index_pool import IndexPool
+from src.project import Project
+from src.server import OrchidClient, OrchidServer, OrchidService, RequestError, ServerError, UnknownRoute
+from src.vector_store import IndexLockedError, VectorStore
+
+
+class FakeStore:
+    collection_name = "c1"
+
+    def schema_current(self):
+        return True
+
+    def search(self, query, k=15, query_filter=None):
+        if query == "boom":
+            raise KeyError("chunk")
+        return [{"path": "src/a.ts", "code": query, "k": k}]
+
+
+class FakeAgent:
+    def __init__(self, project):
+        self.project = project
+        self.vector_store = FakeStore()
+        self.import_graph = None
+        self.file_loader = None
+        self.changed = True
+
+    def new_session(self, prompt_cache):
+        return FakeSession()
+
+    def request_answer(self, session, query, keys):
+        session.turns.append(query)
+        return f"{len(session.turns)}: {query}"
+
+    def resolve_database(self, task):
+        return "none"
+
+    def request_plan(self, session, task, db_type, keys):
+        return {"plan": []}
+
+    def refresh_index(self):
+        return {"collection": "c2", "changed": self.changed, "files": 1}
+
+
+class FakeSession:
+    def __init__(self):
+        self.turns = []
+        self.closed = False
+
+    def gather(self, query, files=None):
+        return []
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def service(tmp_path):
+    created = []
+
+    def factory(project):
+        agent = FakeAgent(project)
+        created.append(agent)
+        return agent
+
+    svc = OrchidService(factory, IndexPool(), Project(str(tmp_path)), max_sessions=2)
+    svc.created = created
+    return svc
+
+
+def test_dispatch_routes_and_validates(service):
+    assert service.dispatch("POST", "/search", {"query": "player", "k": "3"})["results"][0]["k"] == 3
+    assert service.dispatch("GET", "/health", {})["requests"] == 2
+    with pytest.raises(UnknownRoute):
+        service.dispatch("GET", "/search", {})
+    with pytest.raises(RequestError, match="Missing query"):
+        service.dispatch("POST", "/ask", {"query": " "})
+    with pytest.raises(RequestError, match="must be a JSON object"):
+        service.dispatch("POST", "/plan", ["task"])
+    with pytest.raises(RequestError, match="k must be an integer"):
+        service.dispatch("POST", "/search", {"query": "x", "k": "many"})
+
+
+def test_sessions_are_reused_and_least_recently_used_are_closed(service):
+    assert service.dispatch("POST", "/ask", {"query": "one", "session": "a"})["answer"] == "1: one"
+    assert service.dispatch("POST", "/ask", {"query": "two", "session": "a"})["answer"] == "2: two"
+    assert service.dispatch("POST", "/ask", {"query": "once"})["answer"] == "1: once"
+
+    first, _ = service._session(service.created[0], "a")
+    service.dispatch("POST", "/ask", {"query": "x", "session": "b"})
+    service.dispatch("POST", "/ask", {"query": "x", "session": "c"})
+    assert first.closed
+    assert service.health({})["sessions"] == 2
+
+
+def test_reindex_reloads_the_agent_only_when_the_index_changed(service):
+    service.dispatch("POST", "/ask", {"query": "q", "session": "a"})
+    session, _ = service._session(service.created[0], "a")
+
+    service.created[0].changed = False
+    assert service.dispatch("POST", "/reindex", {})["changed"] is False
+    assert len(service.created) == 1
+
+    service.created[0].changed = True
+    assert service.dispatch("POST", "/reindex", {})["changed"] is True
+    assert session.closed
+    service.dispatch("POST", "/search", {"query": "q"})
+    assert len(service.created) == 2
+
+
+def test_uninitialized_project_is_reported(tmp_path):
+    def factory(project):
+        raise SystemExit(1)
+
+    svc = OrchidService(factory, IndexPool(), Project(str(tmp_path)))
+    with pytest.raises(ServerError, match="not initialized"):
+        svc.dispatch("POST", "/search", {"query": "x"})
+
+
+def test_client_round_trip_over_the_unix_socket(service, tmp_path):
+    socket_path = str(tmp_path / "orchid.sock")
+    daemon = OrchidServer(service, port=None, socket_path=socket_path)
+    threads = [threading.Thread(target=s.serve_forever, daemon=True) for _, s in daemon.servers]
+    for thread in threads:
+        thread.start()
+    try:
+        client = OrchidClient(port=1, socket_path=socket_path)
+        assert client.search("player", k=2)["results"][0]["k"] == 2
+        assert client.ask("hi", session="s")["answer"] == "1: hi"
+        assert client.reindex()["changed"] is True
+        with pytest.raises(ServerError, match="Bad request: Missing task"):
+            client.request("POST", "/plan", {"task": ""})
+        with pytest.raises(ServerError, match="No route"):
+            client.request("GET", "/nope")
+        # Errors raised inside agent code are server errors, not bad requests.
+        with pytest.raises(ServerError, match="^KeyError"):
+            client.search("boom")
+    finally:
+        daemon.shutdown()
+
+
+def test_a_second_process_gets_a_clear_error_while_the_index_is_open(tmp_path):
+    store = VectorStore("c1", qdrant_path=str(tmp_path / "db"), state_path=str(tmp_path))
+    try:
+        with pytest.raises(IndexLockedError, match="orchid.py serve"):
+            VectorStore("c1", qdrant_path=str(tmp_path / "db"), state_path=str(tmp_path))
+        other = store.with_collection("c2")
+        assert other.client is store.client and other.checkpoint_path.endswith("c2.json")
+    finally:
+        store.close()
@@ -0,0 +1,159 @@
+import os
+import pytest
+import requests
+from rich.console import Console
+from src import config
+from src.session import GeminiPromptCache, LocalPromptCache, Session
+
+
+class FakeStore:
+    def __init__(self, chunks=()):
+        self.chunks = list(chunks)
+        self.filters = []
+
+    def schema_current(self):
+        return True
+
+    def search(self, query, k=15, query_filter=None):
+        self.filters.append(query_filter)
+        return self.chunks[:k]
+
+
+def make_turn(files, chunks, history):
+    return f"FILES\n{files}\nCHUNKS\n{chunks}\nHISTORY\n{history}"
+
+
+@pytest.fixture
+def project(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src/app.tsx").write_text("export default function App() {}\n", encoding="utf-8")
+    (tmp_path / "src/util.ts").write_text("export const x = 1\n", encoding="utf-8")
+    return tmp_path
+
+
+def make_session(project, chunks=(), **kwargs):
+    store = FakeStore(chunks)
+    return Session(store, LocalPromptCache(), project_root=str(project), console=Console(quiet=True), **kwargs), store
+
+
+def chunk(project, name, code):
+    return {"path": str(project / name), "code": code}
+
+
+def test_gather_collects_mentions_and_chunks(project):
+    session, _ = make_session(project, [chunk(project, "src/util.ts", "export const x = 1")])
+
+    keys = session.gather("what is x", ["src/app.tsx"], k=5, expand_imports=False)
+
+    assert keys[0] == "file:src/app.tsx" and keys[1].startswith("chunk:")
+    assert session.context_size(keys) == {"context_chars": len("export default function App() {}\n") + len("export const x = 1"), "files": 1}
+
+
+def test_follow_up_turns_reuse_the_prefix(project):
+    session, _ = make_session(project, [chunk(project, "src/util.ts", "export const x = 1")])
+    keys = session.gather("q1", ["src/app.tsx"], expand_imports=False)
+
+    body, stats = session.build_request("answer", "INSTRUCTIONS", keys, make_turn, model="m")
+    assert not stats["prefix_reused"] and not stats["cached"]
+    prefix_text = body["contents"][0]["parts"][0]["text"]
+    assert prefix_text.startswith("INSTRUCTIONS\n\n## Session Context") and "export const x = 1" in prefix_text
+
+    session.record_turn("q1")
+    keys = session.gather("q2", ["src/app.tsx"], expand_imports=False)
+    body, stats = session.build_request("answer", "INSTRUCTIONS", keys, make_turn, model="m")
+
+    assert stats["prefix_reused"]
+    turn = body["contents"][0]["parts"][1]["text"]
+    assert "(Already in Session Context:" in turn and "- q1" in turn
+    assert session.prompt_cache.hits == 1 and session.prompt_cache.misses == 1
+    assert session.inline_body("answer") == body
+
+
+def test_changed_files_are_dropped_and_the_prefix_rebuilt(project):
+    session, _ = make_session(project)
+    keys = session.gather("q", ["src/app.tsx"], expand_imports=False)
+    session.build_request("answer", "I", keys, make_turn, model="m")
+
+    path = project / "src/app.tsx"
+    path.write_text("export default function App() { return 1 }\n", encoding="utf-8")
+    os.utime(path, (1, 1))
+    keys = session.gather("q", ["src/app.tsx"], expand_imports=False)
+    body, stats = session.build_request("answer", "I", keys, make_turn, model="m")
+
+    assert not stats["prefix_reused"]
+    assert "return 1" in body["contents"][0]["parts"][0]["text"]
+
+
+def test_working_set_evicts_least_recently_used_items(project):
+    chunks = [chunk(project, f"src/c{i}.ts", f"// chunk {i} " + "x" * 100) for i in range(3)]
+    session, store = make_session(project, max_working_set_chars=250)
+
+    store.chunks = chunks[:2]
+    first = session.gather("a", k=2)
+    store.chunks = chunks[2:]
+    second = session.gather("b", k=1)
+
+    assert first[0] not in session._items
+    assert first[1] in session._items and second[0] in session._items
+
+
+def test_prefix_items_are_pinned(project):
+    chunks = [chunk(project, f"src/c{i}.ts", f"// chunk {i} " + "x" * 100) for i in range(3)]
+    session, store = make_session(project, max_working_set_chars=150)
+    store.chunks = chunks[:1]
+    pinned = session.gather("a", k=1)
+    session.build_request("answer", "I", pinned, make_turn, model="m")
+
+    store.chunks = chunks[1:]
+    session.gather("b", k=2)
+
+    assert pinned[0] in session._items
+
+
+def test_warnings_follow_the_callers_console(project, monkeypatch, capsys):
+    monkeypatch.setattr(config, "FILE_CONTEXT_TOTAL_CHARS", 10)
+    session, _ = make_session(project)
+    assert session.gather("q", ["src/app.tsx"], expand_imports=False) == []
+    assert capsys.readouterr().out == ""
+
+
+class FakeCacheClient:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.created = []
+        self.deleted = []
+
+    def create_cached_content(self, text, ttl_seconds, model=None):
+        if self.fail:
+            raise requests.ConnectionError("no caching")
+        self.created.append((model, len(text)))
+        return f"cachedContents/{len(self.created)}"
+
+    def delete_cached_content(self, name):
+        self.deleted.append(name)
+
+
+def test_gemini_cache_uploads_large_prefixes_once():
+    client = FakeCacheClient()
+    cache = GeminiPromptCache(client, min_chars=100)
+
+    small = cache.body("answer", "short", "turn", "m")
+    assert small == {"contents": [{"role": "user", "parts": [{"text": "short"}, {"text": "turn"}]}]}
+
+    prefix = "p" * 200
+    first = cache.body("answer", prefix, "turn 1", "m")
+    second = cache.body("answer", prefix, "turn 2", "m")
+    assert first["cachedContent"] == second["cachedContent"] == "cachedContents/1"
+    assert second["contents"] == [{"role": "user", "parts": [{"text": "turn 2"}]}]
+    assert cache.hits == 1 and client.created == [("m", 200)]
+
+    cache.body("answer", prefix + "more", "turn 3", "m")
+    assert client.deleted == ["cachedContents/1"]
+    cache.close()
+    assert client.deleted == ["cachedContents/1", "cachedContents/2"]
+
+
+def test_gemini_cache_falls_back_to_inline_prefixes():
+    cache = GeminiPromptCache(FakeCacheClient(fail=True), min_chars=10)
+    body = cache.body("plan", "p" * 50, "turn", "m")
+    assert "cachedContent" not in body and body["contents"][0]["parts"][0]["text"] == "p" * 50
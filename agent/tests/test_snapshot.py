@@ -0,0 +1,120 @@
+import gzip
+import json
+import pytest
+from src import config, vector_store
+from src.project import Project
+from src.ingest import chunk_settings
+from src.snapshot import SnapshotError, export_snapshot, import_snapshot, read_manifest
+from src.vector_store import PAYLOAD_SCHEMA, VectorStore, chunk_id, chunk_payload
+
+
+@pytest.fixture
+def embedded(monkeypatch):
+    texts = []
+
+    def embed(content, task_type=None, model=None):
+        batch = content if isinstance(content, list) else [content]
+        texts.extend(batch)
+        vectors = [[float(len(text)), 1.0, 0.0] for text in batch]
+        return vectors if isinstance(content, list) else vectors[0]
+
+    monkeypatch.setattr(vector_store, "embed_content", embed)
+    return texts
+
+
+def make_project(root):
+    files = {"src/a.ts": "export const a = 1", "src/b.tsx": "export function B() { return null }"}
+    for rel_path, text in files.items():
+        (root / rel_path).parent.mkdir(parents=True, exist_ok=True)
+        (root / rel_path).write_text(text, encoding="utf-8")
+    project = Project(str(root))
+    paths = [str(root / p) for p in files]
+    chunks = [chunk_payload(project.root, path, open(path, encoding="utf-8").read()) for path in paths]
+    return project, paths, chunks
+
+
+def open_store(project, name="snap"):
+    return VectorStore(name, qdrant_path=project.qdrant_path, state_path=project.state_path)
+
+
+def test_export_import_round_trip_reembeds_only_changed_files(tmp_path, embedded):
+    source_root, target_root = tmp_path / "source", tmp_path / "target"
+    project, paths, chunks = make_project(source_root)
+    store = open_store(project)
+    store.build_collection(chunks)
+    out = str(tmp_path / "index.jsonl.gz")
+
+    manifest = export_snapshot(store, project, paths, out)
+    store.close()
+    assert manifest["points"] == 2 and manifest["dim"] == 3
+    assert manifest["chunking"] == chunk_settings() and manifest["payload_schema"] == PAYLOAD_SCHEMA
+    assert set(manifest["files"]) == {"src/a.ts", "src/b.tsx"}
+
+    target, target_paths, _ = make_project(target_root)
+    (target_root / "src/b.tsx").write_text("export function B() { return 1 }", encoding="utf-8")
+    target_chunks = [chunk_payload(target.root, p, open(p, encoding="utf-8").read()) for p in target_paths]
+    restored = open_store(target)
+
+    result = import_snapshot(out, restored, target, target_paths)
+
+    assert result["loaded_points"] == 1
+    assert result["changed_files"] == ["src/b.tsx"] and result["removed_files"] == []
+    assert not restored.is_complete()
+
+    embedded.clear()
+    restored.build_collection(target_chunks)
+    assert embedded == ["export function B() { return 1 }"]
+    assert restored.is_complete() and restored.point_count() == 2
+    assert {payload["path"] for _, payload in restored.iter_points()} == set(target_paths)
+    restored.close()
+
+
+def write_manifest(path, **fields):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(json.dumps({
+            "format": "orchid-index", "version": 2, "embedding_model": config.EMBEDDING_MODEL,
+            "chunking": chunk_settings(), "payload_schema": PAYLOAD_SCHEMA, **fields,
+        }) + "\n")
+    return str(path)
+
+
+def test_manifest_format_and_version_are_checked(tmp_path):
+    assert read_manifest(write_manifest(tmp_path / "ok.gz"))["version"] == 2
+    with pytest.raises(SnapshotError, match="version 1 is not supported"):
+        read_manifest(write_manifest(tmp_path / "old.gz", version=1))
+    with pytest.raises(SnapshotError, match="not an Orchid index snapshot"):
+        read_manifest(write_manifest(tmp_path / "other.gz", format="something-else"))
+    (tmp_path / "plain.txt").write_text("not gzip", encoding="utf-8")
+    with pytest.raises(SnapshotError, match="not a readable index snapshot"):
+        read_manifest(str(tmp_path / "plain.txt"))
+
+
+def test_import_rejects_a_different_embedding_model(tmp_path):
+    project, paths, _ = make_project(tmp_path)
+    path = write_manifest(tmp_path / "snap.gz", embedding_model="models/other", dim=3, points=0, files={})
+    with pytest.raises(SnapshotError, match="models/other"):
+        import_snapshot(path, None, project, paths)
+
+
+@pytest.mark.parametrize("fields, message", [
+    ({"chunking": {"chunker": 1, "chunk_chars": 400}}, "chunked with"),
+    ({"payload_schema": 1}, "payloads use schema 1"),
+])
+def test_import_rejects_other_chunking_or_payload_schema(tmp_path, fields, message):
+    project, paths, _ = make_project(tmp_path)
+    path = write_manifest(tmp_path / "snap.gz", dim=3, points=0, files={}, **fields)
+    with pytest.raises(SnapshotError, match=message):
+        import_snapshot(path, None, project, paths)
+
+
+def test_resumed_build_drops_points_of_chunks_that_no_longer_exist(tmp_path, embedded):
+    project, paths, chunks = make_project(tmp_path)
+    old_chunk = chunk_payload(project.root, paths[1], "export function B() {}")
+    store = open_store(project)
+    store.restore([([1.0, 1.0, 0.0], chunks[0]), ([2.0, 1.0, 0.0], old_chunk)], dim=3)
+
+    store.build_collection(chunks)
+
+    assert store.point_ids() == {chunk_id(chunk) for chunk in chunks}
+    assert store.is_complete()
+    store.close()
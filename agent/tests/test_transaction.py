@@ -0,0 +1,91 @@
+import os
+import pytest
+from src import transaction
+from src.transaction import Journal, TransactionError
+
+
+def read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture
+def project(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.ts").write_text("old a", encoding="utf-8")
+    return tmp_path
+
+
+def journal(project):
+    return Journal(str(project), str(project / ".orchid" / "journal"))
+
+
+def test_apply_writes_all_changes_and_undo_restores_them(project):
+    j = journal(project)
+    txn_id = j.apply({"src/a.ts": "new a", "src/new/b.ts": "b"})
+
+    assert read(project / "src" / "a.ts") == "new a"
+    assert read(project / "src" / "new" / "b.ts") == "b"
+
+    manifest = j.undo()
+    assert manifest["id"] == txn_id
+    assert read(project / "src" / "a.ts") == "old a"
+    assert not (project / "src" / "new").exists()
+    assert j.undo() is None
+
+
+def test_undo_rolls_back_only_the_latest_transaction(project):
+    j = journal(project)
+    j.apply({"src/a.ts": "first"})
+    j.apply({"src/a.ts": "second"})
+
+    j.undo()
+    assert read(project / "src" / "a.ts") == "first"
+    j.undo()
+    assert read(project / "src" / "a.ts") == "old a"
+
+
+def test_failed_rename_rolls_back_files_already_replaced(project, monkeypatch):
+    (project / "src" / "c.ts").write_text("old c", encoding="utf-8")
+    real_replace = os.replace
+    calls = []
+
+    def flaky_replace(src, dst):
+        # Let the first target through, then fail on the second one.
+        if dst.endswith(".ts"):
+            calls.append(dst)
+            if len(calls) == 2:
+                raise OSError("disk full")
+        return real_replace(src, dst)
+
+    monkeypatch.setattr(transaction.os, "replace", flaky_replace)
+    with pytest.raises(TransactionError):
+        journal(project).apply({"src/a.ts": "new a", "src/c.ts": "new c"})
+    monkeypatch.undo()
+
+    assert read(project / "src" / "a.ts") == "old a"
+    assert read(project / "src" / "c.ts") == "old c"
+    assert not [n for n in os.listdir(project / "src") if n.endswith(".tmp")]
+    assert journal(project).undo() is None
+
+
+def test_refuses_paths_outside_the_project(project):
+    with pytest.raises(TransactionError):
+        journal(project).apply({"../escape.ts": "x"})
+    assert not (project.parent / "escape.ts").exists()
+
+
+def test_undo_refuses_to_discard_later_edits_unless_forced(project):
+    j = journal(project)
+    j.apply({"src/a.ts": "new a", "src/b.ts": "b"})
+    (project / "src" / "a.ts").write_text("edited by hand", encoding="utf-8")
+    (project / "src" / "b.ts").unlink()
+
+    with pytest.raises(TransactionError, match="src/a.ts, src/b.ts"):
+        j.undo()
+    assert read(project / "src" / "a.ts") == "edited by hand"
+
+    manifest = j.undo(force=True)
+    assert manifest["status"] == "undone"
+    assert read(project / "src" / "a.ts") == "old a"
+    assert not (project / "src" / "b.ts").exists()
@@ -0,0 +1,125 @@
+import os
+import pytest
+from qdrant_client import models
+from src import vector_store
+from src.vector_store import VectorStore, chunk_id, chunk_payload, scope_filter, symbol_kind, union_filter
+
+FILES = {
+    "src/components/ui/button.tsx": "export function Button() { return <button /> }",
+    "src/components/player.tsx": "export const Player = () => <div />",
+    "src/hooks/use-mobile.ts": "export function useMobile() { return false }",
+    "src/lib/types.ts": "export interface Track { id: string }",
+    "drizzle/schema.sql": "CREATE TABLE tracks (id text);",
+}
+
+
+@pytest.fixture(autouse=True)
+def fake_embedding(monkeypatch):
+    def embed(content, task_type=None, model=None):
+        vector = lambda text: [1.0, float(len(text) % 7), 0.5]
+        return [vector(t) for t in content] if isinstance(content, list) else vector(content)
+
+    monkeypatch.setattr(vector_store, "embed_content", embed)
+
+
+@pytest.fixture
+def store(tmp_path):
+    chunks = [chunk_payload(str(tmp_path), str(tmp_path / rel), code) for rel, code in FILES.items()]
+    store = VectorStore("test", qdrant_path=str(tmp_path / "db"), state_path=str(tmp_path / ".orchid"))
+    store.build_collection(chunks)
+    yield store
+    store.close()
+
+
+def found(store, tmp_path, query_filter):
+    results = store.search("query", k=10, rerank=False, query_filter=query_filter)
+    return sorted(os.path.relpath(p["path"], tmp_path) for p in results)
+
+
+def test_chunk_payload_fields(tmp_path):
+    payload = chunk_payload(str(tmp_path), str(tmp_path / "src/components/ui/button.tsx"), FILES["src/components/ui/button.tsx"], 40)
+    assert payload["path"] == str(tmp_path / "src/components/ui/button.tsx")
+    assert payload["directory"] == "src/components/ui"
+    assert payload["dirs"] == ["src", "src/components", "src/components/ui"]
+    assert (payload["extension"], payload["kind"], payload["offset"]) == ("tsx", "component", 40)
+    assert chunk_id(payload) == chunk_id(dict(payload))
+    assert symbol_kind("src/hooks/use-mobile.ts", FILES["src/hooks/use-mobile.ts"]) == "hook"
+
+
+def test_directory_filter_matches_nested_directories(store, tmp_path):
+    assert found(store, tmp_path, scope_filter(directories=["src/components/"])) == ["src/components/player.tsx", "src/components/ui/button.tsx"]
+
+
+def test_extension_and_kind_filters(store, tmp_path):
+    assert found(store, tmp_path, scope_filter(extensions=[".ts"])) == ["src/hooks/use-mobile.ts", "src/lib/types.ts"]
+    assert found(store, tmp_path, scope_filter(kinds=["type", "schema"])) == ["drizzle/schema.sql", "src/lib/types.ts"]
+    assert found(store, tmp_path, scope_filter(directories=["src"], extensions=["tsx"], kinds=["hook"])) == []
+
+
+def test_union_filter():
+    assert scope_filter() is None
+    assert union_filter([scope_filter(kinds=["hook"]), None]) is None
+    combined = union_filter([scope_filter(kinds=["hook"]), scope_filter(extensions=["sql"])])
+    assert isinstance(combined, models.Filter) and len(combined.should) == 2
+
+
+def test_union_filter_search(store, tmp_path):
+    query_filter = union_filter([scope_filter(kinds=["hook"]), scope_filter(extensions=["sql"])])
+    assert found(store, tmp_path, query_filter) == ["drizzle/schema.sql", "src/hooks/use-mobile.ts"]
+
+
+def test_legacy_payloads_fail_the_schema_gate_and_are_rebuilt(tmp_path):
+    path = str(tmp_path / "src/a.ts")
+    store = VectorStore("legacy", qdrant_path=str(tmp_path / "db"), state_path=str(tmp_path / ".orchid"))
+    store.client.create_collection("legacy", vectors_config=models.VectorParams(size=3, distance=models.Distance.COSINE))
+    legacy = {"path": path, "code": "export {}"}
+    store.client.upsert("legacy", points=[models.PointStruct(id=chunk_id(legacy), vector=[1.0, 0.0, 0.0], payload=legacy)])
+
+    assert store.payload_schema() == 1
+    assert not store.schema_current() and not store.is_complete()
+
+    store.build_collection([chunk_payload(str(tmp_path), path, "export {}")])
+
+    assert store.schema_current() and store.is_complete()
+    assert store.point_count() == 1
+    store.close()
+
+
+def test_a_missing_collection_counts_as_current(tmp_path):
+    store = VectorStore("none", qdrant_path=str(tmp_path / "db"), state_path=str(tmp_path / ".orchid"))
+    assert store.schema_current() and not store.is_complete()
+    store.close()
+
+
+def test_interrupted_build_resumes_with_the_missing_chunks(tmp_path, monkeypatch):
+    chunks = [chunk_payload(str(tmp_path), str(tmp_path / rel), code) for rel, code in FILES.items()]
+    embedded = []
+
+    def flaky(content, task_type=None, model=None):
+        if embedded:
+            raise KeyboardInterrupt
+        embedded.extend(content)
+        return [[1.0, float(i), 0.5] for i in range(len(content))]
+
+    monkeypatch.setattr(vector_store, "embed_content", flaky)
+    store = VectorStore("test", qdrant_path=str(tmp_path / "db"), state_path=str(tmp_path / ".orchid"))
+    with pytest.raises(KeyboardInterrupt):
+        store.build_collection(chunks, batch_size=2)
+    assert not store.is_complete()
+    with open(store._done_path, encoding="utf-8") as f:
+        assert f.read().split() == [chunk_id(c) for c in chunks[:2]]
+
+    def embed(content, task_type=None, model=None):
+        embedded.extend(content)
+        return [[1.0, float(i), 0.5] for i in range(len(content))]
+
+    monkeypatch.setattr(vector_store, "embed_content", embed)
+    # The first, already stored chunk changed while the build was stopped.
+    changed = [chunk_payload(str(tmp_path), chunks[0]["path"], "export function Button() { return null }")] + chunks[1:]
+    store.build_collection(changed, batch_size=2)
+
+    assert embedded == [c["code"] for c in chunks[:2]] + [changed[0]["code"]] + [c["code"] for c in chunks[2:]]
+    assert store.is_complete() and store.point_ids() == {chunk_id(c) for c in changed}
+    with open(store._done_path, encoding="utf-8") as f:
+        assert sorted(f.read().split()) == sorted(chunk_id(c) for c in changed)
+    store.close()